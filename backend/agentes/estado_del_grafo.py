@@ -17,6 +17,10 @@ class EstadoDelGrafo(BaseModel):
     id_caso: str = Field(description="El identificador único del caso.")
     ruta_archivo: str = Field(description="La ruta local del archivo de evidencia subido.")
     tipo_contenido: str = Field(description="El tipo MIME del archivo (ej. 'video/mp4').")
+    hash_contenido: Optional[str] = Field(
+        default=None,
+        description="SHA-256 del archivo, calculado al subirlo. Clave de la caché de extracciones."
+    )
 
     # --- Resultados de los Agentes ---
     # Cada agente llenará uno o más de estos campos a medida que avanza el grafo.
@@ -26,11 +30,21 @@ class EstadoDelGrafo(BaseModel):
         description="El texto transcrito o extraído por el Agente Procesador."
     )
     
+    segmentos_transcripcion: Optional[List[Dict]] = Field(
+        default=None,
+        description="Segmentos de la transcripción de un audio ({'inicio', 'fin', 'texto'}, en segundos)."
+    )
+    
     entidades_extraidas: Optional[List[Dict]] = Field(
         default=None, 
         description="Las entidades extraídas por el Agente Investigador/Analista."
     )
     
+    informacion_texto_original: Optional[List[str]] = Field(
+        default=None,
+        description="Documentos de la base de conocimiento encontrados directamente con el texto extraído (en paralelo a las entidades)."
+    )
+    
     informacion_recuperada: Optional[List[str]] = Field(
         default=None, 
         description="La información relevante encontrada en la base de conocimiento por el Agente Investigador/Analista."
@@ -2,17 +2,43 @@
 
 from .estado_del_grafo import EstadoDelGrafo
 from ..herramientas import herramientas_audio, herramientas_documentos, herramientas_video,herramientas_lenguaje
+from .. import cache_de_resultados
+from ..core import configuracion, observabilidad
 
-import time
 # =================================================================================
 # NODO 1: AGENTE PROCESADOR DE EVIDENCIA
 # =================================================================================
 
+def _elegir_herramienta(ruta_archivo: str, tipo_contenido: str, id_caso: str):
+    """
+    Decide qué herramienta procesa la evidencia según su tipo MIME.
+
+    Returns:
+        tuple: (descripción, versión de la herramienta o None si no se cachea,
+                función sin argumentos que ejecuta la herramienta).
+    """
+    if 'audio' in tipo_contenido:
+        return ("AUDIO", herramientas_audio.VERSION_HERRAMIENTA,
+                lambda: herramientas_audio.procesar_audio_con_whisper(ruta_archivo))
+    if 'pdf' in tipo_contenido:
+        return ("PDF", herramientas_documentos.VERSION_HERRAMIENTA,
+                lambda: herramientas_documentos.procesar_pdf_con_nougat(ruta_archivo))
+    if 'video' in tipo_contenido:
+        return ("VIDEO", herramientas_video.VERSION_HERRAMIENTA,
+                lambda: herramientas_video.procesar_video_con_opencv_y_gemini(ruta_archivo, id_caso))
+    return (f"'{tipo_contenido}' (no soportado, simulación)", None,
+            lambda: herramientas_documentos.procesar_documento_simulado(ruta_archivo))
+
+
 def nodo_procesador_evidencia(estado: EstadoDelGrafo) -> dict:
     """
     Este nodo es el primer paso en el grafo. Llama a la herramienta apropiada
     (audio, pdf, video) para extraer el texto de la evidencia.
 
+    Antes de llamar a la herramienta consulta la caché de extracciones: si este
+    mismo contenido ya fue procesado con la misma versión de herramienta, se
+    reutiliza el texto en lugar de volver a ejecutar Nougat, Whisper o el video.
+
     Args:
         estado (EstadoDelGrafo): El estado actual del grafo. Debe contener
                                  la ruta_archivo y el tipo_contenido.
@@ -27,81 +53,126 @@ def nodo_procesador_evidencia(estado: EstadoDelGrafo) -> dict:
     ruta_archivo = estado.ruta_archivo
     tipo_contenido = estado.tipo_contenido
     id_caso = estado.id_caso
-    
-    resultado_herramienta = {}
-
-    # Lógica de decisión que ya teníamos, pero ahora dentro de un nodo
-    if 'audio' in tipo_contenido:
-        print("    Decisión: Es un AUDIO. Llamando a la herramienta de transcripción...")
-        resultado_herramienta = herramientas_audio.procesar_audio_con_whisper(ruta_archivo)
-
-    elif 'pdf' in tipo_contenido:
-        print("    Decisión: Es un PDF. Llamando a la herramienta de procesamiento (Nougat)...")
-        resultado_herramienta = herramientas_documentos.procesar_pdf_con_nougat(ruta_archivo)
 
-    elif 'video' in tipo_contenido:
-        print("    Decisión: Es un VIDEO. Llamando a la herramienta de procesamiento de video...")
-        resultado_herramienta = herramientas_video.procesar_video_con_opencv_y_gemini(ruta_archivo, id_caso)
-        
-    else:
-        print(f"    Decisión: Tipo de archivo '{tipo_contenido}' no soportado. Usando simulación.")
-        resultado_herramienta = herramientas_documentos.procesar_documento_simulado(ruta_archivo)
-    
-    texto_extraido = resultado_herramienta.get("texto_extraido")
+    descripcion, version_herramienta, ejecutar_herramienta = _elegir_herramienta(ruta_archivo, tipo_contenido, id_caso)
+    print(f"    Decisión: Es un {descripcion}.")
+
+    # 1. Consultamos la caché de extracciones (solo para herramientas reales).
+    hash_contenido = None
+    if version_herramienta and configuracion.CACHE_EXTRACCIONES_ACTIVADA:
+        hash_contenido = estado.hash_contenido or cache_de_resultados.calcular_hash_archivo(ruta_archivo)
+        texto_en_cache = cache_de_resultados.obtener_texto_en_cache(hash_contenido, version_herramienta)
+        if texto_en_cache:
+            print(f"    Resultado: Contenido ya procesado con '{version_herramienta}'. Reutilizando texto de la caché ({len(texto_en_cache)} caracteres).")
+            return {"texto_extraido": texto_en_cache, "hash_contenido": hash_contenido}
+
+    # 2. No estaba en caché: llamamos a la herramienta.
+    print("    Acción: Llamando a la herramienta de procesamiento...")
+    operacion = descripcion.lower() if version_herramienta else "simulado"
+    with observabilidad.tramo(f"herramienta.{operacion}", tipo_contenido=tipo_contenido) as tramo_herramienta:
+        resultado_herramienta = ejecutar_herramienta()
+        texto_extraido = resultado_herramienta.get("texto_extraido")
+        tramo_herramienta.fijar(
+            caracteres=len(texto_extraido or ""),
+            segmentos=len(resultado_herramienta.get("segmentos") or []),
+            error=resultado_herramienta.get("error"),
+        )
+    observabilidad.segundos_por_herramienta.labels(operacion).observe(tramo_herramienta.segundos)
     
     if texto_extraido:
         print(f"    Resultado: Texto extraído exitosamente ({len(texto_extraido)} caracteres).")
+        if hash_contenido and not resultado_herramienta.get("error"):
+            cache_de_resultados.guardar_texto_en_cache(hash_contenido, version_herramienta, texto_extraido)
     else:
         print("    Resultado: No se pudo extraer texto.")
 
     # El nodo devuelve un diccionario con las claves del estado que quiere modificar.
-    return {"texto_extraido": texto_extraido}
+    return {
+        "texto_extraido": texto_extraido,
+        "hash_contenido": hash_contenido,
+        "segmentos_transcripcion": resultado_herramienta.get("segmentos"),
+    }
 
 
 # =================================================================================
-# NODO 2: AGENTE INVESTIGADOR Y ANALISTA
+# NODO 2: AGENTE INVESTIGADOR Y ANALISTA (DOS RAMAS EN PARALELO + UNIÓN)
 # =================================================================================
+# La extracción de entidades (llamadas al modelo de lenguaje) y la búsqueda en
+# la base de conocimiento con el texto original (local) no dependen una de la
+# otra: el grafo las ejecuta a la vez y 'nodo_investigador_analista' junta los
+# resultados cuando las dos terminan.
 
-def nodo_investigador_analista(estado: EstadoDelGrafo) -> dict:
+def nodo_extractor_entidades(estado: EstadoDelGrafo) -> dict:
     """
-    Este nodo toma el texto extraído y realiza la investigación.
+    Rama 1: extrae las entidades clave del texto con el modelo de lenguaje.
 
-    Implementa una pausa inicial para dar un respiro a la API después de
-    posibles tareas intensivas del nodo anterior (como el análisis de video).
+    Ya no hace pausas fijas: el limitador compartido de 'herramientas_lenguaje'
+    solo frena las llamadas a Gemini cuando la cuota está realmente cerca del límite.
     """
-    print("\n--- Entrando en el Nodo: Investigador y Analista ---")
-    
-    texto_para_analizar = estado.texto_extraido
-    
-    if not texto_para_analizar:
+    print("\n--- Entrando en el Nodo: Extractor de Entidades ---")
+
+    if not estado.texto_extraido:
         print("    Decisión: No hay texto para analizar. Saltando el nodo.")
         return {}
 
-    # --- ¡CORRECCIÓN ESTRATÉGICA! ---
-    # Le damos un respiro a la API antes de empezar a trabajar.
-    pausa = 20
-    print(f"    Acción: Pausa de {pausa} segundos para estabilizar la conexión con la API...")
-    time.sleep(pausa)
-    # ----------------------------------
-
-    # 1. Extraer entidades
     print("    Acción: Extrayendo entidades clave del texto...")
-    entidades = herramientas_lenguaje.extraer_entidades_con_llm(texto_para_analizar)
-    
+    entidades = herramientas_lenguaje.extraer_entidades_con_llm(estado.texto_extraido)
+
     if not entidades or "Error" in entidades[0].get("tipo", ""):
         print("    Resultado: No se pudieron extraer entidades.")
-        # Devolvemos ambos campos como nulos para evitar errores en cascada
-        return {"entidades_extraidas": None, "informacion_recuperada": None}
+        return {"entidades_extraidas": None}
 
     print(f"    Resultado: Se extrajeron {len(entidades)} entidades.")
+    return {"entidades_extraidas": entidades}
+
+
+def nodo_buscador_texto_original(estado: EstadoDelGrafo) -> dict:
+    """
+    Rama 2: busca en la base de conocimiento directamente con el texto
+    extraído, mientras la rama 1 espera al modelo de lenguaje.
+    """
+    print("\n--- Entrando en el Nodo: Buscador por Texto Original ---")
+
+    if not estado.texto_extraido:
+        print("    Decisión: No hay texto para buscar. Saltando el nodo.")
+        return {}
+
+    informacion = herramientas_lenguaje.buscar_con_texto_original(estado.texto_extraido)
+    print(f"    Resultado: Se recuperaron {len(informacion)} fragmentos de información con el texto original.")
+    return {"informacion_texto_original": informacion}
+
+
+def nodo_investigador_analista(estado: EstadoDelGrafo) -> dict:
+    """
+    Unión de las dos ramas: con las entidades ya extraídas, busca en la base de
+    conocimiento y añade (sin duplicados) lo encontrado con el texto original.
+    """
+    print("\n--- Entrando en el Nodo: Investigador y Analista ---")
+
+    if not estado.texto_extraido:
+        print("    Decisión: No hay texto para analizar. Saltando el nodo.")
+        return {}
+
+    entidades = estado.entidades_extraidas
+    if estado.informacion_texto_original is None:
+        # Evidencia retomada de un punto de control anterior a las ramas
+        # paralelas: ninguna de las dos se ejecutó, extraemos aquí.
+        entidades = nodo_extractor_entidades(estado).get("entidades_extraidas")
+    if not entidades:
+        print("    Resultado: No hay entidades; no se puede continuar la investigación.")
+        # Devolvemos ambos campos como nulos para evitar errores en cascada
+        return {"entidades_extraidas": None, "informacion_recuperada": None}
 
-    # 2. Buscar en la base de conocimiento (RAG)
     consulta_rag = " ".join([ent["entidad"] for ent in entidades])
     print(f"    Acción: Buscando en la base de conocimiento con la consulta: '{consulta_rag[:100]}...'")
-    
-    informacion_recuperada = herramientas_lenguaje.buscar_en_base_de_conocimiento(consulta_rag)
-    
-    print(f"    Resultado: Se recuperaron {len(informacion_recuperada)} fragmentos de información.")
+    informacion_por_entidades = herramientas_lenguaje.buscar_en_base_de_conocimiento(consulta_rag)
+
+    # Primero lo encontrado por entidades (la consulta más precisa), luego lo del texto original.
+    informacion_recuperada = list(dict.fromkeys(informacion_por_entidades + (estado.informacion_texto_original or [])))
+    print(
+        f"    Resultado: Se recuperaron {len(informacion_recuperada)} fragmentos de información "
+        f"({len(informacion_por_entidades)} por entidades, el resto por el texto original)."
+    )
 
     return {
         "entidades_extraidas": entidades,
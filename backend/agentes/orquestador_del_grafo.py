@@ -4,10 +4,14 @@ from langgraph.graph import StateGraph
 from .estado_del_grafo import EstadoDelGrafo
 from .nodos_del_grafo import (
     nodo_procesador_evidencia,
+    nodo_extractor_entidades,
+    nodo_buscador_texto_original,
     nodo_investigador_analista,
     nodo_sintetizador_estrategico,
     nodo_guardian_calidad
 )
+from .puntos_de_control import crear_puntos_de_control
+from ..core.eventos_progreso import medir_nodo
 
 # =================================================================================
 # PASO 1: DEFINIR EL GRAFO Y LOS NODOS (Sin cambios)
@@ -15,10 +19,14 @@ from .nodos_del_grafo import (
 flujo_de_trabajo = StateGraph(EstadoDelGrafo)
 print("SETUP-LANGGRAPH: Creando el grafo de agentes...")
 
-flujo_de_trabajo.add_node("procesador_evidencia", nodo_procesador_evidencia)
-flujo_de_trabajo.add_node("investigador_analista", nodo_investigador_analista)
-flujo_de_trabajo.add_node("sintetizador_estrategico", nodo_sintetizador_estrategico)
-flujo_de_trabajo.add_node("guardian_de_calidad", nodo_guardian_calidad)
+# Cada nodo va envuelto en 'medir_nodo' para publicar su inicio, fin y duración
+# en el flujo de eventos de progreso (SSE).
+flujo_de_trabajo.add_node("procesador_evidencia", medir_nodo("procesador_evidencia")(nodo_procesador_evidencia))
+flujo_de_trabajo.add_node("extractor_entidades", medir_nodo("extractor_entidades")(nodo_extractor_entidades))
+flujo_de_trabajo.add_node("buscador_texto_original", medir_nodo("buscador_texto_original")(nodo_buscador_texto_original))
+flujo_de_trabajo.add_node("investigador_analista", medir_nodo("investigador_analista")(nodo_investigador_analista))
+flujo_de_trabajo.add_node("sintetizador_estrategico", medir_nodo("sintetizador_estrategico")(nodo_sintetizador_estrategico))
+flujo_de_trabajo.add_node("guardian_de_calidad", medir_nodo("guardian_de_calidad")(nodo_guardian_calidad))
 
 print("SETUP-LANGGRAPH: Nodos añadidos al grafo.")
 
@@ -59,12 +67,18 @@ print("SETUP-LANGGRAPH: Definiendo las conexiones del grafo...")
 # 3.1. Punto de entrada
 flujo_de_trabajo.set_entry_point("procesador_evidencia")
 
-# 3.2. Conexiones lineales
-flujo_de_trabajo.add_edge("procesador_evidencia", "investigador_analista")
+# 3.2. Ramas en paralelo: tras extraer el texto, la extracción de entidades y
+#      la búsqueda con el texto original se ejecutan a la vez. El investigador
+#      espera a las dos y une sus resultados.
+flujo_de_trabajo.add_edge("procesador_evidencia", "extractor_entidades")
+flujo_de_trabajo.add_edge("procesador_evidencia", "buscador_texto_original")
+flujo_de_trabajo.add_edge(["extractor_entidades", "buscador_texto_original"], "investigador_analista")
+
+# 3.3. Conexiones lineales
 flujo_de_trabajo.add_edge("investigador_analista", "sintetizador_estrategico")
 flujo_de_trabajo.add_edge("sintetizador_estrategico", "guardian_de_calidad")
 
-# 3.3. ¡LA NUEVA CONEXIÓN INTELIGENTE (BIFURCACIÓN)!
+# 3.4. ¡LA NUEVA CONEXIÓN INTELIGENTE (BIFURCACIÓN)!
 flujo_de_trabajo.add_conditional_edges(
     # Nodo de origen: Desde dónde se toma la decisión.
     "guardian_de_calidad",
@@ -81,15 +95,29 @@ flujo_de_trabajo.add_conditional_edges(
 print("SETUP-LANGGRAPH: ¡Conexiones del grafo, incluyendo el bucle, definidas!")
 
 # =================================================================================
-# PASO 4: COMPILAR EL GRAFO (Sin cambios)
+# PASO 4: COMPILAR EL GRAFO CON PUNTOS DE CONTROL
 # =================================================================================
-grafo_compilado = flujo_de_trabajo.compile()
+# El estado se guarda tras cada nodo, por evidencia, para poder reanudar el
+# trabajo si el proceso se cae (ver puntos_de_control.py).
+puntos_de_control = crear_puntos_de_control()
+grafo_compilado = flujo_de_trabajo.compile(checkpointer=puntos_de_control)
 print("SETUP-LANGGRAPH: ¡Grafo de agentes compilado y listo para usar!")
 
-try:
-    imagen_en_bytes = grafo_compilado.get_graph().draw_png()
-    with open("grafo_agentes_con_bucle.png", "wb") as f:
-        f.write(imagen_en_bytes)
-    print("SETUP-LANGGRAPH: Se ha guardado una imagen del grafo en 'grafo_agentes_con_bucle.png'.")
-except Exception as e:
-    print(f"SETUP-LANGGRAPH-WARN: No se pudo generar la imagen del grafo. Causa: {e}")
\ No newline at end of file
+
+def guardar_imagen_del_grafo(ruta_imagen: str = "grafo_agentes_con_bucle.png") -> None:
+    """
+    Dibuja el grafo en un PNG. Ya no se hace al importar el módulo (necesita
+    graphviz y tarda); se ejecuta a mano con:
+        python -m backend.agentes.orquestador_del_grafo
+    """
+    try:
+        imagen_en_bytes = grafo_compilado.get_graph().draw_png()
+        with open(ruta_imagen, "wb") as f:
+            f.write(imagen_en_bytes)
+        print(f"SETUP-LANGGRAPH: Se ha guardado una imagen del grafo en '{ruta_imagen}'.")
+    except Exception as e:
+        print(f"SETUP-LANGGRAPH-WARN: No se pudo generar la imagen del grafo. Causa: {e}")
+
+
+if __name__ == "__main__":
+    guardar_imagen_del_grafo()
@@ -0,0 +1,86 @@
+# backend/agentes/puntos_de_control.py
+
+import sqlite3
+from pathlib import Path
+from typing import Optional
+
+from ..core import configuracion
+
+# =================================================================================
+# PUNTOS DE CONTROL DE LANGGRAPH
+# =================================================================================
+# Con un 'checkpointer', LangGraph guarda el estado del grafo al terminar cada
+# nodo, bajo un 'thread_id' (aquí, el id de la evidencia). Si el proceso muere
+# después de Nougat pero antes de la síntesis de Gemini, el trabajador que
+# retome la evidencia continúa desde el último nodo terminado en lugar de
+# repetir todo el trabajo (y pagarlo otra vez).
+
+
+def crear_puntos_de_control(tipo: Optional[str] = None):
+    """
+    Crea el 'checkpointer' configurado en PUNTOS_DE_CONTROL_GRAFO.
+
+    Returns:
+        El checkpointer de LangGraph, o None si está desactivado o no se pudo crear
+        (el grafo funciona igual, solo que sin poder reanudar).
+    """
+    tipo = (tipo or configuracion.PUNTOS_DE_CONTROL_GRAFO).lower()
+    try:
+        if tipo == "postgres":
+            return _crear_puntos_de_control_postgres()
+        if tipo == "sqlite":
+            return _crear_puntos_de_control_sqlite()
+        if tipo == "memoria":
+            from langgraph.checkpoint.memory import MemorySaver
+            return MemorySaver()
+        if tipo != "ninguno":
+            print(f"SETUP-LANGGRAPH-WARN: Tipo de puntos de control desconocido '{tipo}'. Se desactivan.")
+    except Exception as e:
+        print(f"SETUP-LANGGRAPH-WARN: No se pudieron crear los puntos de control '{tipo}'. El grafo no podrá reanudarse. Causa: {e}")
+    return None
+
+
+def _crear_puntos_de_control_postgres():
+    from psycopg.rows import dict_row
+    from psycopg_pool import ConnectionPool
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from ..base_de_datos import URL_CONEXION_BD
+
+    # Un pequeño grupo de conexiones compartido por todos los hilos trabajadores.
+    grupo_conexiones = ConnectionPool(
+        conninfo=URL_CONEXION_BD,
+        max_size=max(2, configuracion.NUMERO_TRABAJADORES),
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+    )
+    puntos_de_control = PostgresSaver(grupo_conexiones)
+    puntos_de_control.setup()  # Crea sus tablas si no existen.
+    print("SETUP-LANGGRAPH: Puntos de control del grafo en PostgreSQL.")
+    return puntos_de_control
+
+
+def _crear_puntos_de_control_sqlite():
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    ruta = Path(configuracion.RUTA_PUNTOS_DE_CONTROL_SQLITE)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    # La conexión se comparte entre hilos; SqliteSaver serializa el acceso con su propio candado.
+    conexion = sqlite3.connect(str(ruta), check_same_thread=False)
+    puntos_de_control = SqliteSaver(conexion)
+    puntos_de_control.setup()
+    print(f"SETUP-LANGGRAPH: Puntos de control del grafo en '{ruta}'.")
+    return puntos_de_control
+
+
+def configuracion_de_hilo(id_evidencia: str) -> dict:
+    """La configuración de LangGraph que identifica la ejecución de una evidencia."""
+    return {"configurable": {"thread_id": id_evidencia}}
+
+
+def borrar_puntos_de_control(puntos_de_control, id_evidencia: str) -> None:
+    """Borra los puntos de control de una evidencia que ya terminó (ya no hacen falta)."""
+    if puntos_de_control is None or not hasattr(puntos_de_control, "delete_thread"):
+        return
+    try:
+        puntos_de_control.delete_thread(id_evidencia)
+    except Exception as e:
+        print(f"SETUP-LANGGRAPH-WARN: No se pudieron borrar los puntos de control de {id_evidencia}. Causa: {e}")
@@ -0,0 +1,276 @@
+# backend/almacenamiento_subidas.py
+
+import asyncio
+import hashlib
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from sqlmodel import Session, select
+
+from .core import configuracion
+from .base_de_datos import motor
+from .api.modelos_compartidos import SubidaEnCurso
+from .cache_de_resultados import calcular_hash_archivo
+
+# =================================================================================
+# ESCRITURA EN STREAMING DE ARCHIVOS SUBIDOS
+# =================================================================================
+# Los bytes de una subida se reciben por partes, se acumulan en bloques grandes
+# y cada bloque se escribe a disco desde un hilo aparte (asyncio.to_thread), de
+# modo que el bucle de eventos nunca se bloquea con E/S de disco. En la misma
+# pasada se calcula el SHA-256 y se cuentan los bytes para aplicar el límite
+# de tamaño.
+
+TAMANO_MAXIMO_SUBIDA = configuracion.TAMANO_MAXIMO_SUBIDA_MB * 1024 * 1024
+TAMANO_BLOQUE_ESCRITURA = configuracion.TAMANO_BLOQUE_ESCRITURA_MB * 1024 * 1024
+
+
+class ArchivoDemasiadoGrande(Exception):
+    """Se lanza cuando una subida supera TAMANO_MAXIMO_SUBIDA_MB."""
+
+
+class ParteDeSubidaInvalida(Exception):
+    """Se lanza cuando una parte no trae exactamente los bytes que anuncia su Content-Range."""
+
+
+class SubidaOcupada(Exception):
+    """Se lanza cuando llega una parte mientras otra parte de la misma subida aún se está recibiendo."""
+
+
+# Formato de la cabecera de las subidas por partes: "bytes inicio-fin/total".
+PATRON_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+
+# Hash SHA-256 en curso de cada subida reanudable, para no releer el archivo al
+# completarla. Si el proceso se reinicia (o la parte llega a otro proceso) el
+# hash se recalcula desde el disco al final.
+_hashes_subidas_en_curso: dict[uuid.UUID, tuple[int, "hashlib._Hash"]] = {}
+
+# Subidas que están recibiendo una parte (o completándose) en este proceso. Dos
+# PUT simultáneos a la misma subida escribirían en el mismo archivo parcial, y
+# dos '/completar' la moverían dos veces; el segundo se rechaza.
+# Solo protege dentro de un proceso: con varios procesos de la API, las partes
+# de una misma subida deben llegar al mismo (como ya ocurre con el hash en memoria).
+_subidas_recibiendo: set[uuid.UUID] = set()
+# Los endpoints 'def' (completar) reservan desde el grupo de hilos de FastAPI.
+_candado_subidas = threading.Lock()
+
+
+def nombre_archivo_seguro(nombre_original: Optional[str]) -> str:
+    """
+    Convierte el nombre enviado por el cliente en uno seguro para el disco:
+    sin rutas ('../'), sin caracteres raros y con un prefijo único para que
+    dos archivos con el mismo nombre no se sobrescriban.
+    """
+    nombre = Path(nombre_original or "archivo").name
+    nombre = re.sub(r"[^\w.\-]+", "_", nombre).strip("._") or "archivo"
+    return f"{uuid.uuid4().hex[:8]}_{nombre[-150:]}"
+
+
+def directorio_del_caso(id_caso: uuid.UUID) -> Path:
+    ruta = Path(configuracion.DIRECTORIO_SUBIDAS) / str(id_caso)
+    ruta.mkdir(parents=True, exist_ok=True)
+    return ruta
+
+
+def _preparar_archivo(ruta_archivo: Path, bytes_previos: int) -> None:
+    """
+    Deja el archivo con exactamente 'bytes_previos' bytes. Así, lo que haya
+    quedado detrás de ellos (una parte rechazada o cortada por la caída del
+    proceso) nunca queda delante de la parte siguiente.
+    """
+    if not bytes_previos:
+        open(ruta_archivo, "wb").close()
+        return
+    with open(ruta_archivo, "r+b") as archivo:
+        # 'truncate' rellenaría con ceros un archivo más corto de lo esperado.
+        if archivo.seek(0, 2) < bytes_previos:
+            raise OSError(f"El archivo parcial '{ruta_archivo}' tiene menos bytes de los ya confirmados.")
+        archivo.truncate(bytes_previos)
+
+
+def _escribir_bloque(ruta_archivo: Path, bloque: bytes) -> None:
+    with open(ruta_archivo, "ab") as archivo:
+        archivo.write(bloque)
+
+
+async def guardar_flujo_en_disco(
+    partes: AsyncIterator[bytes],
+    ruta_archivo: Path,
+    bytes_previos: int = 0,
+    hash_sha256=None,
+    tamano_maximo: int = TAMANO_MAXIMO_SUBIDA,
+) -> tuple[int, "hashlib._Hash"]:
+    """
+    Escribe un flujo asíncrono de bytes en 'ruta_archivo' a partir del byte
+    'bytes_previos', actualizando el hash y aplicando el tamaño máximo.
+
+    Args:
+        partes: Iterador asíncrono de bloques de bytes (UploadFile o request.stream()).
+        ruta_archivo (Path): Archivo de destino.
+        bytes_previos (int): Bytes que el archivo ya tenía (subidas reanudables);
+            lo que hubiera después de ellos se descarta.
+        hash_sha256: Objeto hashlib a continuar; si es None se crea uno nuevo.
+        tamano_maximo (int): Total de bytes a partir del cual se lanza ArchivoDemasiadoGrande.
+
+    Returns:
+        tuple: (total de bytes del archivo, objeto hash actualizado).
+
+    Raises:
+        ArchivoDemasiadoGrande: Si el total supera 'tamano_maximo'.
+    """
+    hash_sha256 = hash_sha256 or hashlib.sha256()
+    total_bytes = bytes_previos
+    acumulado = bytearray()
+    await asyncio.to_thread(_preparar_archivo, ruta_archivo, bytes_previos)
+
+    async for parte in partes:
+        total_bytes += len(parte)
+        if total_bytes > tamano_maximo:
+            raise ArchivoDemasiadoGrande(
+                f"El archivo supera el tamaño máximo permitido ({tamano_maximo / (1024 * 1024):.0f} MiB)."
+            )
+        hash_sha256.update(parte)
+        acumulado += parte
+        if len(acumulado) >= TAMANO_BLOQUE_ESCRITURA:
+            await asyncio.to_thread(_escribir_bloque, ruta_archivo, bytes(acumulado))
+            acumulado.clear()
+
+    if acumulado:
+        await asyncio.to_thread(_escribir_bloque, ruta_archivo, bytes(acumulado))
+    return total_bytes, hash_sha256
+
+
+async def leer_upload_file_por_partes(archivo, tamano_parte: int = 1024 * 1024) -> AsyncIterator[bytes]:
+    """Adapta un UploadFile de FastAPI a un iterador asíncrono de bloques."""
+    while True:
+        parte = await archivo.read(tamano_parte)
+        if not parte:
+            break
+        yield parte
+
+
+def parsear_content_range(cabecera: str, tamano_total: int) -> tuple[int, int]:
+    """
+    Lee una cabecera "bytes inicio-fin/total" de una parte de subida.
+
+    Returns:
+        tuple: (inicio, fin), ambos incluidos.
+
+    Raises:
+        ParteDeSubidaInvalida: Si no tiene ese formato, el total no es
+            'tamano_total' o el rango está vacío o se sale del archivo.
+    """
+    coincidencia = PATRON_CONTENT_RANGE.fullmatch(cabecera.strip())
+    if not coincidencia:
+        raise ParteDeSubidaInvalida("Cabecera Content-Range inválida.")
+    inicio, fin, total = (int(grupo) for grupo in coincidencia.groups())
+    if total != tamano_total or not inicio <= fin < total:
+        raise ParteDeSubidaInvalida("Cabecera Content-Range inválida.")
+    return inicio, fin
+
+
+def reservar_subida(id_subida: uuid.UUID) -> None:
+    """
+    Marca la subida como ocupada (recibiendo una parte o completándose) en este proceso.
+
+    Raises:
+        SubidaOcupada: Si ya hay otra parte de la misma subida en camino, o se está completando.
+    """
+    with _candado_subidas:
+        if id_subida in _subidas_recibiendo:
+            raise SubidaOcupada("Ya se está recibiendo otra parte de esta subida o completándola.")
+        _subidas_recibiendo.add(id_subida)
+
+
+def liberar_subida(id_subida: uuid.UUID) -> None:
+    with _candado_subidas:
+        _subidas_recibiendo.discard(id_subida)
+
+
+async def anadir_parte_a_subida(
+    id_subida: uuid.UUID, partes: AsyncIterator[bytes], ruta_parcial: Path, bytes_previos: int, bytes_finales: int
+) -> int:
+    """
+    Añade una parte a una subida reanudable y devuelve el total de bytes recibidos.
+    La parte debe llevar el archivo exactamente hasta 'bytes_finales' (el fin de
+    su Content-Range + 1). Si falla a mitad o no cuadra, el archivo parcial se
+    recorta a 'bytes_previos' para que el cliente pueda repetir la parte desde
+    el mismo punto.
+
+    Raises:
+        ParteDeSubidaInvalida: Si la parte trae más o menos bytes de los anunciados.
+    """
+    bytes_hash, hash_sha256 = _hashes_subidas_en_curso.pop(id_subida, (None, None))
+    if bytes_hash != bytes_previos:
+        hash_sha256 = None  # El hash en memoria no corresponde; se recalculará al completar.
+    hash_continuado = hash_sha256.copy() if hash_sha256 else hashlib.sha256()
+
+    try:
+        try:
+            total_bytes, hash_continuado = await guardar_flujo_en_disco(
+                partes, ruta_parcial, bytes_previos, hash_continuado, tamano_maximo=bytes_finales
+            )
+        except ArchivoDemasiadoGrande:
+            raise ParteDeSubidaInvalida("La parte trae más bytes de los indicados en Content-Range.")
+        if total_bytes != bytes_finales:
+            raise ParteDeSubidaInvalida("La parte trae menos bytes de los indicados en Content-Range.")
+    except BaseException:
+        if ruta_parcial.exists():
+            await asyncio.to_thread(_recortar_archivo, ruta_parcial, bytes_previos)
+        if hash_sha256:
+            _hashes_subidas_en_curso[id_subida] = (bytes_previos, hash_sha256)
+        raise
+
+    if hash_sha256 or bytes_previos == 0:
+        _hashes_subidas_en_curso[id_subida] = (total_bytes, hash_continuado)
+    return total_bytes
+
+
+def _recortar_archivo(ruta_archivo: Path, tamano: int) -> None:
+    # Solo acorta: si el archivo ya era más corto, truncate lo rellenaría con ceros.
+    with open(ruta_archivo, "r+b") as archivo:
+        if archivo.seek(0, 2) > tamano:
+            archivo.truncate(tamano)
+
+
+def obtener_hash_de_subida(id_subida: uuid.UUID, ruta_parcial: Path, total_bytes: int) -> str:
+    """Devuelve el SHA-256 final de una subida reanudable (de memoria o recalculado)."""
+    bytes_hash, hash_sha256 = _hashes_subidas_en_curso.pop(id_subida, (None, None))
+    if hash_sha256 and bytes_hash == total_bytes:
+        return hash_sha256.hexdigest()
+    return calcular_hash_archivo(str(ruta_parcial))
+
+
+def limpiar_subidas_abandonadas() -> int:
+    """
+    Borra las subidas reanudables sin actividad desde hace más de
+    SUBIDAS_HORAS_ABANDONO horas: su fila, su archivo parcial y su hash en
+    memoria. La actividad es la última escritura en el archivo parcial (o la
+    creación de la subida, si aún no recibió nada). Devuelve cuántas se borraron.
+    """
+    limite = datetime.now() - timedelta(hours=configuracion.SUBIDAS_HORAS_ABANDONO)
+    limite_marca = time.time() - configuracion.SUBIDAS_HORAS_ABANDONO * 3600
+    borradas = 0
+    with Session(motor) as sesion:
+        for subida in sesion.exec(select(SubidaEnCurso).where(SubidaEnCurso.fecha_creacion < limite)).all():
+            if subida.id_subida in _subidas_recibiendo:
+                continue
+            ruta_parcial = Path(subida.ruta_parcial)
+            try:
+                if ruta_parcial.stat().st_mtime > limite_marca:
+                    continue
+                ruta_parcial.unlink()
+            except FileNotFoundError:
+                pass
+            _hashes_subidas_en_curso.pop(subida.id_subida, None)
+            sesion.delete(subida)
+            borradas += 1
+        sesion.commit()
+    if borradas:
+        print(f"TOOL-SYSTEM: {borradas} subida(s) por partes abandonada(s) eliminada(s).")
+    return borradas
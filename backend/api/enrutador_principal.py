@@ -1,15 +1,47 @@
 # backend/api/enrutador_principal.py
 
-from fastapi import APIRouter, HTTPException, File, UploadFile, Depends
-import shutil
+from fastapi import APIRouter, HTTPException, File, UploadFile, Depends, Request, Header, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+import asyncio
+import base64
+import binascii
+import json
+import os
+import time
+from typing import Optional
 from pathlib import Path
 from datetime import datetime
 import uuid
-from sqlmodel import Session, select
-from ..base_de_datos import obtener_sesion
+from sqlalchemy import String, cast, type_coerce
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import defer, selectinload
+from sqlmodel import Session, func, or_, select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from ..base_de_datos import obtener_sesion, obtener_sesion_asincrona, fabrica_sesiones_asincronas
 # ¡Importamos los nuevos modelos, ahora bien estructurados!
-from .modelos_compartidos import Caso, CasoCreacion, Evidencia, CasoLecturaConEvidencias
-from ..agentes.orquestador_del_grafo import grafo_compilado
+from .modelos_compartidos import (
+    Caso, CasoCreacion, Evidencia, CasoLecturaConEvidencias, TrabajoProcesamiento, TrabajoLectura,
+    SubidaEnCurso, SubidaCreacion, SubidaLectura, EvidenciaLectura, PaginaTranscripcion,
+    CasoResumen, EvidenciaResumen, PaginaCasos, OPCIONES_SIN_TEXTOS_PESADOS,
+)
+from .. import cola_de_trabajos
+from .. import transcripciones
+from .. import almacenamiento_subidas
+from ..almacenamiento_subidas import ArchivoDemasiadoGrande, ParteDeSubidaInvalida, SubidaOcupada
+from ..core.eventos_progreso import leer_eventos
+
+# Cada cuántos segundos revisamos si hay eventos nuevos y cada cuántos enviamos
+# un comentario "keep-alive" para que proxies y navegadores no cierren la conexión.
+SEGUNDOS_ENTRE_LECTURAS_SSE = 0.5
+SEGUNDOS_ENTRE_KEEP_ALIVE_SSE = 15
+
+# Campos que el listado de casos solo incluye si se piden con 'fields='.
+# "evidencias" añade el resumen de cada evidencia; el resto, columnas pesadas de ellas.
+CAMPOS_OPCIONALES_EVIDENCIA = (
+    "texto_extraido", "entidades_extraidas", "informacion_recuperada", "borrador_estrategia", "verificacion_calidad",
+)
+CAMPOS_OPCIONALES_CASO = ("evidencias",) + CAMPOS_OPCIONALES_EVIDENCIA
 
 router = APIRouter(tags=["Casos"])
 
@@ -21,45 +53,424 @@ def crear_caso(sesion: Session = Depends(obtener_sesion), caso_a_crear: CasoCrea
     sesion.refresh(nuevo_caso_db)
     return nuevo_caso_db
 
-@router.get("/casos", response_model=list[CasoLecturaConEvidencias])
-def listar_casos(sesion: Session = Depends(obtener_sesion)):
-    casos = sesion.exec(select(Caso)).all()
-    return casos
+def _codificar_cursor(caso: Caso) -> str:
+    return base64.urlsafe_b64encode(f"{caso.fecha_creacion.isoformat()}|{caso.id_caso}".encode()).decode()
+
+def _filtro_por_entidad(nombre_dialecto: str, entidad: str, tipo_entidad: Optional[str]):
+    """Condición sobre Evidencia: sus entidades extraídas incluyen 'entidad' (y 'tipo_entidad', si se da)."""
+    patron = {"entidad": entidad}
+    if tipo_entidad:
+        patron["tipo"] = tipo_entidad
+    if nombre_dialecto == "postgresql":
+        # Contención JSONB ('@>'), resuelta con el índice GIN de entidades_extraidas.
+        return type_coerce(Evidencia.entidades_extraidas, JSONB).contains([patron])
+    # Otras bases de datos (SQLite local): se busca en el texto del JSON el par
+    # '"entidad": "<nombre>"' tal como lo escribe json.dumps al guardarlo (con
+    # las comillas, para que "Juan" no encuentre "Juana"). El texto no permite
+    # saber si el tipo pertenece a la misma entidad, así que ese filtro se rechaza
+    # en lugar de dar resultados distintos a los de PostgreSQL.
+    if tipo_entidad:
+        raise HTTPException(status_code=400, detail="El filtro 'tipo_entidad' solo está disponible con PostgreSQL.")
+    return cast(Evidencia.entidades_extraidas, String).contains(f'"entidad": {json.dumps(entidad)}')
+
+def _decodificar_cursor(cursor: str) -> tuple[datetime, uuid.UUID]:
+    try:
+        fecha, id_caso = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), uuid.UUID(id_caso)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación no válido")
+
+@router.get("/casos", response_model=PaginaCasos, response_model_exclude_unset=True)
+async def listar_casos(
+    sesion: AsyncSession = Depends(obtener_sesion_asincrona),
+    limite: int = Query(default=20, ge=1, le=100),
+    cursor: Optional[str] = Query(default=None, description="Valor de 'siguiente' de la página anterior."),
+    campos: Optional[str] = Query(
+        default=None, alias="fields",
+        description=f"Campos adicionales separados por comas: {', '.join(CAMPOS_OPCIONALES_CASO)}.",
+    ),
+    entidad: Optional[str] = Query(default=None, description="Solo casos con alguna evidencia que mencione esta entidad (nombre exacto)."),
+    tipo_entidad: Optional[str] = Query(default=None, description="Tipo de la entidad buscada (ej. 'Persona')."),
+):
+    """
+    Lista los casos, del más reciente al más antiguo, en páginas de 'limite'.
+    La paginación es por cursor (fecha de creación + id), así pedir la página
+    100 cuesta lo mismo que pedir la primera. Por defecto cada caso va sin sus
+    evidencias; 'fields=evidencias' añade un resumen ligero de ellas y los
+    nombres de columnas pesadas (ej. 'fields=borrador_estrategia') las incluyen.
+    Con 'entidad' se filtran los casos en la base de datos por las entidades
+    extraídas de sus evidencias (ej. todos los casos que mencionan a una persona).
+    """
+    campos_pedidos = {campo.strip() for campo in (campos or "").split(",") if campo.strip()}
+    desconocidos = campos_pedidos - set(CAMPOS_OPCIONALES_CASO)
+    if desconocidos:
+        raise HTTPException(status_code=400, detail=f"Campos no válidos: {', '.join(sorted(desconocidos))}")
+    campos_evidencia = [campo for campo in CAMPOS_OPCIONALES_EVIDENCIA if campo in campos_pedidos]
+    incluir_evidencias = "evidencias" in campos_pedidos or bool(campos_evidencia)
+
+    consulta = select(Caso).order_by(Caso.fecha_creacion.desc(), Caso.id_caso.desc()).limit(limite + 1)
+    if cursor:
+        fecha, id_caso = _decodificar_cursor(cursor)
+        consulta = consulta.where(or_(
+            Caso.fecha_creacion < fecha,
+            (Caso.fecha_creacion == fecha) & (Caso.id_caso < id_caso),
+        ))
+    if entidad:
+        consulta = consulta.where(Caso.id_caso.in_(
+            select(Evidencia.id_caso).where(_filtro_por_entidad(sesion.bind.dialect.name, entidad, tipo_entidad))
+        ))
+    if incluir_evidencias:
+        # Todas las evidencias de la página en una sola consulta (sin N+1), sin
+        # leer las columnas pesadas que no se pidieron.
+        columnas_omitidas = [
+            defer(getattr(Evidencia, campo)) for campo in CAMPOS_OPCIONALES_EVIDENCIA if campo not in campos_evidencia
+        ]
+        consulta = consulta.options(selectinload(Caso.evidencias).options(*columnas_omitidas))
+    casos = (await sesion.exec(consulta)).all()
+    hay_mas = len(casos) > limite
+    casos = casos[:limite]
+
+    # Número de evidencias de cada caso de la página, en una sola consulta.
+    totales = dict((await sesion.exec(
+        select(Evidencia.id_caso, func.count()).where(Evidencia.id_caso.in_([c.id_caso for c in casos])).group_by(Evidencia.id_caso)
+    )).all()) if casos else {}
+
+    resumenes = []
+    for caso in casos:
+        resumen = CasoResumen(
+            id_caso=caso.id_caso, titulo=caso.titulo, resumen=caso.resumen,
+            fecha_creacion=caso.fecha_creacion, total_evidencias=totales.get(caso.id_caso, 0),
+        )
+        if incluir_evidencias:
+            resumen.evidencias = [
+                EvidenciaResumen(
+                    id_evidencia=evidencia.id_evidencia,
+                    nombre_archivo=evidencia.nombre_archivo,
+                    tipo_contenido=evidencia.tipo_contenido,
+                    estado_procesamiento=evidencia.estado_procesamiento,
+                    **{campo: getattr(evidencia, campo) for campo in campos_evidencia},
+                )
+                for evidencia in caso.evidencias
+            ]
+        resumenes.append(resumen)
+
+    return PaginaCasos(casos=resumenes, siguiente=_codificar_cursor(casos[-1]) if hay_mas else None)
 
 @router.get("/casos/{id_caso}", response_model=CasoLecturaConEvidencias)
-def obtener_caso(sesion: Session = Depends(obtener_sesion), id_caso: uuid.UUID = ...):
+async def obtener_caso(sesion: AsyncSession = Depends(obtener_sesion_asincrona), id_caso: uuid.UUID = ...):
+    caso = await sesion.get(Caso, id_caso)
+    if not caso:
+        raise HTTPException(status_code=404, detail="El caso no fue encontrado")
+    # Las transcripciones no viajan enteras en el detalle del caso: el frontend
+    # las pide por páginas cuando el usuario las abre. Por eso el texto extraído
+    # se lee aparte, y solo el de las evidencias sin transcripción o de video
+    # (su informe de fotogramas, sin la transcripción que lleva al final).
+    evidencias_db = (await sesion.exec(
+        select(Evidencia).where(Evidencia.id_caso == id_caso).options(defer(Evidencia.texto_extraido))
+    )).all()
+    ids_con_texto = [
+        e.id_evidencia for e in evidencias_db
+        if not e.total_segmentos_transcripcion or e.tipo_contenido.startswith("video/")
+    ]
+    textos = {
+        id_evidencia: transcripciones.quitar_transcripcion_del_informe(texto)
+        for id_evidencia, texto in (await sesion.exec(
+            select(Evidencia.id_evidencia, Evidencia.texto_extraido).where(Evidencia.id_evidencia.in_(ids_con_texto))
+        )).all()
+    } if ids_con_texto else {}
+
+    evidencias = []
+    for evidencia in evidencias_db:
+        campos = {campo: getattr(evidencia, campo) for campo in EvidenciaLectura.model_fields if campo != "texto_extraido"}
+        evidencias.append(EvidenciaLectura(**campos, texto_extraido=textos.get(evidencia.id_evidencia)))
+    return CasoLecturaConEvidencias(
+        id_caso=caso.id_caso, titulo=caso.titulo, resumen=caso.resumen,
+        fecha_creacion=caso.fecha_creacion, evidencias=evidencias,
+    )
+
+def _obtener_caso_o_404(sesion: Session, id_caso: uuid.UUID) -> Caso:
     caso = sesion.get(Caso, id_caso)
     if not caso:
         raise HTTPException(status_code=404, detail="El caso no fue encontrado")
     return caso
 
-@router.post("/casos/{id_caso}/evidencia", response_model=CasoLecturaConEvidencias)
-def subir_evidencia(
+def _registrar_evidencia_y_encolar(
+    sesion: Session, id_caso: uuid.UUID, nombre_archivo: str, ruta_archivo: Path,
+    tipo_contenido: Optional[str], hash_contenido: str,
+) -> TrabajoProcesamiento:
+    """Crea la Evidencia 'pendiente' y su trabajo en la cola, en una sola transacción."""
+    nueva_evidencia_db = Evidencia(
+        id_caso=id_caso,
+        nombre_archivo=nombre_archivo,
+        ruta_archivo=str(ruta_archivo),
+        tipo_contenido=tipo_contenido or "application/octet-stream",
+        estado_procesamiento="pendiente",
+        hash_contenido=hash_contenido,
+    )
+    sesion.add(nueva_evidencia_db)
+    trabajo = cola_de_trabajos.encolar_trabajo(sesion, nueva_evidencia_db.id_evidencia)
+    sesion.commit()
+    sesion.refresh(trabajo)
+    return trabajo
+
+@router.post("/casos/{id_caso}/evidencia", response_model=TrabajoLectura, status_code=202)
+async def subir_evidencia(
     sesion: Session = Depends(obtener_sesion),
     id_caso: uuid.UUID = ...,
     archivo: UploadFile = File(...)
 ):
-    caso_actual = sesion.get(Caso, id_caso)
-    if not caso_actual:
-        raise HTTPException(status_code=404, detail="El caso no fue encontrado")
+    """
+    Guarda el archivo, registra la Evidencia como 'pendiente' y encola su
+    procesamiento. Responde de inmediato (202) con el trabajo creado; el
+    progreso se consulta en GET /trabajos/{id_trabajo}.
 
-    # ... (código de guardado de archivo sin cambios) ...
-    ruta_guardado_caso = Path("archivos_subidos") / str(id_caso)
-    ruta_guardado_caso.mkdir(parents=True, exist_ok=True)
-    ruta_archivo_final = ruta_guardado_caso / archivo.filename
-    with open(ruta_archivo_final, "wb") as buffer:
-        shutil.copyfileobj(archivo.file, buffer)
-
-    estado_inicial = { "id_caso": str(id_caso), "ruta_archivo": str(ruta_archivo_final), "tipo_contenido": archivo.content_type }
-    estado_final = grafo_compilado.invoke(estado_inicial)
-
-    # Creamos el objeto Evidencia a partir del estado final
-    dict_evidencia = {**estado_final, "id_caso": id_caso, "nombre_archivo": archivo.filename, "ruta_archivo": str(ruta_archivo_final)}
-    nueva_evidencia_db = Evidencia.model_validate(dict_evidencia)
-    nueva_evidencia_db.estado_procesamiento = "completado" if estado_final.get("texto_extraido") else "error"
-    
-    sesion.add(nueva_evidencia_db)
+    El archivo se escribe por bloques grandes desde un hilo aparte, calculando
+    su SHA-256 y su tamaño en la misma pasada (ver almacenamiento_subidas).
+    Ojo: el formulario ya llegó entero (Starlette lo guarda en un temporal antes
+    de llamar a esta función), así que el 413 no corta la transferencia. Para
+    archivos de varios GB conviene la subida reanudable por partes
+    (POST /casos/{id_caso}/subidas), que valida el tamaño antes de recibirlo.
+    """
+    await run_in_threadpool(_obtener_caso_o_404, sesion, id_caso)
+
+    ruta_archivo_final = almacenamiento_subidas.directorio_del_caso(id_caso) / almacenamiento_subidas.nombre_archivo_seguro(archivo.filename)
+    try:
+        _, hash_sha256 = await almacenamiento_subidas.guardar_flujo_en_disco(
+            almacenamiento_subidas.leer_upload_file_por_partes(archivo), ruta_archivo_final
+        )
+    except ArchivoDemasiadoGrande as e:
+        await asyncio.to_thread(ruta_archivo_final.unlink, missing_ok=True)
+        raise HTTPException(status_code=413, detail=str(e))
+
+    return await run_in_threadpool(
+        _registrar_evidencia_y_encolar, sesion, id_caso, archivo.filename or ruta_archivo_final.name,
+        ruta_archivo_final, archivo.content_type, hash_sha256.hexdigest(),
+    )
+
+# --- Subidas reanudables por partes ---
+# 1. POST   /casos/{id_caso}/subidas                        -> crea la subida.
+# 2. PUT    /casos/{id_caso}/subidas/{id_subida}            -> envía una parte (cabecera Content-Range).
+# 3. GET    /casos/{id_caso}/subidas/{id_subida}            -> cuántos bytes hay (para reanudar).
+# 4. POST   /casos/{id_caso}/subidas/{id_subida}/completar  -> crea la Evidencia y la encola.
+
+def _obtener_subida_o_404(sesion: Session, id_caso: uuid.UUID, id_subida: uuid.UUID) -> SubidaEnCurso:
+    subida = sesion.get(SubidaEnCurso, id_subida)
+    if not subida or subida.id_caso != id_caso:
+        raise HTTPException(status_code=404, detail="La subida no fue encontrada")
+    return subida
+
+@router.post("/casos/{id_caso}/subidas", response_model=SubidaLectura, status_code=201)
+def iniciar_subida(sesion: Session = Depends(obtener_sesion), id_caso: uuid.UUID = ..., datos_subida: SubidaCreacion = ...):
+    _obtener_caso_o_404(sesion, id_caso)
+    almacenamiento_subidas.limpiar_subidas_abandonadas()
+    if datos_subida.tamano_total > almacenamiento_subidas.TAMANO_MAXIMO_SUBIDA:
+        raise HTTPException(status_code=413, detail="El archivo supera el tamaño máximo permitido.")
+
+    id_subida = uuid.uuid4()
+    subida = SubidaEnCurso(
+        id_subida=id_subida,
+        id_caso=id_caso,
+        nombre_archivo=datos_subida.nombre_archivo,
+        tipo_contenido=datos_subida.tipo_contenido,
+        tamano_total=datos_subida.tamano_total,
+        ruta_parcial=str(almacenamiento_subidas.directorio_del_caso(id_caso) / f".subida_{id_subida}.parcial"),
+    )
+    sesion.add(subida)
     sesion.commit()
-    sesion.refresh(caso_actual)
-    
-    return caso_actual
\ No newline at end of file
+    sesion.refresh(subida)
+    return subida
+
+@router.get("/casos/{id_caso}/subidas/{id_subida}", response_model=SubidaLectura)
+def obtener_subida(sesion: Session = Depends(obtener_sesion), id_caso: uuid.UUID = ..., id_subida: uuid.UUID = ...):
+    return _obtener_subida_o_404(sesion, id_caso, id_subida)
+
+@router.put("/casos/{id_caso}/subidas/{id_subida}", response_model=SubidaLectura)
+async def enviar_parte_de_subida(
+    request: Request,
+    sesion: Session = Depends(obtener_sesion),
+    id_caso: uuid.UUID = ...,
+    id_subida: uuid.UUID = ...,
+    content_range: str = Header(...),
+):
+    """
+    Recibe una parte del archivo en el cuerpo de la petición. La parte debe
+    empezar exactamente donde terminó la anterior; si no, se responde 409 con
+    los bytes ya recibidos para que el cliente continúe desde ahí. El cuerpo
+    debe traer exactamente los bytes de su Content-Range; si no, se descarta
+    la parte (400). Las partes de una misma subida se reciben de una en una.
+    """
+    try:
+        almacenamiento_subidas.reservar_subida(id_subida)
+    except SubidaOcupada as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        # Se lee después de reservarla, para ver el avance de la parte anterior.
+        subida = await run_in_threadpool(_obtener_subida_o_404, sesion, id_caso, id_subida)
+        try:
+            inicio, fin = almacenamiento_subidas.parsear_content_range(content_range, subida.tamano_total)
+        except ParteDeSubidaInvalida as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if inicio != subida.bytes_recibidos:
+            raise HTTPException(
+                status_code=409,
+                detail={"mensaje": "La parte no continúa la subida.", "bytes_recibidos": subida.bytes_recibidos},
+            )
+
+        try:
+            total_bytes = await almacenamiento_subidas.anadir_parte_a_subida(
+                id_subida, request.stream(), Path(subida.ruta_parcial), subida.bytes_recibidos, fin + 1
+            )
+        except ParteDeSubidaInvalida as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        def _guardar_avance():
+            subida.bytes_recibidos = total_bytes
+            sesion.add(subida)
+            sesion.commit()
+            sesion.refresh(subida)
+            return subida
+        return await run_in_threadpool(_guardar_avance)
+    finally:
+        almacenamiento_subidas.liberar_subida(id_subida)
+
+@router.post("/casos/{id_caso}/subidas/{id_subida}/completar", response_model=TrabajoLectura, status_code=202)
+def completar_subida(sesion: Session = Depends(obtener_sesion), id_caso: uuid.UUID = ..., id_subida: uuid.UUID = ...):
+    """
+    Crea la Evidencia de una subida ya completa y la encola. Mientras tanto la
+    subida queda reservada (como al recibir una parte), así que dos peticiones
+    simultáneas no pueden completarla dos veces.
+    """
+    try:
+        almacenamiento_subidas.reservar_subida(id_subida)
+    except SubidaOcupada as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    try:
+        subida = _obtener_subida_o_404(sesion, id_caso, id_subida)
+        if subida.bytes_recibidos != subida.tamano_total:
+            raise HTTPException(
+                status_code=409,
+                detail={"mensaje": "La subida aún no está completa.", "bytes_recibidos": subida.bytes_recibidos},
+            )
+
+        ruta_parcial = Path(subida.ruta_parcial)
+        hash_contenido = almacenamiento_subidas.obtener_hash_de_subida(id_subida, ruta_parcial, subida.tamano_total)
+        ruta_archivo_final = ruta_parcial.with_name(almacenamiento_subidas.nombre_archivo_seguro(subida.nombre_archivo))
+        os.replace(ruta_parcial, ruta_archivo_final)
+
+        try:
+            sesion.delete(subida)
+            return _registrar_evidencia_y_encolar(
+                sesion, id_caso, subida.nombre_archivo, ruta_archivo_final, subida.tipo_contenido, hash_contenido
+            )
+        except BaseException:
+            # La fila de la subida sigue apuntando a 'ruta_parcial': devolvemos
+            # el archivo allí para que se pueda completar de nuevo (o limpiar).
+            sesion.rollback()
+            os.replace(ruta_archivo_final, ruta_parcial)
+            raise
+    finally:
+        almacenamiento_subidas.liberar_subida(id_subida)
+
+@router.get("/casos/{id_caso}/evidencia/{id_evidencia}/transcripcion", response_model=PaginaTranscripcion)
+def obtener_transcripcion(
+    sesion: Session = Depends(obtener_sesion),
+    id_caso: uuid.UUID = ...,
+    id_evidencia: uuid.UUID = ...,
+    desde: int = Query(default=0, ge=0),
+    limite: int = Query(default=100, ge=1, le=500),
+    segundo: Optional[float] = Query(default=None, ge=0, description="Si se indica, la página empieza en el segmento que se oye en ese segundo."),
+):
+    """Una página de la transcripción de una evidencia, con las marcas de tiempo de cada segmento."""
+    evidencia = sesion.get(Evidencia, id_evidencia, options=OPCIONES_SIN_TEXTOS_PESADOS)
+    if not evidencia or evidencia.id_caso != id_caso:
+        raise HTTPException(status_code=404, detail="La evidencia no fue encontrada")
+    if not evidencia.total_segmentos_transcripcion:
+        raise HTTPException(status_code=404, detail="La evidencia no tiene transcripción")
+
+    total_segmentos = evidencia.total_segmentos_transcripcion
+    if segundo is not None:
+        indice = transcripciones.buscar_segmento_por_segundo(sesion, id_evidencia, segundo)
+        desde = total_segmentos if indice is None else indice
+
+    segmentos = transcripciones.leer_segmentos(sesion, id_evidencia, desde, limite)
+    return PaginaTranscripcion(
+        id_evidencia=id_evidencia,
+        total_segmentos=total_segmentos,
+        desde=desde,
+        segmentos=segmentos,
+        siguiente=desde + limite if desde + limite < total_segmentos else None,
+    )
+
+@router.get("/trabajos/{id_trabajo}", response_model=TrabajoLectura)
+async def obtener_trabajo(sesion: AsyncSession = Depends(obtener_sesion_asincrona), id_trabajo: uuid.UUID = ...):
+    trabajo = await sesion.get(TrabajoProcesamiento, id_trabajo)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="El trabajo no fue encontrado")
+    return trabajo
+
+@router.post("/trabajos/{id_trabajo}/reintentar", response_model=TrabajoLectura, status_code=202)
+def reintentar_trabajo(sesion: Session = Depends(obtener_sesion), id_trabajo: uuid.UUID = ...):
+    """Vuelve a encolar un trabajo que terminó en 'error' (por ejemplo, tras agotar sus intentos)."""
+    trabajo = sesion.get(TrabajoProcesamiento, id_trabajo)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="El trabajo no fue encontrado")
+    if trabajo.estado != "error":
+        raise HTTPException(status_code=409, detail=f"Solo se pueden reintentar trabajos en 'error' (este está '{trabajo.estado}').")
+    return cola_de_trabajos.reintentar_trabajo(sesion, trabajo)
+
+def _formatear_evento_sse(evento: dict) -> str:
+    return f"event: {evento['tipo']}\ndata: {json.dumps(evento, default=str)}\n\n"
+
+async def _generar_eventos_sse(id_evidencia: uuid.UUID):
+    """
+    Envía los eventos de progreso de una evidencia a medida que se publican,
+    hasta recibir el evento 'fin'. Si la evidencia ya terminó (o la procesa otro
+    proceso cuyos eventos no vemos), cerramos con un 'fin' construido desde la BD.
+    """
+    posicion = 0
+    ultimo_envio = time.monotonic()
+    revisar_bd = True  # En la primera vuelta siempre consultamos el estado en la BD.
+    while True:
+        eventos = leer_eventos(str(id_evidencia), posicion)
+        for evento in eventos:
+            yield _formatear_evento_sse(evento)
+            if evento["tipo"] == "fin":
+                return
+        posicion += len(eventos)
+
+        if eventos:
+            ultimo_envio = time.monotonic()
+        elif revisar_bd or time.monotonic() - ultimo_envio >= SEGUNDOS_ENTRE_KEEP_ALIVE_SSE:
+            revisar_bd = False
+            async with fabrica_sesiones_asincronas() as sesion:
+                estado = (await sesion.exec(
+                    select(Evidencia.estado_procesamiento).where(Evidencia.id_evidencia == id_evidencia)
+                )).first() or "error"
+            if estado in ("completado", "error") and not leer_eventos(str(id_evidencia), posicion):
+                yield _formatear_evento_sse({"tipo": "fin", "marca_tiempo": time.time(), "estado": estado})
+                return
+            if time.monotonic() - ultimo_envio >= SEGUNDOS_ENTRE_KEEP_ALIVE_SSE:
+                yield ": keep-alive\n\n"
+                ultimo_envio = time.monotonic()
+
+        await asyncio.sleep(SEGUNDOS_ENTRE_LECTURAS_SSE)
+
+@router.get("/casos/{id_caso}/evidencia/{id_evidencia}/eventos")
+def transmitir_eventos_evidencia(
+    sesion: Session = Depends(obtener_sesion),
+    id_caso: uuid.UUID = ...,
+    id_evidencia: uuid.UUID = ...,
+):
+    """
+    Flujo Server-Sent Events con el progreso del procesamiento de una evidencia:
+    inicio/fin de cada nodo, páginas de Nougat y fotogramas de video, con tiempos.
+    """
+    evidencia = sesion.get(Evidencia, id_evidencia, options=OPCIONES_SIN_TEXTOS_PESADOS)
+    if not evidencia or evidencia.id_caso != id_caso:
+        raise HTTPException(status_code=404, detail="La evidencia no fue encontrada")
+
+    return StreamingResponse(
+        _generar_eventos_sse(id_evidencia),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,32 @@
+# backend/api/enrutador_sistema.py
+
+from fastapi import APIRouter, HTTPException, Response
+
+from ..core import observabilidad
+from ..core.carga_perezosa import precargar_modelos
+
+router = APIRouter(prefix="/sistema", tags=["Sistema"])
+
+# Prometheus busca las métricas en /metrics, fuera del prefijo /sistema.
+router_metricas = APIRouter(tags=["Sistema"])
+
+@router.post("/precalentar")
+def precalentar_modelos():
+    """
+    Carga ya todos los modelos pesados (Whisper, Nougat, RAG, Gemini) en este
+    proceso, en lugar de esperar a la primera evidencia que los necesite.
+    Devuelve, por modelo, si quedó disponible y cuánto tardó en cargar.
+    """
+    return precargar_modelos()
+
+@router_metricas.get("/metrics", include_in_schema=False)
+def leer_metricas():
+    """
+    Métricas de este proceso en el formato de texto de Prometheus: latencia de
+    nodos, herramientas y modelo de lenguaje, tokens gastados, espera y
+    profundidad de la cola (ver core/observabilidad).
+    """
+    if not observabilidad.METRICAS_DISPONIBLES:
+        raise HTTPException(status_code=503, detail="Métricas desactivadas o 'prometheus_client' no instalado.")
+    contenido, tipo_contenido = observabilidad.generar_metricas()
+    return Response(content=contenido, media_type=tipo_contenido)
@@ -1,36 +1,23 @@
 # backend/api/modelos_compartidos.py
 
 from sqlmodel import Field, SQLModel, Relationship
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict
 from datetime import datetime
 import uuid
-import json
-from sqlalchemy import Column, Text
-from sqlalchemy.types import TypeDecorator
+from sqlalchemy import JSON, Column, Index, Text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import defer
 
 # =================================================================================
-# SECCIÓN 1: "TRADUCTOR" PERSONALIZADO PARA LA BASE DE DATOS
+# SECCIÓN 1: TIPO JSON PARA LA BASE DE DATOS
 # =================================================================================
 
-class JsonType(TypeDecorator):
-    """
-    Esta es nuestra clase "Traductora". Le enseña a la base de datos
-    cómo manejar listas y diccionarios de Python.
-    - Cuando guardamos datos (process_bind_param), convierte el objeto de Python en texto JSON.
-    - Cuando leemos datos (process_result_value), convierte el texto JSON de vuelta a un objeto de Python.
-    """
-    impl = Text
-    cache_ok = True
-
-    def process_bind_param(self, value: Optional[Any], dialect: Any) -> Optional[str]:
-        if value is not None:
-            return json.dumps(value)
-        return None
-
-    def process_result_value(self, value: Optional[str], dialect: Any) -> Optional[Any]:
-        if value is not None:
-            return json.loads(value)
-        return None
+# Listas y diccionarios de Python. En PostgreSQL se guardan como JSONB nativo
+# (binario, indexable con GIN y consultable desde SQL); en otras bases de datos
+# (SQLite en pruebas locales) se usa el tipo JSON genérico de SQLAlchemy.
+# 'none_as_null' guarda None como NULL de SQL (y no como el JSON 'null'), para
+# que los filtros '!= None' / 'IS NOT NULL' funcionen.
+JsonType = JSON(none_as_null=True).with_variant(JSONB(none_as_null=True), "postgresql")
 
 # =================================================================================
 # SECCIÓN 2: MODELOS DE TABLAS DE BASE DE DATOS
@@ -40,10 +27,19 @@ class Caso(SQLModel, table=True):
     id_caso: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     titulo: str
     resumen: Optional[str] = Field(default=None)
-    fecha_creacion: datetime = Field(default_factory=datetime.now)
+    fecha_creacion: datetime = Field(default_factory=datetime.now, index=True)
     evidencias: List["Evidencia"] = Relationship(back_populates="caso")
 
 class Evidencia(SQLModel, table=True):
+    # Índice GIN sobre las entidades (solo PostgreSQL): permite buscar del lado
+    # del servidor, por ejemplo, todos los casos que mencionan a una persona.
+    __table_args__ = (
+        Index(
+            "ix_evidencia_entidades_extraidas_gin", "entidades_extraidas",
+            postgresql_using="gin", postgresql_ops={"entidades_extraidas": "jsonb_path_ops"},
+        ).ddl_if(dialect="postgresql"),
+    )
+
     id_evidencia: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
     id_caso: uuid.UUID = Field(foreign_key="caso.id_caso")
     
@@ -51,17 +47,102 @@ class Evidencia(SQLModel, table=True):
     ruta_archivo: str
     tipo_contenido: str
     estado_procesamiento: str = Field(default="pendiente")
+    # SHA-256 del contenido del archivo: permite reutilizar extracciones previas.
+    hash_contenido: Optional[str] = Field(default=None, index=True)
     
-    # --- Columnas con nuestro "Traductor" ---
-    # En lugar de Text, usamos nuestro JsonType para estas columnas.
+    # --- Columnas pesadas ---
+    # Los textos largos no se cargan en consultas que no los necesitan (ver
+    # OPCIONES_SIN_TEXTOS_PESADOS) y las listas/diccionarios usan JsonType.
     texto_extraido: Optional[str] = Field(default=None, sa_column=Column(Text))
     entidades_extraidas: Optional[List[Dict]] = Field(default=None, sa_column=Column(JsonType))
     informacion_recuperada: Optional[List[str]] = Field(default=None, sa_column=Column(JsonType))
     borrador_estrategia: Optional[str] = Field(default=None, sa_column=Column(Text))
     verificacion_calidad: Optional[Dict] = Field(default=None, sa_column=Column(JsonType))
+    # Número de segmentos con marca de tiempo guardados en 'bloquetranscripcion' (solo audios).
+    total_segmentos_transcripcion: Optional[int] = Field(default=None)
 
     caso: "Caso" = Relationship(back_populates="evidencias")
 
+# Opciones de consulta para leer evidencias sin sus textos largos. Si luego se
+# accede a uno de ellos, SQLAlchemy lo carga en ese momento.
+OPCIONES_SIN_TEXTOS_PESADOS = (defer(Evidencia.texto_extraido), defer(Evidencia.borrador_estrategia))
+
+class BloqueTranscripcion(SQLModel, table=True):
+    """
+    Un bloque de segmentos consecutivos de la transcripción de una evidencia,
+    guardado en columnas (inicios, fines y textos como listas JSON paralelas).
+    Partir la transcripción en bloques permite paginar y saltar a un segundo
+    concreto leyendo solo uno o dos bloques, no la transcripción entera.
+    """
+    id_evidencia: uuid.UUID = Field(foreign_key="evidencia.id_evidencia", primary_key=True)
+    numero_bloque: int = Field(primary_key=True)
+    primer_segmento: int  # Posición del primer segmento del bloque en la transcripción.
+    cantidad: int
+    segundo_inicio: float
+    segundo_fin: float = Field(index=True)
+    inicios: List[float] = Field(sa_column=Column(JsonType, nullable=False))
+    fines: List[float] = Field(sa_column=Column(JsonType, nullable=False))
+    textos: List[str] = Field(sa_column=Column(JsonType, nullable=False))
+
+class ResultadoExtraccion(SQLModel, table=True):
+    """
+    Caché de textos extraídos, direccionada por contenido. La clave es el
+    SHA-256 del archivo junto con la versión de la herramienta que lo procesó,
+    así un cambio de modelo o de prompt invalida los resultados anteriores.
+    """
+    hash_contenido: str = Field(primary_key=True)
+    version_herramienta: str = Field(primary_key=True)
+    texto_extraido: str = Field(sa_column=Column(Text, nullable=False))
+    fecha_creacion: datetime = Field(default_factory=datetime.now)
+
+class RespuestaLLMEnCache(SQLModel, table=True):
+    """
+    Caché de respuestas del modelo de lenguaje. La clave es el SHA-256 del
+    nombre del modelo junto con el prompt normalizado. 'embedding' solo se
+    guarda si está activada la búsqueda de prompts casi idénticos.
+    """
+    clave: str = Field(primary_key=True)
+    nombre_modelo: str = Field(index=True)
+    longitud_prompt: int
+    respuesta: str = Field(sa_column=Column(Text, nullable=False))
+    embedding: Optional[List[float]] = Field(default=None, sa_column=Column(JsonType))
+    fecha_creacion: datetime = Field(default_factory=datetime.now, index=True)
+    fecha_ultimo_uso: datetime = Field(default_factory=datetime.now, index=True)
+
+class SubidaEnCurso(SQLModel, table=True):
+    """
+    Una subida reanudable por partes (para videos de varios GB). El archivo se
+    va escribiendo en 'ruta_parcial'; al completarse se crea la Evidencia.
+    """
+    id_subida: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    id_caso: uuid.UUID = Field(foreign_key="caso.id_caso")
+    nombre_archivo: str
+    tipo_contenido: str
+    tamano_total: int
+    bytes_recibidos: int = Field(default=0)
+    ruta_parcial: str
+    fecha_creacion: datetime = Field(default_factory=datetime.now)
+
+class TrabajoProcesamiento(SQLModel, table=True):
+    """
+    Un trabajo de la cola de procesamiento. Cada evidencia subida genera un
+    trabajo que los hilos trabajadores toman en orden de llegada.
+    Estados posibles: 'pendiente', 'en_proceso', 'completado', 'error'.
+
+    Mientras está 'en_proceso', el trabajador actualiza 'fecha_latido'; si deja
+    de hacerlo (proceso caído), otro trabajador lo retoma. 'intentos' cuenta las
+    veces que un trabajador lo reclamó, para no reintentarlo indefinidamente.
+    """
+    id_trabajo: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    id_evidencia: uuid.UUID = Field(foreign_key="evidencia.id_evidencia", index=True)
+    estado: str = Field(default="pendiente", index=True)
+    error: Optional[str] = Field(default=None, sa_column=Column(Text))
+    fecha_creacion: datetime = Field(default_factory=datetime.now, index=True)
+    fecha_inicio: Optional[datetime] = Field(default=None)
+    fecha_fin: Optional[datetime] = Field(default=None)
+    fecha_latido: Optional[datetime] = Field(default=None, index=True)
+    intentos: int = Field(default=0)
+
 # =================================================================================
 # SECCIÓN 3: MODELOS DE LA API (Entrada y Salida)
 # =================================================================================
@@ -81,6 +162,9 @@ class EvidenciaLectura(SQLModel):
     informacion_recuperada: Optional[List[str]]
     borrador_estrategia: Optional[str]
     verificacion_calidad: Optional[Dict]
+    # Si hay transcripción, 'texto_extraido' no se envía: se pide por páginas
+    # a /casos/{id_caso}/evidencia/{id_evidencia}/transcripcion.
+    total_segmentos_transcripcion: Optional[int] = None
 
 class CasoLectura(SQLModel):
     id_caso: uuid.UUID
@@ -89,4 +173,63 @@ class CasoLectura(SQLModel):
     fecha_creacion: datetime
 
 class CasoLecturaConEvidencias(CasoLectura):
-    evidencias: List[EvidenciaLectura] = []
\ No newline at end of file
+    evidencias: List[EvidenciaLectura] = []
+
+class EvidenciaResumen(SQLModel):
+    """
+    Evidencia dentro del listado de casos: solo columnas ligeras, más las
+    pesadas que se pidan expresamente con 'fields='.
+    """
+    id_evidencia: uuid.UUID
+    nombre_archivo: str
+    tipo_contenido: str
+    estado_procesamiento: str
+    texto_extraido: Optional[str] = None
+    entidades_extraidas: Optional[List[Dict]] = None
+    informacion_recuperada: Optional[List[str]] = None
+    borrador_estrategia: Optional[str] = None
+    verificacion_calidad: Optional[Dict] = None
+
+class CasoResumen(CasoLectura):
+    total_evidencias: int
+    evidencias: Optional[List[EvidenciaResumen]] = None
+
+class PaginaCasos(SQLModel):
+    casos: List[CasoResumen]
+    siguiente: Optional[str]  # Cursor para pedir la página siguiente (None si es la última).
+
+class SubidaCreacion(SQLModel):
+    nombre_archivo: str
+    tipo_contenido: str
+    tamano_total: int
+
+class SubidaLectura(SQLModel):
+    id_subida: uuid.UUID
+    id_caso: uuid.UUID
+    nombre_archivo: str
+    tipo_contenido: str
+    tamano_total: int
+    bytes_recibidos: int
+
+class TrabajoLectura(SQLModel):
+    id_trabajo: uuid.UUID
+    id_evidencia: uuid.UUID
+    estado: str
+    error: Optional[str]
+    intentos: int = 0
+    fecha_creacion: datetime
+    fecha_inicio: Optional[datetime]
+    fecha_fin: Optional[datetime]
+
+class SegmentoTranscripcion(SQLModel):
+    indice: int
+    inicio: float
+    fin: float
+    texto: str
+
+class PaginaTranscripcion(SQLModel):
+    id_evidencia: uuid.UUID
+    total_segmentos: int
+    desde: int
+    segmentos: List[SegmentoTranscripcion]
+    siguiente: Optional[int]  # Valor de 'desde' para la página siguiente (None si es la última).
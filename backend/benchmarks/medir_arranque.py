@@ -0,0 +1,88 @@
+# backend/benchmarks/medir_arranque.py
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+# =================================================================================
+# BENCHMARK DE ARRANQUE
+# =================================================================================
+# Mide cuánto tarda en importarse cada módulo pesado, cada vez en un proceso
+# Python nuevo (sin nada en caché de sys.modules), y opcionalmente cuánto tarda
+# en cargarse cada modelo en su primer uso.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m backend.benchmarks.medir_arranque
+#   python -m backend.benchmarks.medir_arranque --repeticiones 5 --con-modelos --salida arranque.json
+
+RAIZ_REPOSITORIO = Path(__file__).resolve().parents[2]
+
+MODULOS_A_MEDIR = [
+    "backend.main",
+    "backend.herramientas.herramientas_audio",
+    "backend.herramientas.herramientas_documentos",
+    "backend.herramientas.herramientas_video",
+    "backend.herramientas.herramientas_lenguaje",
+    "backend.agentes.orquestador_del_grafo",
+]
+
+_CODIGO_MEDIR_IMPORTACION = """
+import time, json
+inicio = time.perf_counter()
+import {modulo}
+print(json.dumps(time.perf_counter() - inicio))
+"""
+
+_CODIGO_MEDIR_MODELOS = """
+import json
+from backend.core.carga_perezosa import precargar_modelos
+print(json.dumps(precargar_modelos()))
+"""
+
+
+def _ejecutar_en_proceso_nuevo(codigo: str):
+    """Ejecuta código en un intérprete nuevo y devuelve la última línea de salida como JSON."""
+    proceso = subprocess.run(
+        [sys.executable, "-c", codigo], cwd=RAIZ_REPOSITORIO, capture_output=True, text=True
+    )
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr.strip().splitlines()[-1] if proceso.stderr.strip() else "error desconocido")
+    return json.loads(proceso.stdout.strip().splitlines()[-1])
+
+
+def medir_importaciones(repeticiones: int) -> dict:
+    resultados = {}
+    for modulo in MODULOS_A_MEDIR:
+        try:
+            tiempos = [_ejecutar_en_proceso_nuevo(_CODIGO_MEDIR_IMPORTACION.format(modulo=modulo)) for _ in range(repeticiones)]
+            resultados[modulo] = {
+                "segundos_mediana": round(statistics.median(tiempos), 3),
+                "segundos_minimo": round(min(tiempos), 3),
+            }
+        except RuntimeError as e:
+            resultados[modulo] = {"error": str(e)}
+        print(f"BENCHMARK: {modulo}: {resultados[modulo]}")
+    return resultados
+
+
+def main() -> None:
+    analizador = argparse.ArgumentParser(description="Mide el tiempo de importación de los módulos y de carga de los modelos.")
+    analizador.add_argument("--repeticiones", type=int, default=3)
+    analizador.add_argument("--con-modelos", action="store_true", help="Mide también la carga de cada modelo pesado.")
+    analizador.add_argument("--salida", type=Path, help="Archivo JSON donde guardar los resultados.")
+    argumentos = analizador.parse_args()
+
+    resultados = {"importaciones": medir_importaciones(argumentos.repeticiones)}
+    if argumentos.con_modelos:
+        resultados["carga_de_modelos"] = _ejecutar_en_proceso_nuevo(_CODIGO_MEDIR_MODELOS)
+
+    print(json.dumps(resultados, indent=2, ensure_ascii=False))
+    if argumentos.salida:
+        argumentos.salida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
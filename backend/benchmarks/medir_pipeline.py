@@ -0,0 +1,435 @@
+# backend/benchmarks/medir_pipeline.py
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+# =================================================================================
+# BENCHMARK DEL GRAFO COMPLETO (DE LA EVIDENCIA AL GUARDIÁN DE CALIDAD)
+# =================================================================================
+# Genera evidencias sintéticas (PDF con texto, audio y video), las pasa por el
+# grafo completo con el modelo de lenguaje simulado (ver proveedores_llm) y mide:
+#   - p50 / p95 de cada nodo (a partir de los eventos 'nodo_fin' de medir_nodo),
+#   - p50 / p95 del trabajo completo por tipo de evidencia,
+#   - pico de memoria y trabajos por minuto con N trabajos a la vez (hilos, como
+#     los trabajadores de la cola).
+# Whisper, OpenCV, PyMuPDF y el sistema RAG son los reales: lo que se mide es
+# nuestro propio coste, separado del tiempo del modelo de lenguaje.
+#
+# El audio tiene que llevar voz (si no, Whisper no transcribe nada y el trabajo
+# termina sin llegar a la síntesis): se genera con espeak-ng / espeak o se toma
+# de un WAV propio con --audio-voz. Si algún trabajo no llega hasta el guardián
+# de calidad, el proceso también termina con código 1.
+#
+# Los resultados se guardan en JSON y se pueden comparar con una ejecución
+# anterior; el proceso termina con código 1 si algo empeoró más del umbral.
+#
+# Uso (desde la raíz del repositorio):
+#   python -m backend.benchmarks.medir_pipeline
+#   python -m backend.benchmarks.medir_pipeline --concurrencias 1,4,8 --trabajos 12 --tipos pdf,video
+#   python -m backend.benchmarks.medir_pipeline --comparar-con backend/benchmarks/resultados/pipeline_base.json
+
+CARPETA_RESULTADOS = Path(__file__).resolve().parent / "resultados"
+
+TIPOS_CONTENIDO = {
+    "pdf": "application/pdf",
+    "audio": "audio/wav",
+    "video": "video/mp4",
+}
+
+FRASE_AUDIO = (
+    "Declaración número {numero}. El día {dia} de marzo el señor Carlos Pérez firmó un contrato de "
+    "arrendamiento con la empresa Inmobiliaria Andina en Bogotá. El arrendador no entregó el inmueble "
+    "y se quedó con el depósito de dos millones de pesos."
+)
+
+PARRAFO_PDF = (
+    "El día {dia} de marzo el señor Carlos Pérez firmó un contrato de arrendamiento con la "
+    "empresa Inmobiliaria Andina S.A.S. en Bogotá. El arrendador incumplió la entrega del "
+    "inmueble y retuvo el depósito. Evidencia sintética número {numero}, página {pagina}."
+)
+
+
+# =================================================================================
+# SECCIÓN 1: EVIDENCIAS SINTÉTICAS
+# =================================================================================
+# Cada trabajo recibe su propio archivo (con su número dentro), así ninguna
+# caché puede reutilizar el resultado de otro trabajo.
+
+def crear_pdf(ruta: Path, numero: int, paginas: int) -> None:
+    """PDF con texto nativo (el camino habitual de los PDF digitales, sin Nougat)."""
+    import fitz  # PyMuPDF
+
+    documento = fitz.open()
+    for pagina in range(1, paginas + 1):
+        hoja = documento.new_page()
+        texto = "\n\n".join(PARRAFO_PDF.format(dia=(pagina % 28) + 1, numero=numero, pagina=pagina) for _ in range(6))
+        hoja.insert_textbox(fitz.Rect(50, 50, 550, 800), texto, fontsize=10)
+    documento.save(str(ruta))
+    documento.close()
+
+
+def programa_de_voz() -> Optional[str]:
+    """El sintetizador de voz disponible (espeak-ng o espeak), o None."""
+    return shutil.which("espeak-ng") or shutil.which("espeak")
+
+
+def crear_audio(ruta: Path, numero: int, segundos: int, audio_voz: Optional[Path] = None) -> None:
+    """
+    WAV con voz de unos 'segundos': la grabación 'audio_voz' o, si no se da,
+    una declaración leída por espeak. Las frases se repiten hasta llenar la
+    duración; el número de la evidencia va dentro (o, con 'audio_voz', en unas
+    muestras de silencio al final) para que cada archivo sea distinto.
+    """
+    if audio_voz is None:
+        frase = FRASE_AUDIO.format(numero=numero, dia=(numero % 28) + 1)
+        # A 150 palabras por minuto, espeak lee 2,5 palabras por segundo.
+        repeticiones = max(1, round(segundos * 2.5 / len(frase.split())))
+        subprocess.run(
+            [programa_de_voz(), "-v", "es", "-s", "150", "-w", str(ruta), " ".join([frase] * repeticiones)],
+            check=True, capture_output=True,
+        )
+        return
+
+    with wave.open(str(audio_voz), "rb") as original:
+        parametros = original.getparams()
+        muestras = original.readframes(original.getnframes())
+    repeticiones = max(1, round(segundos * parametros.framerate / max(1, parametros.nframes)))
+    silencio = b"\0" * parametros.sampwidth * parametros.nchannels * (numero % 1000 + 1)
+    with wave.open(str(ruta), "wb") as archivo:
+        archivo.setnchannels(parametros.nchannels)
+        archivo.setsampwidth(parametros.sampwidth)
+        archivo.setframerate(parametros.framerate)
+        archivo.writeframes(muestras * repeticiones + silencio)
+
+
+def crear_video(ruta: Path, numero: int, segundos: int) -> None:
+    """MP4 de 640x360 a 10 fps con un cambio de escena cada 5 segundos."""
+    import cv2
+    import numpy as np
+
+    fps = 10
+    escritor = cv2.VideoWriter(str(ruta), cv2.VideoWriter_fourcc(*"mp4v"), fps, (640, 360))
+    for indice in range(segundos * fps):
+        escena = indice // (5 * fps)
+        fotograma = np.full((360, 640, 3), (escena * 70 + numero * 13) % 256, dtype=np.uint8)
+        cv2.rectangle(fotograma, (40 + escena * 60, 60), (240 + escena * 60, 300), (255, 255 - escena * 40, 0), -1)
+        cv2.putText(fotograma, f"Evidencia {numero} - escena {escena}", (40, 340),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        escritor.write(fotograma)
+    escritor.release()
+
+
+def crear_evidencias(carpeta: Path, tipos: list[str], cantidad: int, primer_numero: int, argumentos) -> list[tuple[str, Path]]:
+    """Crea 'cantidad' evidencias repartidas por turnos entre los tipos pedidos."""
+    evidencias = []
+    for numero in range(primer_numero, primer_numero + cantidad):
+        tipo = tipos[numero % len(tipos)]
+        if tipo == "pdf":
+            ruta = carpeta / f"evidencia_{numero}.pdf"
+            crear_pdf(ruta, numero, argumentos.paginas_pdf)
+        elif tipo == "audio":
+            ruta = carpeta / f"evidencia_{numero}.wav"
+            crear_audio(ruta, numero, argumentos.segundos_audio, argumentos.audio_voz)
+        else:
+            ruta = carpeta / f"evidencia_{numero}.mp4"
+            crear_video(ruta, numero, argumentos.segundos_video)
+        evidencias.append((tipo, ruta))
+    return evidencias
+
+
+# =================================================================================
+# SECCIÓN 2: MEDICIÓN
+# =================================================================================
+
+def _memoria_actual_mb() -> Optional[float]:
+    """Memoria residente actual del proceso (solo Linux, vía /proc)."""
+    try:
+        with open("/proc/self/statm") as archivo:
+            paginas_residentes = int(archivo.read().split()[1])
+        return paginas_residentes * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _memoria_maxima_proceso_mb() -> Optional[float]:
+    """Pico de memoria residente del proceso desde que arrancó."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux lo da en KiB; macOS, en bytes.
+    return round(pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024, 1)
+
+
+class MedidorDeMemoria:
+    """Muestrea la memoria residente en segundo plano y guarda el pico de un escenario."""
+
+    def __init__(self, segundos_entre_muestras: float = 0.1):
+        self.segundos_entre_muestras = segundos_entre_muestras
+        self.pico_mb: Optional[float] = None
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, daemon=True)
+
+    def _muestrear(self) -> None:
+        while True:
+            actual = _memoria_actual_mb()
+            if actual is not None:
+                self.pico_mb = max(self.pico_mb or 0.0, actual)
+            if self._detener.wait(self.segundos_entre_muestras):
+                return
+
+    def __enter__(self):
+        self._hilo.start()
+        return self
+
+    def __exit__(self, *_):
+        self._detener.set()
+        self._hilo.join()
+
+
+def _percentil(valores: list[float], percentil: float) -> float:
+    """Percentil con interpolación lineal entre los dos valores más cercanos."""
+    ordenados = sorted(valores)
+    posicion = (len(ordenados) - 1) * percentil / 100
+    inferior = int(posicion)
+    superior = min(inferior + 1, len(ordenados) - 1)
+    return ordenados[inferior] + (ordenados[superior] - ordenados[inferior]) * (posicion - inferior)
+
+
+def _resumir(duraciones: list[float]) -> dict:
+    return {
+        "llamadas": len(duraciones),
+        "segundos_p50": round(_percentil(duraciones, 50), 3),
+        "segundos_p95": round(_percentil(duraciones, 95), 3),
+        "segundos_maximo": round(max(duraciones), 3),
+    }
+
+
+def ejecutar_trabajo(grafo_compilado, tipo: str, ruta: Path) -> dict:
+    """
+    Pasa una evidencia por el grafo igual que un trabajador de la cola (mismo
+    estado inicial, mismos eventos de progreso), pero sin base de datos.
+    """
+    import shutil
+    from ..agentes.puntos_de_control import borrar_puntos_de_control, configuracion_de_hilo
+    from ..core import configuracion, eventos_progreso
+
+    id_evidencia = f"benchmark-{uuid.uuid4()}"
+    estado_inicial = {"id_caso": id_evidencia, "ruta_archivo": str(ruta), "tipo_contenido": TIPOS_CONTENIDO[tipo]}
+    config = configuracion_de_hilo(id_evidencia) if grafo_compilado.checkpointer is not None else None
+
+    token_contexto = eventos_progreso.evidencia_actual.set(id_evidencia)
+    inicio = time.perf_counter()
+    estado_final, error = {}, None
+    try:
+        estado_final = grafo_compilado.invoke(estado_inicial, config)
+    except Exception as e:
+        error = str(e)
+    finally:
+        eventos_progreso.evidencia_actual.reset(token_contexto)
+    segundos = time.perf_counter() - inicio
+
+    borrar_puntos_de_control(grafo_compilado.checkpointer, id_evidencia)
+    # El análisis de video guarda sus fotogramas en DIRECTORIO_SUBIDAS/<id_caso>/.
+    shutil.rmtree(Path(configuracion.DIRECTORIO_SUBIDAS) / id_evidencia, ignore_errors=True)
+
+    duraciones_por_nodo: dict[str, list[float]] = {}
+    for evento in eventos_progreso.leer_eventos(id_evidencia):
+        if evento["tipo"] == "nodo_fin":
+            duraciones_por_nodo.setdefault(evento["nodo"], []).append(evento["duracion_segundos"])
+
+    return {
+        "tipo": tipo,
+        "segundos": segundos,
+        "nodos": duraciones_por_nodo,
+        "completo": bool(estado_final.get("borrador_estrategia") and estado_final.get("verificacion_calidad")),
+        "error": error,
+    }
+
+
+def medir_escenario(grafo_compilado, evidencias: list[tuple[str, Path]], concurrencia: int) -> dict:
+    """Procesa todas las evidencias con 'concurrencia' trabajos a la vez."""
+    with MedidorDeMemoria() as medidor, ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        inicio = time.perf_counter()
+        resultados = list(ejecutor.map(lambda evidencia: ejecutar_trabajo(grafo_compilado, *evidencia), evidencias))
+        segundos_totales = time.perf_counter() - inicio
+
+    duraciones_por_nodo: dict[str, list[float]] = {}
+    duraciones_por_tipo: dict[str, list[float]] = {}
+    for resultado in resultados:
+        duraciones_por_tipo.setdefault(resultado["tipo"], []).append(resultado["segundos"])
+        for nodo, duraciones in resultado["nodos"].items():
+            duraciones_por_nodo.setdefault(nodo, []).extend(duraciones)
+
+    return {
+        "concurrencia": concurrencia,
+        "trabajos": len(resultados),
+        "trabajos_completos": sum(r["completo"] for r in resultados),
+        "errores": [r["error"] for r in resultados if r["error"]],
+        "segundos_totales": round(segundos_totales, 3),
+        "trabajos_por_minuto": round(len(resultados) * 60 / segundos_totales, 2),
+        "memoria_pico_mb": round(medidor.pico_mb, 1) if medidor.pico_mb is not None else None,
+        "memoria_maxima_proceso_mb": _memoria_maxima_proceso_mb(),
+        "nodos": {nodo: _resumir(duraciones) for nodo, duraciones in duraciones_por_nodo.items()},
+        "trabajo_por_tipo": {tipo: _resumir(duraciones) for tipo, duraciones in duraciones_por_tipo.items()},
+    }
+
+
+# =================================================================================
+# SECCIÓN 3: COMPARACIÓN CON UNA EJECUCIÓN ANTERIOR
+# =================================================================================
+
+def comparar_resultados(anteriores: dict, actuales: dict, umbral: float) -> list[str]:
+    """
+    Compara el p95 de cada nodo y tipo de trabajo, y los trabajos por minuto, de
+    los escenarios presentes en ambas ejecuciones.
+
+    Returns:
+        list[str]: Una línea por cada métrica que empeoró más de 'umbral' (fracción).
+    """
+    regresiones = []
+    for escenario, actual in actuales["escenarios"].items():
+        anterior = anteriores.get("escenarios", {}).get(escenario)
+        if not anterior:
+            continue
+        metricas = [("trabajos_por_minuto", anterior["trabajos_por_minuto"], actual["trabajos_por_minuto"], False)]
+        for grupo in ("nodos", "trabajo_por_tipo"):
+            for nombre, resumen in actual[grupo].items():
+                if nombre in anterior[grupo]:
+                    metricas.append((f"{nombre} p95", anterior[grupo][nombre]["segundos_p95"], resumen["segundos_p95"], True))
+
+        for nombre, valor_anterior, valor_actual, menos_es_mejor in metricas:
+            if not valor_anterior:
+                continue
+            cambio = (valor_actual - valor_anterior) / valor_anterior
+            empeoro = cambio > umbral if menos_es_mejor else cambio < -umbral
+            linea = f"{escenario} / {nombre}: {valor_anterior} -> {valor_actual} ({cambio:+.1%})"
+            print(f"BENCHMARK: {linea}{'  <-- REGRESIÓN' if empeoro else ''}")
+            if empeoro:
+                regresiones.append(linea)
+    return regresiones
+
+
+# =================================================================================
+# SECCIÓN 4: LÍNEA DE COMANDOS
+# =================================================================================
+
+def _configurar_entorno(argumentos) -> None:
+    """
+    Fija la configuración ANTES de importar el backend (configuracion lee las
+    variables de entorno al importarse).
+    """
+    os.environ["PROVEEDOR_LLM"] = argumentos.proveedor_llm
+    os.environ["LLM_SIMULADO_SEGUNDOS_LATENCIA"] = str(argumentos.latencia_llm)
+    os.environ["PUNTOS_DE_CONTROL_GRAFO"] = argumentos.puntos_de_control
+    if not argumentos.con_caches:
+        os.environ["CACHE_EXTRACCIONES_ACTIVADA"] = "false"
+        os.environ["CACHE_LLM_ACTIVADA"] = "false"
+
+
+def main() -> None:
+    analizador = argparse.ArgumentParser(description="Mide el grafo completo con evidencias sintéticas y el modelo de lenguaje simulado.")
+    analizador.add_argument("--tipos", default="pdf,audio,video", help="Tipos de evidencia, separados por comas.")
+    analizador.add_argument("--concurrencias", default="1,2,4", help="Trabajos a la vez en cada escenario, separados por comas.")
+    analizador.add_argument("--trabajos", type=int, default=6, help="Trabajos por escenario.")
+    analizador.add_argument("--paginas-pdf", type=int, default=5)
+    analizador.add_argument("--segundos-audio", type=int, default=30)
+    analizador.add_argument("--segundos-video", type=int, default=20)
+    analizador.add_argument("--audio-voz", type=Path, help="WAV con voz para las evidencias de audio (si no, se generan con espeak-ng / espeak).")
+    analizador.add_argument("--permitir-incompletos", action="store_true", help="No termina con código 1 si algún trabajo no llega al guardián de calidad.")
+    analizador.add_argument("--proveedor-llm", default="simulado", choices=["simulado", "local", "gemini"])
+    analizador.add_argument("--latencia-llm", type=float, default=0.0, help="Segundos por llamada del modelo simulado.")
+    analizador.add_argument("--puntos-de-control", default="memoria", choices=["memoria", "sqlite", "postgres", "ninguno"])
+    analizador.add_argument("--con-caches", action="store_true", help="No apaga las cachés de extracciones y de respuestas (necesitan la base de datos).")
+    analizador.add_argument("--sin-calentamiento", action="store_true", help="No ejecuta antes un trabajo por tipo (carga de modelos incluida en la medida).")
+    analizador.add_argument("--salida", type=Path, help="Archivo JSON de resultados (por defecto, en benchmarks/resultados/).")
+    analizador.add_argument("--comparar-con", type=Path, help="Resultados anteriores con los que comparar.")
+    analizador.add_argument("--umbral-regresion", type=float, default=0.10, help="Empeoramiento tolerado (0.10 = 10 %%).")
+    argumentos = analizador.parse_args()
+
+    tipos = [tipo.strip() for tipo in argumentos.tipos.split(",") if tipo.strip()]
+    tipos_desconocidos = set(tipos) - set(TIPOS_CONTENIDO)
+    if tipos_desconocidos:
+        analizador.error(f"Tipos desconocidos: {', '.join(sorted(tipos_desconocidos))}. Opciones: {', '.join(TIPOS_CONTENIDO)}.")
+    concurrencias = [int(valor) for valor in argumentos.concurrencias.split(",")]
+    if "audio" in tipos and argumentos.audio_voz is None and programa_de_voz() is None:
+        analizador.error(
+            "Las evidencias de audio necesitan voz: instala espeak-ng, indica un WAV con --audio-voz "
+            "o quita 'audio' de --tipos."
+        )
+
+    _configurar_entorno(argumentos)
+    from ..agentes.orquestador_del_grafo import grafo_compilado
+
+    resultados = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "entorno": {
+            "python": platform.python_version(),
+            "plataforma": platform.platform(),
+            "procesadores": os.cpu_count(),
+        },
+        "parametros": {clave: str(valor) if isinstance(valor, Path) else valor for clave, valor in vars(argumentos).items()},
+        "escenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="benchmark_pipeline_") as carpeta_temporal:
+        carpeta = Path(carpeta_temporal)
+        if not argumentos.sin_calentamiento:
+            print("BENCHMARK: Calentamiento (un trabajo por tipo, carga de modelos)...")
+            inicio = time.perf_counter()
+            for tipo, ruta in crear_evidencias(carpeta, tipos, len(tipos), 0, argumentos):
+                ejecutar_trabajo(grafo_compilado, tipo, ruta)
+            resultados["segundos_calentamiento"] = round(time.perf_counter() - inicio, 3)
+
+        for numero_escenario, concurrencia in enumerate(concurrencias, start=1):
+            evidencias = crear_evidencias(carpeta, tipos, argumentos.trabajos, numero_escenario * 10000, argumentos)
+            print(f"BENCHMARK: {len(evidencias)} trabajos con concurrencia {concurrencia}...")
+            escenario = medir_escenario(grafo_compilado, evidencias, concurrencia)
+            resultados["escenarios"][f"concurrencia_{concurrencia}"] = escenario
+            print(
+                f"BENCHMARK: concurrencia {concurrencia}: {escenario['trabajos_por_minuto']} trabajos/min, "
+                f"pico de memoria {escenario['memoria_pico_mb']} MB, {len(escenario['errores'])} error(es)."
+            )
+            for nodo, resumen in escenario["nodos"].items():
+                print(f"BENCHMARK:   {nodo}: p50 {resumen['segundos_p50']} s, p95 {resumen['segundos_p95']} s ({resumen['llamadas']} llamadas)")
+            if escenario["trabajos_completos"] < escenario["trabajos"]:
+                print(
+                    f"BENCHMARK-WARN: Solo {escenario['trabajos_completos']} de {escenario['trabajos']} trabajos llegaron "
+                    "a la síntesis y la verificación: los tiempos no cubren el grafo completo."
+                )
+
+    salida = argumentos.salida or CARPETA_RESULTADOS / f"pipeline_{datetime.now():%Y%m%d_%H%M%S}.json"
+    salida.parent.mkdir(parents=True, exist_ok=True)
+    salida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"BENCHMARK: Resultados guardados en {salida}")
+
+    incompletos = sum(e["trabajos"] - e["trabajos_completos"] for e in resultados["escenarios"].values())
+    if argumentos.comparar_con:
+        anteriores = json.loads(argumentos.comparar_con.read_text(encoding="utf-8"))
+        regresiones = comparar_resultados(anteriores, resultados, argumentos.umbral_regresion)
+        if regresiones:
+            print(f"BENCHMARK: {len(regresiones)} métrica(s) empeoraron más de un {argumentos.umbral_regresion:.0%}.")
+            sys.exit(1)
+        print("BENCHMARK: Sin regresiones respecto a la ejecución anterior.")
+    if incompletos and not argumentos.permitir_incompletos:
+        print(f"BENCHMARK: {incompletos} trabajo(s) no completaron el grafo (usa --permitir-incompletos para aceptarlo).")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
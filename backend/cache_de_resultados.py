@@ -0,0 +1,158 @@
+# backend/cache_de_resultados.py
+
+import hashlib
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import delete
+from sqlmodel import Session, func, select
+
+from .base_de_datos import motor
+from .api.modelos_compartidos import ResultadoExtraccion, RespuestaLLMEnCache
+from .core import configuracion
+
+# =================================================================================
+# CACHÉ DE EXTRACCIONES DIRECCIONADA POR CONTENIDO
+# =================================================================================
+# Si el mismo PDF, audio o video se sube otra vez (aunque sea en otro caso),
+# reutilizamos el texto ya extraído en lugar de volver a pasar por Nougat,
+# Whisper o el análisis de fotogramas. La caché vive en PostgreSQL, así que la
+# comparten todos los trabajadores.
+
+TAMANO_BLOQUE_HASH = 1024 * 1024  # 1 MiB
+
+
+def calcular_hash_archivo(ruta_archivo: str) -> str:
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques."""
+    hash_sha256 = hashlib.sha256()
+    with open(ruta_archivo, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(TAMANO_BLOQUE_HASH), b""):
+            hash_sha256.update(bloque)
+    return hash_sha256.hexdigest()
+
+
+def obtener_texto_en_cache(hash_contenido: str, version_herramienta: str) -> Optional[str]:
+    """Devuelve el texto extraído guardado para ese contenido y versión, o None."""
+    with Session(motor) as sesion:
+        resultado = sesion.get(ResultadoExtraccion, (hash_contenido, version_herramienta))
+        return resultado.texto_extraido if resultado else None
+
+
+def guardar_texto_en_cache(hash_contenido: str, version_herramienta: str, texto_extraido: str) -> None:
+    """Guarda (o reemplaza) el texto extraído de un contenido para una versión de herramienta."""
+    with Session(motor) as sesion:
+        sesion.merge(ResultadoExtraccion(
+            hash_contenido=hash_contenido,
+            version_herramienta=version_herramienta,
+            texto_extraido=texto_extraido,
+        ))
+        sesion.commit()
+
+
+# =================================================================================
+# CACHÉ DE RESPUESTAS DEL MODELO DE LENGUAJE
+# =================================================================================
+# Reprocesar un caso (o repetir el bucle de corrección con la misma entrada)
+# vuelve a generar exactamente los mismos prompts. Guardamos cada respuesta bajo
+# el hash del modelo + prompt normalizado, con una vida máxima (TTL) y un número
+# máximo de entradas (se descartan las usadas hace más tiempo, LRU).
+
+
+def normalizar_prompt(prompt: str) -> str:
+    """Quita las diferencias de espaciado e indentación que no cambian el prompt."""
+    return " ".join(prompt.split())
+
+
+def clave_respuesta_llm(nombre_modelo: str, prompt_normalizado: str) -> str:
+    return hashlib.sha256(f"{nombre_modelo}\n{prompt_normalizado}".encode("utf-8")).hexdigest()
+
+
+def _fecha_limite_vida() -> datetime:
+    return datetime.now() - timedelta(seconds=configuracion.CACHE_LLM_SEGUNDOS_VIDA)
+
+
+def obtener_respuesta_llm_en_cache(nombre_modelo: str, prompt_normalizado: str) -> Optional[str]:
+    """
+    Busca la respuesta guardada para exactamente ese modelo y prompt.
+
+    Returns:
+        str o None: La respuesta guardada, o None si no hay ninguna vigente.
+    """
+    with Session(motor) as sesion:
+        entrada = sesion.get(RespuestaLLMEnCache, clave_respuesta_llm(nombre_modelo, prompt_normalizado))
+        if entrada is None or entrada.fecha_creacion < _fecha_limite_vida():
+            return None
+        return _marcar_uso(sesion, entrada)
+
+
+def buscar_respuesta_llm_similar(nombre_modelo: str, prompt_normalizado: str, embedding: np.ndarray) -> Optional[str]:
+    """
+    Busca la respuesta de un prompt casi idéntico (de longitud parecida y
+    similitud coseno >= CACHE_LLM_SIMILITUD_MINIMA). Pensada para después de un
+    fallo de 'obtener_respuesta_llm_en_cache', que no necesita el embedding.
+    """
+    with Session(motor) as sesion:
+        entrada = _buscar_prompt_similar(sesion, nombre_modelo, len(prompt_normalizado), embedding)
+        if entrada is None:
+            return None
+        return _marcar_uso(sesion, entrada)
+
+
+def _marcar_uso(sesion: Session, entrada: RespuestaLLMEnCache) -> str:
+    entrada.fecha_ultimo_uso = datetime.now()
+    sesion.add(entrada)
+    sesion.commit()
+    return entrada.respuesta
+
+
+def _buscar_prompt_similar(
+    sesion: Session, nombre_modelo: str, longitud_prompt: int, embedding: np.ndarray
+) -> Optional[RespuestaLLMEnCache]:
+    # Solo comparamos con prompts de longitud parecida (±5 %): así dos prompts que
+    # comparten las instrucciones pero no el contenido nunca se confunden.
+    candidatos = sesion.exec(
+        select(RespuestaLLMEnCache)
+        .where(RespuestaLLMEnCache.nombre_modelo == nombre_modelo)
+        .where(RespuestaLLMEnCache.embedding != None)  # noqa: E711
+        .where(RespuestaLLMEnCache.fecha_creacion >= _fecha_limite_vida())
+        .where(RespuestaLLMEnCache.longitud_prompt.between(int(longitud_prompt * 0.95), int(longitud_prompt * 1.05) + 1))
+    ).all()
+    # Las filas antiguas guardaban la falta de embedding como el JSON 'null',
+    # que el filtro anterior no excluye.
+    candidatos = [c for c in candidatos if c.embedding]
+    if not candidatos:
+        return None
+    similitudes = np.asarray([c.embedding for c in candidatos], dtype="float32") @ embedding
+    mejor = int(np.argmax(similitudes))
+    if similitudes[mejor] < configuracion.CACHE_LLM_SIMILITUD_MINIMA:
+        return None
+    print(f"      TOOL-SYSTEM: -> Caché LLM: prompt casi idéntico (similitud {similitudes[mejor]:.3f}).")
+    return candidatos[mejor]
+
+
+def guardar_respuesta_llm_en_cache(
+    nombre_modelo: str, prompt_normalizado: str, respuesta: str, embedding: Optional[np.ndarray] = None
+) -> None:
+    """Guarda una respuesta y, si la caché se pasa de tamaño, descarta las caducadas y las menos usadas."""
+    with Session(motor) as sesion:
+        sesion.merge(RespuestaLLMEnCache(
+            clave=clave_respuesta_llm(nombre_modelo, prompt_normalizado),
+            nombre_modelo=nombre_modelo,
+            longitud_prompt=len(prompt_normalizado),
+            respuesta=respuesta,
+            embedding=embedding.tolist() if embedding is not None else None,
+        ))
+        sesion.commit()
+
+        total = sesion.exec(select(func.count()).select_from(RespuestaLLMEnCache)).one()
+        if total > configuracion.CACHE_LLM_MAXIMO_ENTRADAS:
+            sesion.execute(delete(RespuestaLLMEnCache).where(RespuestaLLMEnCache.fecha_creacion < _fecha_limite_vida()))
+            total = sesion.exec(select(func.count()).select_from(RespuestaLLMEnCache)).one()
+            menos_usadas = (
+                select(RespuestaLLMEnCache.clave)
+                .order_by(RespuestaLLMEnCache.fecha_ultimo_uso)
+                .limit(max(0, total - configuracion.CACHE_LLM_MAXIMO_ENTRADAS))
+            )
+            sesion.execute(delete(RespuestaLLMEnCache).where(RespuestaLLMEnCache.clave.in_(menos_usadas)))
+            sesion.commit()
@@ -0,0 +1,362 @@
+# backend/cola_de_trabajos.py
+
+import threading
+import traceback
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlmodel import Session, func, or_, select
+
+from .base_de_datos import motor
+from .api.modelos_compartidos import Evidencia, TrabajoProcesamiento, OPCIONES_SIN_TEXTOS_PESADOS
+from .core import configuracion, eventos_progreso, observabilidad
+from . import transcripciones
+
+# =================================================================================
+# SECCIÓN 1: COLA DE TRABAJOS RESPALDADA POR LA BASE DE DATOS
+# =================================================================================
+# La cola vive en la tabla 'trabajoprocesamiento' de nuestra propia base de datos,
+# así que no necesitamos un broker externo (Redis, RabbitMQ...). Cada trabajador
+# reclama el trabajo pendiente más antiguo con 'SELECT ... FOR UPDATE SKIP LOCKED',
+# lo que permite tener varios trabajadores (incluso en varios procesos) sin que
+# dos de ellos tomen el mismo trabajo.
+#
+# Ojo: SQLite ignora 'FOR UPDATE SKIP LOCKED'. Con SQLite, dos trabajadores
+# pueden reclamar el mismo trabajo a la vez, así que solo es seguro usar un
+# trabajador (NUMERO_TRABAJADORES=1 y un único proceso). La concurrencia de la
+# cola requiere PostgreSQL.
+#
+# Un trabajo 'en_proceso' cuyo trabajador deja de dar latidos (el proceso murió)
+# se considera abandonado y se vuelve a reclamar. Gracias a los puntos de control
+# del grafo, el nuevo trabajador continúa desde el último nodo terminado. Lo
+# mismo ocurre con un trabajo cuyo grafo falla: vuelve a 'pendiente'. En ambos
+# casos, solo hasta TRABAJO_MAXIMO_INTENTOS veces; después queda en 'error'.
+
+# Campos del estado final del grafo que se guardan en la fila de la Evidencia.
+CAMPOS_RESULTADO_EVIDENCIA = (
+    "texto_extraido",
+    "entidades_extraidas",
+    "informacion_recuperada",
+    "borrador_estrategia",
+    "verificacion_calidad",
+)
+
+_evento_detener = threading.Event()
+_hilos_trabajadores: list[threading.Thread] = []
+
+
+def encolar_trabajo(sesion: Session, id_evidencia: uuid.UUID) -> TrabajoProcesamiento:
+    """
+    Crea un trabajo 'pendiente' para una evidencia. No hace commit: así la
+    evidencia y su trabajo se guardan juntos en la misma transacción.
+    """
+    trabajo = TrabajoProcesamiento(id_evidencia=id_evidencia)
+    sesion.add(trabajo)
+    return trabajo
+
+
+def reclamar_siguiente_trabajo() -> Optional[uuid.UUID]:
+    """
+    Toma el trabajo pendiente (o abandonado) más antiguo y lo marca como 'en_proceso'.
+    Un trabajo abandonado que ya agotó sus intentos se deja en 'error' y se
+    busca el siguiente.
+
+    Returns:
+        El id del trabajo reclamado, o None si la cola está vacía.
+    """
+    limite_abandono = datetime.now() - timedelta(seconds=configuracion.SEGUNDOS_PARA_TRABAJO_ABANDONADO)
+    while True:
+        with Session(motor) as sesion:
+            consulta = (
+                select(TrabajoProcesamiento)
+                .where(or_(
+                    TrabajoProcesamiento.estado == "pendiente",
+                    (TrabajoProcesamiento.estado == "en_proceso") & (TrabajoProcesamiento.fecha_latido < limite_abandono),
+                ))
+                .order_by(TrabajoProcesamiento.fecha_creacion)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            trabajo = sesion.exec(consulta).first()
+            if not trabajo:
+                return None
+
+            if trabajo.estado == "en_proceso":
+                if trabajo.intentos >= configuracion.TRABAJO_MAXIMO_INTENTOS:
+                    print(f"QUEUE-SYSTEM-ERROR: El trabajo {trabajo.id_trabajo} quedó abandonado tras {trabajo.intentos} intentos. Se da por fallido.")
+                    _dar_por_fallido(sesion, trabajo, f"El proceso se detuvo en los {trabajo.intentos} intentos.")
+                    continue
+                print(f"QUEUE-SYSTEM: El trabajo {trabajo.id_trabajo} estaba abandonado (sin latidos desde {trabajo.fecha_latido}). Retomándolo.")
+            elif not trabajo.intentos:
+                observabilidad.segundos_espera_en_cola.observe((datetime.now() - trabajo.fecha_creacion).total_seconds())
+            trabajo.estado = "en_proceso"
+            trabajo.intentos += 1
+            trabajo.fecha_inicio = datetime.now()
+            trabajo.fecha_latido = trabajo.fecha_inicio
+            sesion.add(trabajo)
+            sesion.commit()
+            return trabajo.id_trabajo
+
+
+def _dar_por_fallido(sesion: Session, trabajo: TrabajoProcesamiento, causa: str) -> None:
+    """Deja en 'error' un trabajo (y su evidencia) que no se volverá a intentar, y borra sus puntos de control."""
+    trabajo.estado = "error"
+    trabajo.error = causa
+    trabajo.fecha_fin = datetime.now()
+    sesion.add(trabajo)
+    evidencia = sesion.get(Evidencia, trabajo.id_evidencia, options=OPCIONES_SIN_TEXTOS_PESADOS)
+    if evidencia:
+        evidencia.estado_procesamiento = "error"
+        sesion.add(evidencia)
+    sesion.commit()
+    observabilidad.trabajos_terminados.labels("error").inc()
+    eventos_progreso.publicar_evento("fin", id_evidencia=str(trabajo.id_evidencia), estado="error")
+    _borrar_puntos_de_control(str(trabajo.id_evidencia))
+
+
+def _borrar_puntos_de_control(id_evidencia: str) -> None:
+    from .agentes.orquestador_del_grafo import puntos_de_control
+    from .agentes.puntos_de_control import borrar_puntos_de_control
+    borrar_puntos_de_control(puntos_de_control, id_evidencia)
+
+
+def reintentar_trabajo(sesion: Session, trabajo: TrabajoProcesamiento) -> TrabajoProcesamiento:
+    """
+    Vuelve a encolar un trabajo en 'error', con los intentos a cero. Si aún
+    tiene puntos de control, continúa desde el último nodo terminado.
+    """
+    trabajo.estado = "pendiente"
+    trabajo.error = None
+    trabajo.intentos = 0
+    trabajo.fecha_inicio = None
+    trabajo.fecha_fin = None
+    sesion.add(trabajo)
+    evidencia = sesion.get(Evidencia, trabajo.id_evidencia, options=OPCIONES_SIN_TEXTOS_PESADOS)
+    if evidencia:
+        evidencia.estado_procesamiento = "pendiente"
+        sesion.add(evidencia)
+    sesion.commit()
+    sesion.refresh(trabajo)
+    return trabajo
+
+
+def contar_trabajos_por_estado() -> dict[str, int]:
+    """Trabajos pendientes y en proceso (la profundidad de la cola)."""
+    with Session(motor) as sesion:
+        filas = sesion.exec(
+            select(TrabajoProcesamiento.estado, func.count())
+            .where(TrabajoProcesamiento.estado.in_(("pendiente", "en_proceso")))
+            .group_by(TrabajoProcesamiento.estado)
+        ).all()
+    return {"pendiente": 0, "en_proceso": 0, **dict(filas)}
+
+# La profundidad de la cola se mide en cada lectura de /metrics.
+observabilidad.registrar_profundidad_de_cola(contar_trabajos_por_estado)
+
+
+def _dar_latidos(id_trabajo: uuid.UUID, terminado: threading.Event) -> None:
+    """Hilo auxiliar: actualiza 'fecha_latido' del trabajo hasta que termina."""
+    while not terminado.wait(configuracion.SEGUNDOS_ENTRE_LATIDOS_TRABAJO):
+        try:
+            with Session(motor) as sesion:
+                trabajo = sesion.get(TrabajoProcesamiento, id_trabajo)
+                trabajo.fecha_latido = datetime.now()
+                sesion.add(trabajo)
+                sesion.commit()
+        except Exception as e:
+            print(f"QUEUE-SYSTEM-ERROR: No se pudo registrar el latido del trabajo {id_trabajo}. Causa: {e}")
+
+
+def _ejecutar_grafo(grafo_compilado, estado_inicial: dict, id_evidencia: str) -> dict:
+    """
+    Ejecuta el grafo para una evidencia, retomándolo desde su último punto de
+    control si una ejecución anterior quedó a medias.
+    """
+    from .agentes.puntos_de_control import configuracion_de_hilo
+
+    if grafo_compilado.checkpointer is None:
+        return grafo_compilado.invoke(estado_inicial)
+
+    config = configuracion_de_hilo(id_evidencia)
+    instantanea = grafo_compilado.get_state(config)
+    if not instantanea.values:
+        return grafo_compilado.invoke(estado_inicial, config)
+    if instantanea.next:
+        print(f"QUEUE-SYSTEM: Reanudando la evidencia {id_evidencia} desde el nodo {', '.join(instantanea.next)}.")
+        return grafo_compilado.invoke(None, config)
+    # El grafo ya había terminado (el proceso cayó antes de guardar el resultado).
+    print(f"QUEUE-SYSTEM: La evidencia {id_evidencia} ya había terminado el grafo. Reutilizando su estado final.")
+    return dict(instantanea.values)
+
+
+def ejecutar_trabajo(id_trabajo: uuid.UUID) -> None:
+    """
+    Ejecuta el grafo de agentes para la evidencia de un trabajo ya reclamado
+    y guarda el resultado en la base de datos.
+    """
+    # Importamos aquí el grafo para que la API pueda importar este módulo
+    # sin compilar el grafo cuando solo necesita encolar trabajos.
+    from .agentes.orquestador_del_grafo import grafo_compilado, puntos_de_control
+    from .agentes.puntos_de_control import borrar_puntos_de_control
+
+    with Session(motor) as sesion:
+        trabajo = sesion.get(TrabajoProcesamiento, id_trabajo)
+        # Los textos largos anteriores no hacen falta: el grafo los vuelve a escribir.
+        evidencia = sesion.get(Evidencia, trabajo.id_evidencia, options=OPCIONES_SIN_TEXTOS_PESADOS)
+        if evidencia is None:
+            raise LookupError(f"La evidencia {trabajo.id_evidencia} del trabajo ya no existe.")
+        evidencia.estado_procesamiento = "procesando"
+        sesion.add(evidencia)
+        sesion.commit()
+
+        estado_inicial = {
+            "id_caso": str(evidencia.id_caso),
+            "ruta_archivo": evidencia.ruta_archivo,
+            "tipo_contenido": evidencia.tipo_contenido,
+            "hash_contenido": evidencia.hash_contenido,
+        }
+
+        # Las herramientas publicarán su progreso a nombre de esta evidencia.
+        id_evidencia = str(evidencia.id_evidencia)
+        token_contexto = eventos_progreso.evidencia_actual.set(id_evidencia)
+        terminado = threading.Event()
+        threading.Thread(target=_dar_latidos, args=(id_trabajo, terminado), daemon=True).start()
+
+        try:
+            print(f"QUEUE-SYSTEM: Procesando trabajo {id_trabajo} (evidencia '{evidencia.nombre_archivo}')...")
+            # Tramo raíz de la traza: los nodos y herramientas cuelgan de él.
+            with observabilidad.tramo(
+                "trabajo", id_trabajo=str(id_trabajo), id_evidencia=id_evidencia, tipo_contenido=evidencia.tipo_contenido
+            ):
+                estado_final = _ejecutar_grafo(grafo_compilado, estado_inicial, id_evidencia)
+
+            for campo in CAMPOS_RESULTADO_EVIDENCIA:
+                setattr(evidencia, campo, estado_final.get(campo))
+            # Los segmentos con marca de tiempo van a su propia tabla, por bloques.
+            segmentos = estado_final.get("segmentos_transcripcion")
+            if segmentos:
+                evidencia.total_segmentos_transcripcion = transcripciones.guardar_transcripcion(sesion, evidencia.id_evidencia, segmentos)
+            elif estado_final.get("texto_extraido"):
+                evidencia.total_segmentos_transcripcion = transcripciones.copiar_transcripcion_de_contenido_identico(sesion, evidencia)
+            evidencia.estado_procesamiento = "completado" if estado_final.get("texto_extraido") else "error"
+            trabajo.estado = "completado"
+            print(f"QUEUE-SYSTEM: Trabajo {id_trabajo} terminado con estado '{evidencia.estado_procesamiento}'.")
+
+        except Exception as e:
+            print(f"QUEUE-SYSTEM-ERROR: El trabajo {id_trabajo} falló (intento {trabajo.intentos} de {configuracion.TRABAJO_MAXIMO_INTENTOS}). Causa: {e}")
+            traceback.print_exc()
+            trabajo.error = str(e)
+            # Con intentos restantes vuelve a la cola y continuará desde su último punto de control.
+            quedan_intentos = trabajo.intentos < configuracion.TRABAJO_MAXIMO_INTENTOS
+            evidencia.estado_procesamiento = "pendiente" if quedan_intentos else "error"
+            trabajo.estado = "pendiente" if quedan_intentos else "error"
+        finally:
+            terminado.set()
+            eventos_progreso.evidencia_actual.reset(token_contexto)
+
+        if trabajo.estado == "pendiente":
+            eventos_progreso.publicar_evento(
+                "progreso", id_evidencia=id_evidencia, etapa="reintento",
+                actual=trabajo.intentos + 1, total=configuracion.TRABAJO_MAXIMO_INTENTOS,
+            )
+            sesion.add(evidencia)
+            sesion.add(trabajo)
+            sesion.commit()
+            return
+
+        eventos_progreso.publicar_evento("fin", id_evidencia=id_evidencia, estado=evidencia.estado_procesamiento)
+        observabilidad.trabajos_terminados.labels(evidencia.estado_procesamiento).inc()
+        trabajo.fecha_fin = datetime.now()
+        sesion.add(evidencia)
+        sesion.add(trabajo)
+        sesion.commit()
+
+        # Con el resultado ya guardado (o agotados los intentos), los puntos de
+        # control de la evidencia sobran.
+        borrar_puntos_de_control(puntos_de_control, id_evidencia)
+
+
+def _marcar_trabajo_como_fallido(id_trabajo: uuid.UUID, error: Exception) -> None:
+    """
+    Deja el trabajo (y su evidencia, si existe) en 'error' cuando
+    'ejecutar_trabajo' falló fuera del grafo: evidencia inexistente, base de
+    datos caída al empezar o al guardar el resultado...
+    """
+    with Session(motor) as sesion:
+        trabajo = sesion.get(TrabajoProcesamiento, id_trabajo)
+        if trabajo:
+            _dar_por_fallido(sesion, trabajo, str(error))
+
+
+# =================================================================================
+# SECCIÓN 2: GRUPO DE HILOS TRABAJADORES
+# =================================================================================
+
+def _bucle_trabajador(nombre: str) -> None:
+    """Bucle de un trabajador: reclama trabajos hasta que se le pide detenerse."""
+    print(f"QUEUE-SETUP: Trabajador '{nombre}' iniciado.")
+    while not _evento_detener.is_set():
+        try:
+            id_trabajo = reclamar_siguiente_trabajo()
+        except Exception as e:
+            print(f"QUEUE-SYSTEM-ERROR: '{nombre}' no pudo consultar la cola. Causa: {e}")
+            id_trabajo = None
+
+        if id_trabajo is None:
+            # Cola vacía: esperamos un poco (o hasta que nos pidan detenernos).
+            _evento_detener.wait(configuracion.SEGUNDOS_ENTRE_REVISIONES_COLA)
+            continue
+
+        try:
+            ejecutar_trabajo(id_trabajo)
+        except Exception as e:
+            # Un fallo aquí no debe matar el hilo: el trabajo se marca como
+            # fallido y el trabajador sigue con el siguiente.
+            print(f"QUEUE-SYSTEM-ERROR: '{nombre}' no pudo completar el trabajo {id_trabajo}. Causa: {e}")
+            traceback.print_exc()
+            try:
+                _marcar_trabajo_como_fallido(id_trabajo, e)
+            except Exception as e_marca:
+                print(f"QUEUE-SYSTEM-ERROR: No se pudo marcar como fallido el trabajo {id_trabajo}. Causa: {e_marca}")
+    print(f"QUEUE-SETUP: Trabajador '{nombre}' detenido.")
+
+
+def iniciar_trabajadores(numero_trabajadores: Optional[int] = None) -> None:
+    """Arranca el grupo de hilos trabajadores (si no estaba ya en marcha)."""
+    if _hilos_trabajadores:
+        return
+    numero_trabajadores = numero_trabajadores or configuracion.NUMERO_TRABAJADORES
+    _evento_detener.clear()
+    for i in range(numero_trabajadores):
+        hilo = threading.Thread(target=_bucle_trabajador, args=(f"trabajador-{i + 1}",), daemon=True)
+        hilo.start()
+        _hilos_trabajadores.append(hilo)
+    print(f"QUEUE-SETUP: {numero_trabajadores} trabajador(es) escuchando la cola de evidencias.")
+
+
+def detener_trabajadores(segundos_espera: float = 5) -> None:
+    """
+    Pide a los trabajadores que se detengan. Un trabajador ocupado termina su
+    trabajo actual antes de salir; no lo esperamos más de 'segundos_espera'.
+    """
+    _evento_detener.set()
+    for hilo in _hilos_trabajadores:
+        hilo.join(timeout=segundos_espera)
+    _hilos_trabajadores.clear()
+
+
+if __name__ == "__main__":
+    # Permite ejecutar los trabajadores en un proceso aparte de la API:
+    #   python -m backend.cola_de_trabajos
+    from . import base_de_datos
+    base_de_datos.inicializar_base_de_datos()
+    if configuracion.PUERTO_METRICAS_TRABAJADORES:
+        observabilidad.iniciar_servidor_metricas(configuracion.PUERTO_METRICAS_TRABAJADORES)
+    iniciar_trabajadores()
+    try:
+        _evento_detener.wait()
+    except KeyboardInterrupt:
+        detener_trabajadores()
+        from .herramientas.herramientas_documentos import cerrar_grupo_procesos_nougat
+        cerrar_grupo_procesos_nougat()
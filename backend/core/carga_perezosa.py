@@ -0,0 +1,81 @@
+# backend/core/carga_perezosa.py
+
+import threading
+import time
+from typing import Any, Callable, Optional
+
+# =================================================================================
+# CARGA PEREZOSA DE MODELOS PESADOS
+# =================================================================================
+# Whisper, Nougat, el SentenceTransformer y el índice FAISS ya no se cargan al
+# importar los módulos de herramientas, sino la primera vez que se usan. Así la
+# API arranca en menos de un segundo y un trabajador que nunca ve un audio no
+# paga la memoria de Whisper.
+
+_cargadores_registrados: list["CargadorPerezoso"] = []
+
+
+class CargadorPerezoso:
+    """
+    Envuelve la función que carga un recurso pesado y la ejecuta una sola vez,
+    la primera vez que alguien llama a 'obtener()'. Es seguro entre hilos: si
+    dos trabajadores lo piden a la vez, solo uno carga y el otro espera.
+
+    Si la carga falla se guarda None (como hacían antes los módulos al importar)
+    y el error queda en 'error', para que las herramientas respondan con un
+    mensaje claro en lugar de reintentar la carga en cada llamada.
+    """
+
+    def __init__(self, nombre: str, funcion_carga: Callable[[], Any]):
+        self.nombre = nombre
+        self._funcion_carga = funcion_carga
+        self._candado = threading.Lock()
+        self._cargado = False
+        self._recurso: Any = None
+        self.error: Optional[str] = None
+        self.segundos_carga: Optional[float] = None
+        _cargadores_registrados.append(self)
+
+    @property
+    def cargado(self) -> bool:
+        return self._cargado
+
+    def obtener(self) -> Any:
+        if self._cargado:
+            return self._recurso
+        with self._candado:
+            if not self._cargado:
+                inicio = time.perf_counter()
+                try:
+                    print(f"TOOL-SETUP: Cargando '{self.nombre}' (primer uso)...")
+                    self._recurso = self._funcion_carga()
+                    print(f"TOOL-SETUP: '{self.nombre}' listo en {time.perf_counter() - inicio:.1f} s.")
+                except Exception as e:
+                    self._recurso = None
+                    self.error = str(e)
+                    print(f"TOOL-SETUP-ERROR: No se pudo cargar '{self.nombre}'. Error: {e}")
+                self.segundos_carga = time.perf_counter() - inicio
+                self._cargado = True
+        return self._recurso
+
+
+def precargar_modelos() -> dict[str, dict]:
+    """
+    Carga de inmediato todos los modelos pesados (precalentamiento), para que la
+    primera evidencia no pague el tiempo de carga.
+
+    Returns:
+        dict: Por cada recurso, si quedó disponible, el error y los segundos de carga.
+    """
+    # Importar los módulos de herramientas registra sus cargadores (sin cargar nada todavía).
+    from ..herramientas import herramientas_audio, herramientas_documentos, herramientas_lenguaje  # noqa: F401
+
+    resumen = {}
+    for cargador in _cargadores_registrados:
+        disponible = cargador.obtener() is not None
+        resumen[cargador.nombre] = {
+            "disponible": disponible,
+            "error": cargador.error,
+            "segundos_carga": round(cargador.segundos_carga or 0, 2),
+        }
+    return resumen
@@ -0,0 +1,294 @@
+# backend/core/configuracion.py
+
+import os
+from dotenv import load_dotenv
+
+# Cargamos las variables de entorno desde el archivo .env una sola vez,
+# para que todos los módulos lean la misma configuración.
+load_dotenv()
+
+# =================================================================================
+# SECCIÓN 1: COLA DE TRABAJOS DE PROCESAMIENTO DE EVIDENCIA
+# =================================================================================
+
+# Número de hilos trabajadores que procesan evidencias en segundo plano.
+# Con SQLite debe ser 1: la cola solo reparte trabajos de forma segura entre
+# varios trabajadores con PostgreSQL (ver cola_de_trabajos).
+NUMERO_TRABAJADORES = int(os.getenv("NUMERO_TRABAJADORES", "2"))
+
+# Segundos que espera un trabajador libre antes de volver a revisar la cola.
+SEGUNDOS_ENTRE_REVISIONES_COLA = float(os.getenv("SEGUNDOS_ENTRE_REVISIONES_COLA", "2"))
+
+# Si es "false", la API no arranca trabajadores (útil cuando se ejecutan aparte).
+INICIAR_TRABAJADORES_CON_API = os.getenv("INICIAR_TRABAJADORES_CON_API", "true").lower() == "true"
+
+# =================================================================================
+# SECCIÓN 2: CUOTA DE LA API DE GEMINI
+# =================================================================================
+
+# Presupuesto por minuto compartido por todas las llamadas a Gemini del proceso.
+GEMINI_SOLICITUDES_POR_MINUTO = int(os.getenv("GEMINI_SOLICITUDES_POR_MINUTO", "15"))
+GEMINI_TOKENS_POR_MINUTO = int(os.getenv("GEMINI_TOKENS_POR_MINUTO", "1000000"))
+
+# Si se indica una ruta (ej. 'archivos_subidos/limitador_gemini.sqlite3'), el
+# presupuesto se comparte entre procesos a través de ese archivo SQLite.
+RUTA_ESTADO_LIMITADOR_GEMINI = os.getenv("RUTA_ESTADO_LIMITADOR_GEMINI", "")
+
+# Reintentos con espera exponencial cuando Gemini responde 429 (cuota agotada).
+GEMINI_MAXIMOS_REINTENTOS_429 = int(os.getenv("GEMINI_MAXIMOS_REINTENTOS_429", "5"))
+GEMINI_SEGUNDOS_BASE_REINTENTO = float(os.getenv("GEMINI_SEGUNDOS_BASE_REINTENTO", "2"))
+
+# =================================================================================
+# SECCIÓN 3: ANÁLISIS DE VIDEO
+# =================================================================================
+
+# Cuántas llamadas de descripción de fotogramas se hacen a la vez. El limitador
+# de Gemini sigue mandando: el paralelismo solo aprovecha el presupuesto libre.
+FOTOGRAMAS_EN_PARALELO = int(os.getenv("FOTOGRAMAS_EN_PARALELO", "4"))
+
+# Cuántos fotogramas se empaquetan en un único mensaje multimodal (1 = uno por llamada).
+FOTOGRAMAS_POR_LOTE = int(os.getenv("FOTOGRAMAS_POR_LOTE", "1"))
+
+# Transcribir también la pista de audio del video (con Whisper, a la vez que se
+# analizan los fotogramas) y añadirla al informe. Desactivado por defecto: en
+# videos largos Whisper cuesta más que el análisis de los fotogramas.
+VIDEO_TRANSCRIBIR_AUDIO = os.getenv("VIDEO_TRANSCRIBIR_AUDIO", "false").lower() == "true"
+
+# =================================================================================
+# SECCIÓN 4: BASE DE CONOCIMIENTO (RAG)
+# =================================================================================
+
+# Archivo del corpus (documentos separados por '---'). Vacío = el corpus de ejemplo del repositorio.
+RUTA_CORPUS_CONOCIMIENTO = os.getenv("RUTA_CORPUS_CONOCIMIENTO", "")
+
+# Tipo de índice FAISS: "flat" (exacto), "hnsw" (grafo) o "ivfpq" (listas invertidas
+# con cuantización de producto, el más compacto para corpus de cientos de miles de documentos).
+TIPO_INDICE_CONOCIMIENTO = os.getenv("TIPO_INDICE_CONOCIMIENTO", "flat").lower()
+
+# Parámetros de HNSW: vecinos por nodo y amplitud de búsqueda.
+HNSW_VECINOS = int(os.getenv("HNSW_VECINOS", "32"))
+HNSW_AMPLITUD_BUSQUEDA = int(os.getenv("HNSW_AMPLITUD_BUSQUEDA", "64"))
+
+# Parámetros de IVF-PQ: listas invertidas (0 = automático, ~4·√N), listas
+# visitadas por consulta y subcuantizadores PQ (debe dividir la dimensión, 384).
+IVF_LISTAS = int(os.getenv("IVF_LISTAS", "0"))
+IVF_LISTAS_A_VISITAR = int(os.getenv("IVF_LISTAS_A_VISITAR", "16"))
+PQ_SUBCUANTIZADORES = int(os.getenv("PQ_SUBCUANTIZADORES", "48"))
+
+# Búsqueda directa con el texto original (en paralelo a la extracción de
+# entidades): el texto se parte en hasta RAG_FRAGMENTOS_TEXTO_ORIGINAL trozos de
+# RAG_TOKENS_POR_FRAGMENTO_TEXTO tokens (lo que lee el modelo de embeddings) y
+# se guardan los RAG_RESULTADOS_TEXTO_ORIGINAL documentos más parecidos.
+RAG_FRAGMENTOS_TEXTO_ORIGINAL = int(os.getenv("RAG_FRAGMENTOS_TEXTO_ORIGINAL", "8"))
+RAG_TOKENS_POR_FRAGMENTO_TEXTO = int(os.getenv("RAG_TOKENS_POR_FRAGMENTO_TEXTO", "200"))
+RAG_RESULTADOS_TEXTO_ORIGINAL = int(os.getenv("RAG_RESULTADOS_TEXTO_ORIGINAL", "2"))
+
+# =================================================================================
+# SECCIÓN 5: ARRANQUE DE LA APLICACIÓN
+# =================================================================================
+
+# Si es "true", al arrancar se cargan en segundo plano todos los modelos pesados
+# (Whisper, Nougat, RAG...), para que la primera evidencia no pague la carga.
+PRECARGAR_MODELOS_AL_INICIAR = os.getenv("PRECARGAR_MODELOS_AL_INICIAR", "false").lower() == "true"
+
+# =================================================================================
+# SECCIÓN 6: SUBIDA DE ARCHIVOS
+# =================================================================================
+
+DIRECTORIO_SUBIDAS = os.getenv("DIRECTORIO_SUBIDAS", "archivos_subidos")
+
+# Tamaño máximo aceptado por archivo (en MiB). En las subidas por partes se
+# comprueba al crearlas; en las de un solo formulario, al copiar el archivo que
+# el servidor ya recibió entero en un temporal.
+TAMANO_MAXIMO_SUBIDA_MB = int(os.getenv("TAMANO_MAXIMO_SUBIDA_MB", "4096"))
+
+# Los bytes recibidos se acumulan hasta este tamaño (en MiB) antes de escribirse
+# a disco desde un hilo aparte, para no bloquear el bucle de eventos.
+TAMANO_BLOQUE_ESCRITURA_MB = int(os.getenv("TAMANO_BLOQUE_ESCRITURA_MB", "8"))
+
+# Una subida por partes sin recibir nada durante estas horas se da por
+# abandonada y se borra junto con su archivo parcial.
+SUBIDAS_HORAS_ABANDONO = float(os.getenv("SUBIDAS_HORAS_ABANDONO", "24"))
+
+# =================================================================================
+# SECCIÓN 7: PROCESAMIENTO DE PDF (NOUGAT)
+# =================================================================================
+
+# Páginas que Nougat procesa juntas en una sola pasada del modelo.
+NOUGAT_TAMANO_LOTE = int(os.getenv("NOUGAT_TAMANO_LOTE", "4"))
+
+# Hilos de CPU que usa torch para la inferencia (0 = el valor por defecto de torch).
+NOUGAT_HILOS_CPU = int(os.getenv("NOUGAT_HILOS_CPU", "0"))
+
+# Antes de usar Nougat se intenta leer la capa de texto nativa del PDF. Una página
+# se acepta tal cual si tiene al menos este número de caracteres...
+PDF_MINIMO_CARACTERES_TEXTO_NATIVO = int(os.getenv("PDF_MINIMO_CARACTERES_TEXTO_NATIVO", "40"))
+# ...y al menos esta proporción de caracteres "legibles" (letras, números,
+# espacios y puntuación común). Si no, la página se considera escaneada o dañada.
+PDF_CALIDAD_MINIMA_TEXTO_NATIVO = float(os.getenv("PDF_CALIDAD_MINIMA_TEXTO_NATIVO", "0.85"))
+
+# Procesos en los que se reparten las páginas de un PDF para Nougat (0 = todo en
+# el proceso del trabajador). Cada proceso carga el modelo una sola vez.
+NOUGAT_PROCESOS = int(os.getenv("NOUGAT_PROCESOS", "0"))
+
+# Páginas por tarea enviada a un proceso. Solo se usa el grupo de procesos si el
+# PDF tiene al menos dos tareas de páginas para Nougat; si no, no compensa.
+NOUGAT_PAGINAS_POR_TAREA = int(os.getenv("NOUGAT_PAGINAS_POR_TAREA", "8"))
+
+# =================================================================================
+# SECCIÓN 8: PUNTOS DE CONTROL DEL GRAFO (REANUDAR TRAS UNA CAÍDA)
+# =================================================================================
+
+# Dónde guarda LangGraph el estado tras cada nodo: "postgres" (la base de datos
+# de la aplicación), "sqlite" (archivo local), "memoria" o "ninguno".
+PUNTOS_DE_CONTROL_GRAFO = os.getenv("PUNTOS_DE_CONTROL_GRAFO", "postgres").lower()
+
+# Archivo usado cuando PUNTOS_DE_CONTROL_GRAFO = "sqlite".
+RUTA_PUNTOS_DE_CONTROL_SQLITE = os.getenv("RUTA_PUNTOS_DE_CONTROL_SQLITE", "archivos_subidos/puntos_de_control.sqlite3")
+
+# Cada cuántos segundos un trabajador confirma que sigue vivo con su trabajo, y
+# tras cuántos segundos sin confirmación otro trabajador lo da por abandonado
+# (proceso caído) y lo retoma desde el último punto de control.
+SEGUNDOS_ENTRE_LATIDOS_TRABAJO = float(os.getenv("SEGUNDOS_ENTRE_LATIDOS_TRABAJO", "30"))
+SEGUNDOS_PARA_TRABAJO_ABANDONADO = float(os.getenv("SEGUNDOS_PARA_TRABAJO_ABANDONADO", "300"))
+
+# Veces que se intenta un trabajo antes de dejarlo en 'error'. Un trabajo cuyo
+# grafo falla se vuelve a encolar (y continúa desde su último punto de control);
+# uno que tumba el proceso (falta de memoria...) se retoma al quedar abandonado.
+# Al agotar los intentos se borran sus puntos de control; se puede volver a
+# lanzar a mano con POST /trabajos/{id_trabajo}/reintentar.
+TRABAJO_MAXIMO_INTENTOS = int(os.getenv("TRABAJO_MAXIMO_INTENTOS", "3"))
+
+# =================================================================================
+# SECCIÓN 9: EXTRACCIÓN DE ENTIDADES EN TEXTOS LARGOS
+# =================================================================================
+
+# Los textos largos se parten en fragmentos de como mucho este número de tokens
+# (aprox. 4 caracteres por token); cada fragmento se analiza en su propia llamada.
+ENTIDADES_TOKENS_POR_FRAGMENTO = int(os.getenv("ENTIDADES_TOKENS_POR_FRAGMENTO", "6000"))
+
+# Tokens que cada fragmento repite del anterior, para no partir una entidad por la mitad.
+ENTIDADES_TOKENS_SOLAPAMIENTO = int(os.getenv("ENTIDADES_TOKENS_SOLAPAMIENTO", "300"))
+
+# Fragmentos que se analizan a la vez (el limitador de Gemini sigue mandando).
+ENTIDADES_FRAGMENTOS_EN_PARALELO = int(os.getenv("ENTIDADES_FRAGMENTOS_EN_PARALELO", "4"))
+
+# =================================================================================
+# SECCIÓN 10: TRANSCRIPCIÓN DE AUDIO (WHISPER)
+# =================================================================================
+
+# Motor de transcripción: "openai" (openai-whisper, con torch) o "faster-whisper"
+# (CTranslate2, mucho más rápido en CPU y con cuantización int8).
+MOTOR_WHISPER = os.getenv("MOTOR_WHISPER", "openai").lower()
+NOMBRE_MODELO_WHISPER = os.getenv("NOMBRE_MODELO_WHISPER", "base")
+
+# Idioma del audio (ej. "es"). Vacío = detección automática.
+WHISPER_IDIOMA = os.getenv("WHISPER_IDIOMA", "")
+
+# Solo faster-whisper: tipo de cómputo ("int8", "int8_float16", "float32"...) e
+# hilos de CPU por decodificación (0 = el valor por defecto de CTranslate2).
+WHISPER_TIPO_COMPUTO = os.getenv("WHISPER_TIPO_COMPUTO", "int8")
+WHISPER_HILOS_CPU = int(os.getenv("WHISPER_HILOS_CPU", "0"))
+
+# Solo faster-whisper: el audio se corta en los silencios (detección de voz) en
+# bloques de como mucho estos segundos, y se decodifican varios bloques a la vez.
+WHISPER_SEGUNDOS_POR_BLOQUE = float(os.getenv("WHISPER_SEGUNDOS_POR_BLOQUE", "120"))
+WHISPER_BLOQUES_EN_PARALELO = int(os.getenv("WHISPER_BLOQUES_EN_PARALELO", "2"))
+
+# =================================================================================
+# SECCIÓN 11: CONEXIONES A LA BASE DE DATOS
+# =================================================================================
+
+# Cada proceso abre como máximo, contra PostgreSQL:
+#   (DB_TAMANO_POOL + DB_MAXIMO_DESBORDE)                      motor síncrono
+# + (DB_ASINCRONO_TAMANO_POOL + DB_ASINCRONO_MAXIMO_DESBORDE)  motor asíncrono (solo la API lo usa)
+# + max(2, NUMERO_TRABAJADORES)                                puntos de control del grafo
+# Con los valores por defecto: 20 + 15 + 2 = 37 por proceso. Con la API y un
+# proceso de trabajadores aparte (que no usa el motor asíncrono) son 37 + 22 = 59,
+# por debajo del max_connections=100 por defecto de PostgreSQL. Al subir estos
+# valores, o al lanzar más procesos, la suma debe seguir por debajo de ese límite.
+
+# Motor síncrono (trabajadores y endpoints 'def'): tamaño del grupo, conexiones
+# extra permitidas en picos y segundos que una petición espera por una conexión
+# libre antes de fallar (también se aplica al motor asíncrono).
+DB_TAMANO_POOL = int(os.getenv("DB_TAMANO_POOL", "10"))
+DB_MAXIMO_DESBORDE = int(os.getenv("DB_MAXIMO_DESBORDE", "10"))
+DB_SEGUNDOS_ESPERA_POOL = float(os.getenv("DB_SEGUNDOS_ESPERA_POOL", "30"))
+
+# Motor asíncrono (endpoints 'async def'): sus consultas son cortas y no ocupan
+# un hilo mientras esperan, así que le basta un grupo más pequeño.
+DB_ASINCRONO_TAMANO_POOL = int(os.getenv("DB_ASINCRONO_TAMANO_POOL", "5"))
+DB_ASINCRONO_MAXIMO_DESBORDE = int(os.getenv("DB_ASINCRONO_MAXIMO_DESBORDE", "10"))
+
+# Comprobar cada conexión antes de usarla (descarta las que cerró el servidor) y
+# renovar las conexiones con más de estos segundos de vida.
+DB_VERIFICAR_CONEXIONES = os.getenv("DB_VERIFICAR_CONEXIONES", "true").lower() == "true"
+DB_SEGUNDOS_RECICLAR_CONEXION = int(os.getenv("DB_SEGUNDOS_RECICLAR_CONEXION", "1800"))
+
+# Si es "true", se imprime cada sentencia SQL (solo para depurar: es muy costoso).
+DB_MOSTRAR_SQL = os.getenv("DB_MOSTRAR_SQL", "false").lower() == "true"
+
+# =================================================================================
+# SECCIÓN 12: CACHÉ DE RESPUESTAS DEL MODELO DE LENGUAJE
+# =================================================================================
+
+# Las respuestas a la extracción de entidades, la síntesis y la verificación de
+# calidad se guardan en la base de datos: el mismo prompt no se paga dos veces.
+CACHE_LLM_ACTIVADA = os.getenv("CACHE_LLM_ACTIVADA", "true").lower() == "true"
+
+# Vida de cada respuesta guardada (en segundos; por defecto 30 días) y número
+# máximo de respuestas (al superarlo se borran las usadas hace más tiempo).
+CACHE_LLM_SEGUNDOS_VIDA = int(os.getenv("CACHE_LLM_SEGUNDOS_VIDA", str(30 * 24 * 3600)))
+CACHE_LLM_MAXIMO_ENTRADAS = int(os.getenv("CACHE_LLM_MAXIMO_ENTRADAS", "5000"))
+
+# Similitud coseno mínima (ej. 0.98) para reutilizar la respuesta de un prompt
+# casi idéntico, comparando embeddings. 0 = solo prompts idénticos.
+CACHE_LLM_SIMILITUD_MINIMA = float(os.getenv("CACHE_LLM_SIMILITUD_MINIMA", "0"))
+
+# =================================================================================
+# SECCIÓN 13: PROVEEDOR DEL MODELO DE LENGUAJE
+# =================================================================================
+
+# Qué modelo responde a las herramientas de lenguaje:
+#   "gemini"   -> la API de Google (necesita GOOGLE_API_KEY).
+#   "local"    -> un servidor HTTP compatible con la API de OpenAI (Ollama, llama.cpp...).
+#   "simulado" -> respuestas deterministas sin red, para pruebas de carga sin gastar cuota.
+PROVEEDOR_LLM = os.getenv("PROVEEDOR_LLM", "gemini").lower()
+
+# Servidor local: URL base de la API compatible con OpenAI (Ollama: http://localhost:11434/v1,
+# llama.cpp: http://localhost:8080/v1), modelo y segundos máximos de espera por respuesta.
+URL_LLM_LOCAL = os.getenv("URL_LLM_LOCAL", "http://localhost:11434/v1")
+MODELO_LLM_LOCAL = os.getenv("MODELO_LLM_LOCAL", "llama3.1")
+SEGUNDOS_ESPERA_LLM_LOCAL = float(os.getenv("SEGUNDOS_ESPERA_LLM_LOCAL", "300"))
+
+# Modelo simulado: latencia fija por llamada y latencia extra por cada 1000 tokens de entrada.
+LLM_SIMULADO_SEGUNDOS_LATENCIA = float(os.getenv("LLM_SIMULADO_SEGUNDOS_LATENCIA", "0.5"))
+LLM_SIMULADO_SEGUNDOS_POR_1000_TOKENS = float(os.getenv("LLM_SIMULADO_SEGUNDOS_POR_1000_TOKENS", "0"))
+
+# =================================================================================
+# SECCIÓN 14: CACHÉ DE EXTRACCIONES
+# =================================================================================
+
+# Reutilizar el texto ya extraído de un archivo idéntico (ver cache_de_resultados).
+# Se apaga para medir las herramientas de extracción (o para trabajar sin base de datos).
+CACHE_EXTRACCIONES_ACTIVADA = os.getenv("CACHE_EXTRACCIONES_ACTIVADA", "true").lower() == "true"
+
+# =================================================================================
+# SECCIÓN 15: TRAZAS Y MÉTRICAS
+# =================================================================================
+
+# Dónde van los tramos (spans) de cada nodo, herramienta y llamada al modelo:
+#   "registro"      -> una línea JSON por tramo en RUTA_REGISTRO_TRAZAS.
+#   "opentelemetry" -> exportador OTLP (se configura con las variables OTEL_EXPORTER_OTLP_*).
+#   "ninguna"       -> sin trazas (por defecto).
+TRAZAS = os.getenv("TRAZAS", "ninguna").lower()
+RUTA_REGISTRO_TRAZAS = os.getenv("RUTA_REGISTRO_TRAZAS", "registros/trazas.jsonl")
+# El registro rota al llegar a este tamaño (en MiB), conservando estas copias anteriores.
+REGISTRO_TRAZAS_TAMANO_MAXIMO_MB = int(os.getenv("REGISTRO_TRAZAS_TAMANO_MAXIMO_MB", "50"))
+REGISTRO_TRAZAS_COPIAS = int(os.getenv("REGISTRO_TRAZAS_COPIAS", "5"))
+NOMBRE_SERVICIO_TRAZAS = os.getenv("NOMBRE_SERVICIO_TRAZAS", "asistente-legal")
+
+# Métricas de Prometheus (necesitan 'prometheus_client'). La API las sirve en
+# /metrics; un proceso de trabajadores separado las sirve en este puerto (0 = no).
+METRICAS_ACTIVADAS = os.getenv("METRICAS_ACTIVADAS", "true").lower() == "true"
+PUERTO_METRICAS_TRABAJADORES = int(os.getenv("PUERTO_METRICAS_TRABAJADORES", "0"))
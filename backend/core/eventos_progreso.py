@@ -0,0 +1,80 @@
+# backend/core/eventos_progreso.py
+
+import functools
+import threading
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Optional
+
+from . import observabilidad
+
+# =================================================================================
+# SECCIÓN 1: "TABLÓN DE ANUNCIOS" DE PROGRESO EN MEMORIA
+# =================================================================================
+# Los nodos y herramientas publican aquí eventos de progreso (inicio y fin de cada
+# nodo, página de Nougat procesada, fotograma analizado...). El endpoint SSE de la
+# API los lee y se los envía al navegador a medida que llegan.
+#
+# Los eventos viven en memoria del proceso: el endpoint SSE solo ve los trabajos
+# que ejecutan los trabajadores arrancados dentro de la misma API.
+
+# Cuántas evidencias recientes conservamos en memoria (las más antiguas se olvidan).
+MAXIMO_EVIDENCIAS_EN_MEMORIA = 200
+
+_eventos_por_evidencia: "OrderedDict[str, list[dict]]" = OrderedDict()
+_candado = threading.Lock()
+
+# Evidencia que se está procesando en el hilo (o contexto) actual. Así las
+# herramientas pueden publicar eventos sin recibir el id como parámetro.
+evidencia_actual: ContextVar[Optional[str]] = ContextVar("evidencia_actual", default=None)
+
+
+def publicar_evento(tipo: str, id_evidencia: Optional[str] = None, **datos) -> None:
+    """
+    Registra un evento de progreso para una evidencia.
+
+    Args:
+        tipo (str): 'nodo_inicio', 'nodo_fin', 'progreso' o 'fin'.
+        id_evidencia (str, opcional): Si no se indica, se usa la evidencia del contexto actual.
+        **datos: Información adicional del evento (nodo, etapa, actual, total...).
+    """
+    id_evidencia = id_evidencia or evidencia_actual.get()
+    if not id_evidencia:
+        return
+
+    evento = {"tipo": tipo, "marca_tiempo": time.time(), **datos}
+    with _candado:
+        eventos = _eventos_por_evidencia.setdefault(id_evidencia, [])
+        eventos.append(evento)
+        _eventos_por_evidencia.move_to_end(id_evidencia)
+        while len(_eventos_por_evidencia) > MAXIMO_EVIDENCIAS_EN_MEMORIA:
+            _eventos_por_evidencia.popitem(last=False)
+
+
+def leer_eventos(id_evidencia: str, desde: int = 0) -> list[dict]:
+    """Devuelve los eventos de una evidencia a partir de la posición 'desde'."""
+    with _candado:
+        return list(_eventos_por_evidencia.get(id_evidencia, [])[desde:])
+
+
+def medir_nodo(nombre_nodo: str):
+    """
+    Decorador para los nodos del grafo: publica 'nodo_inicio' al entrar y
+    'nodo_fin' (con la duración en segundos) al salir. Además abre un tramo
+    'nodo.<nombre>' y registra la duración en la métrica de nodos.
+    """
+    def decorador(funcion_nodo):
+        @functools.wraps(funcion_nodo)
+        def envoltura(estado, *args, **kwargs):
+            publicar_evento("nodo_inicio", nodo=nombre_nodo)
+            inicio = time.perf_counter()
+            try:
+                with observabilidad.tramo(f"nodo.{nombre_nodo}", nodo=nombre_nodo):
+                    return funcion_nodo(estado, *args, **kwargs)
+            finally:
+                duracion = time.perf_counter() - inicio
+                observabilidad.segundos_por_nodo.labels(nombre_nodo).observe(duracion)
+                publicar_evento("nodo_fin", nodo=nombre_nodo, duracion_segundos=round(duracion, 3))
+        return envoltura
+    return decorador
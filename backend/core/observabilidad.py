@@ -0,0 +1,280 @@
+# backend/core/observabilidad.py
+
+import json
+import logging
+import logging.handlers
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Callable, Optional
+
+from . import configuracion
+
+# =================================================================================
+# SECCIÓN 1: TRAZAS (TRAMOS AL ESTILO OPENTELEMETRY)
+# =================================================================================
+# Cada nodo del grafo, cada herramienta y cada llamada al modelo de lenguaje
+# abre un "tramo" (span) con su nombre, su duración y sus atributos (páginas,
+# segmentos, tokens...). Los tramos se anidan: el del trabajo contiene los de
+# sus nodos, y estos los de sus herramientas.
+#
+# Con TRAZAS="opentelemetry" se exportan por OTLP (Jaeger, Tempo...); con
+# "registro", cada tramo terminado es una línea JSON en RUTA_REGISTRO_TRAZAS
+# (un archivo que rota por tamaño). Por defecto no se generan.
+# Los 'print' siguen siendo el registro legible; los tramos son lo que se agrega.
+#
+# Como los eventos de progreso, el tramo actual vive en una ContextVar: para que
+# un hilo de un ThreadPoolExecutor cuelgue sus tramos del tramo que lo lanzó hay
+# que enviarle la tarea con 'contextvars.copy_context().run'.
+
+_tramo_actual: ContextVar[Optional["Tramo"]] = ContextVar("tramo_actual", default=None)
+_registro_trazas = logging.getLogger("asistente_legal.trazas")
+_candado_configuracion = threading.Lock()
+_modo_trazas: Optional[str] = None
+_trazador_otel = None
+
+
+class Tramo:
+    """Una operación medida: nombre, identificadores de traza, atributos y resultado."""
+
+    def __init__(self, nombre: str, atributos: dict, padre: Optional["Tramo"]):
+        self.nombre = nombre
+        self.id_traza = padre.id_traza if padre else uuid.uuid4().hex
+        self.id_tramo = uuid.uuid4().hex[:16]
+        self.id_padre = padre.id_tramo if padre else None
+        self.atributos = dict(atributos)
+        self.error: Optional[str] = None
+        self.segundos: Optional[float] = None  # Duración, al cerrarse el tramo.
+        self._tramo_otel = None
+
+    def fijar(self, **atributos) -> None:
+        """Añade atributos al tramo (por ejemplo, los tokens de una respuesta)."""
+        self.atributos.update(atributos)
+        if self._tramo_otel is not None:
+            for clave, valor in atributos.items():
+                self._tramo_otel.set_attribute(clave, _valor_para_otel(valor))
+
+
+def _valor_para_otel(valor):
+    # OpenTelemetry solo acepta tipos simples como atributos.
+    return valor if isinstance(valor, (str, bool, int, float)) else str(valor)
+
+
+def _configurar_trazas() -> str:
+    """Prepara el destino de las trazas la primera vez que se abre un tramo."""
+    global _modo_trazas, _trazador_otel
+    if _modo_trazas is not None:
+        return _modo_trazas
+    with _candado_configuracion:
+        if _modo_trazas is not None:
+            return _modo_trazas
+        modo = configuracion.TRAZAS
+        if modo == "opentelemetry":
+            try:
+                _trazador_otel = _crear_trazador_otel()
+            except Exception as e:
+                print(f"TOOL-SETUP-WARN: No se pudo configurar OpenTelemetry ({e}). Las trazas van al registro JSON.")
+                modo = "registro"
+        if modo == "registro":
+            _configurar_registro_trazas()
+        elif modo not in ("opentelemetry", "ninguna"):
+            print(f"TOOL-SETUP-WARN: Destino de trazas desconocido '{modo}'. Se desactivan.")
+            modo = "ninguna"
+        _modo_trazas = modo
+    return _modo_trazas
+
+
+def _crear_trazador_otel():
+    from opentelemetry import trace
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    proveedor = TracerProvider(resource=Resource.create({"service.name": configuracion.NOMBRE_SERVICIO_TRAZAS}))
+    # El destino (OTEL_EXPORTER_OTLP_ENDPOINT...) lo lee el exportador de las variables de entorno.
+    proveedor.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(proveedor)
+    print("TOOL-SETUP: Trazas exportadas por OpenTelemetry (OTLP).")
+    return trace.get_tracer("asistente_legal")
+
+
+def _configurar_registro_trazas() -> None:
+    if _registro_trazas.handlers:
+        return
+    ruta = Path(configuracion.RUTA_REGISTRO_TRAZAS)
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    manejador = logging.handlers.RotatingFileHandler(
+        ruta,
+        maxBytes=configuracion.REGISTRO_TRAZAS_TAMANO_MAXIMO_MB * 1024 * 1024,
+        backupCount=configuracion.REGISTRO_TRAZAS_COPIAS,
+        encoding="utf-8",
+    )
+    manejador.setFormatter(logging.Formatter("%(message)s"))
+    _registro_trazas.addHandler(manejador)
+    _registro_trazas.setLevel(logging.INFO)
+    _registro_trazas.propagate = False
+    print(f"TOOL-SETUP: Trazas registradas en '{ruta}'.")
+
+
+@contextmanager
+def tramo(nombre: str, **atributos):
+    """
+    Mide el bloque como un tramo hijo del tramo actual (o como raíz de una traza nueva).
+
+    Uso:
+        with tramo("llm.llamada", modelo=nombre) as t:
+            respuesta = modelo.invoke(prompt)
+            t.fijar(tokens_salida=...)
+    """
+    modo = _configurar_trazas()
+    actual = Tramo(nombre, atributos, _tramo_actual.get())
+    token_contexto = _tramo_actual.set(actual)
+    marca_inicio = time.time()
+    inicio = time.perf_counter()
+    contexto_otel = (
+        _trazador_otel.start_as_current_span(nombre, attributes={c: _valor_para_otel(v) for c, v in atributos.items()})
+        if modo == "opentelemetry" else nullcontext()
+    )
+    try:
+        with contexto_otel as tramo_otel:
+            actual._tramo_otel = tramo_otel
+            yield actual
+    except Exception as e:
+        actual.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _tramo_actual.reset(token_contexto)
+        actual.segundos = time.perf_counter() - inicio
+        if modo == "registro":
+            _registro_trazas.info(json.dumps({
+                "nombre": actual.nombre,
+                "id_traza": actual.id_traza,
+                "id_tramo": actual.id_tramo,
+                "id_padre": actual.id_padre,
+                "inicio": marca_inicio,
+                "duracion_segundos": round(actual.segundos, 6),
+                "atributos": actual.atributos,
+                "error": actual.error,
+            }, ensure_ascii=False, default=str))
+
+
+# =================================================================================
+# SECCIÓN 2: MÉTRICAS DE PROMETHEUS
+# =================================================================================
+# Histogramas de latencia (nodos, herramientas, modelo de lenguaje, espera en la
+# cola), tokens gastados y profundidad de la cola. Si 'prometheus_client' no
+# está instalado (o METRICAS_ACTIVADAS=false), las métricas no hacen nada.
+# Cada proceso tiene sus propias métricas: la API las sirve en /metrics y un
+# proceso de trabajadores aparte, en PUERTO_METRICAS_TRABAJADORES.
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+METRICAS_DISPONIBLES = prometheus_client is not None and configuracion.METRICAS_ACTIVADAS
+if configuracion.METRICAS_ACTIVADAS and prometheus_client is None:
+    print("TOOL-SETUP-WARN: 'prometheus_client' no está instalado. Las métricas quedan desactivadas.")
+
+CUBETAS_SEGUNDOS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+CUBETAS_TOKENS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+
+class _MetricaNula:
+    """Sustituto de una métrica cuando Prometheus no está disponible."""
+
+    def labels(self, *_, **__):
+        return self
+
+    def observe(self, *_):
+        pass
+
+    def inc(self, *_):
+        pass
+
+
+def _histograma(nombre: str, descripcion: str, etiquetas: tuple = (), cubetas=CUBETAS_SEGUNDOS):
+    if not METRICAS_DISPONIBLES:
+        return _MetricaNula()
+    return prometheus_client.Histogram(nombre, descripcion, etiquetas, buckets=cubetas)
+
+
+def _contador(nombre: str, descripcion: str, etiquetas: tuple = ()):
+    if not METRICAS_DISPONIBLES:
+        return _MetricaNula()
+    return prometheus_client.Counter(nombre, descripcion, etiquetas)
+
+
+segundos_por_nodo = _histograma(
+    "asistente_legal_nodo_segundos", "Duración de cada nodo del grafo.", ("nodo",))
+segundos_por_herramienta = _histograma(
+    "asistente_legal_herramienta_segundos",
+    "Duración de cada operación de las herramientas (archivo completo, lote de Nougat, bloque de Whisper...).",
+    ("operacion",))
+segundos_por_llamada_llm = _histograma(
+    "asistente_legal_llm_segundos", "Duración de cada llamada al modelo de lenguaje (con reintentos y esperas de cuota).",
+    ("modelo",))
+tokens_por_llamada_llm = _histograma(
+    "asistente_legal_llm_tokens_por_llamada", "Tokens de cada llamada al modelo de lenguaje.",
+    ("modelo", "tipo"), CUBETAS_TOKENS)
+tokens_llm = _contador(
+    "asistente_legal_llm_tokens", "Tokens gastados en el modelo de lenguaje ('entrada' o 'salida').", ("modelo", "tipo"))
+consultas_cache_llm = _contador(
+    "asistente_legal_llm_cache", "Consultas a la caché de respuestas ('acierto' o 'fallo').", ("resultado",))
+segundos_espera_en_cola = _histograma(
+    "asistente_legal_cola_espera_segundos", "Tiempo desde que se encola un trabajo hasta que un trabajador lo toma.")
+trabajos_terminados = _contador(
+    "asistente_legal_trabajos_terminados", "Trabajos de la cola terminados, por estado final.", ("estado",))
+
+_profundidad_de_cola_registrada = False
+
+
+def registrar_profundidad_de_cola(contar_trabajos_por_estado: Callable[[], dict]) -> None:
+    """
+    Publica la profundidad de la cola como el indicador
+    'asistente_legal_cola_trabajos{estado=...}', consultado en cada lectura de
+    las métricas (así es correcta aunque la cola la atiendan otros procesos).
+    """
+    global _profundidad_de_cola_registrada
+    # El módulo de la cola puede importarse dos veces (como __main__ y como paquete).
+    if not METRICAS_DISPONIBLES or _profundidad_de_cola_registrada:
+        return
+    _profundidad_de_cola_registrada = True
+    from prometheus_client.core import GaugeMetricFamily
+
+    def _indicador_vacio():
+        return GaugeMetricFamily("asistente_legal_cola_trabajos", "Trabajos en la cola, por estado.", labels=["estado"])
+
+    class _ColectorCola:
+        def describe(self):
+            # Sin 'describe', el registro llamaría a 'collect' (una consulta a la
+            # base de datos) al registrarlo, es decir, al importar la cola.
+            return [_indicador_vacio()]
+
+        def collect(self):
+            indicador = _indicador_vacio()
+            try:
+                for estado, cantidad in contar_trabajos_por_estado().items():
+                    indicador.add_metric([estado], cantidad)
+            except Exception as e:
+                print(f"QUEUE-SYSTEM-ERROR: No se pudo medir la profundidad de la cola. Causa: {e}")
+            yield indicador
+
+    prometheus_client.REGISTRY.register(_ColectorCola())
+
+
+def generar_metricas() -> tuple[bytes, str]:
+    """Devuelve las métricas en el formato de texto de Prometheus, con su tipo de contenido."""
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def iniciar_servidor_metricas(puerto: int) -> None:
+    """Sirve /metrics en un puerto propio (para procesos sin la API, como los trabajadores)."""
+    if not METRICAS_DISPONIBLES:
+        return
+    prometheus_client.start_http_server(puerto)
+    print(f"TOOL-SETUP: Métricas de Prometheus en http://0.0.0.0:{puerto}/metrics")
@@ -1,27 +1,147 @@
-import whisper
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ..core import configuracion, observabilidad
+from ..core.carga_perezosa import CargadorPerezoso
+from ..core.eventos_progreso import publicar_evento
+
+# Identifica la configuración que produce el texto. Si cambia el motor, el modelo
+# o la cuantización, cambia la versión y la caché de extracciones deja de
+# reutilizar textos antiguos.
+MOTOR_WHISPER = configuracion.MOTOR_WHISPER
+NOMBRE_MODELO_WHISPER = configuracion.NOMBRE_MODELO_WHISPER
+if MOTOR_WHISPER == "faster-whisper":
+    VERSION_HERRAMIENTA = f"faster-whisper-{NOMBRE_MODELO_WHISPER}-{configuracion.WHISPER_TIPO_COMPUTO}"
+else:
+    VERSION_HERRAMIENTA = f"whisper-{NOMBRE_MODELO_WHISPER}"
+
+# Frecuencia de muestreo con la que trabaja Whisper.
+MUESTRAS_POR_SEGUNDO = 16000
+
+
+def _cargar_modelo_whisper():
+    # Importamos el motor (y con él torch o CTranslate2) solo cuando de verdad hace falta.
+    if MOTOR_WHISPER == "faster-whisper":
+        from faster_whisper import WhisperModel
+        return WhisperModel(
+            NOMBRE_MODELO_WHISPER,
+            device="cpu",
+            compute_type=configuracion.WHISPER_TIPO_COMPUTO,
+            cpu_threads=configuracion.WHISPER_HILOS_CPU,
+            # Un trabajador de CTranslate2 por bloque que se decodifica a la vez.
+            num_workers=max(1, configuracion.WHISPER_BLOQUES_EN_PARALELO),
+        )
+    import whisper
+    return whisper.load_model(NOMBRE_MODELO_WHISPER)
+
+# El modelo se carga una sola vez, la primera vez que llega un audio.
+cargador_whisper = CargadorPerezoso("Whisper", _cargar_modelo_whisper)
+
+
+def _segmento(inicio: float, fin: float, texto: str) -> dict:
+    return {"inicio": round(inicio, 2), "fin": round(fin, 2), "texto": texto.strip()}
+
+
+def agrupar_voz_en_bloques(tramos_de_voz: list[dict], muestras_por_bloque: int) -> list[tuple[int, int]]:
+    """
+    Junta los tramos con voz consecutivos en bloques de como mucho
+    'muestras_por_bloque' muestras. Como los cortes caen en silencios, ninguna
+    palabra queda partida entre dos bloques.
+
+    Args:
+        tramos_de_voz (list[dict]): Tramos {'start', 'end'} en muestras, en orden.
+        muestras_por_bloque (int): Tamaño máximo de un bloque.
+
+    Returns:
+        list[tuple[int, int]]: (muestra inicial, muestra final) de cada bloque.
+    """
+    bloques: list[tuple[int, int]] = []
+    for tramo in tramos_de_voz:
+        if bloques and tramo["end"] - bloques[-1][0] <= muestras_por_bloque:
+            bloques[-1] = (bloques[-1][0], tramo["end"])
+        else:
+            bloques.append((tramo["start"], tramo["end"]))
+    return bloques
+
+
+def _transcribir_bloque(modelo_whisper, audio, inicio: int, fin: int) -> list[dict]:
+    """Decodifica un bloque de audio con faster-whisper y devuelve sus segmentos en tiempo absoluto."""
+    desfase = inicio / MUESTRAS_POR_SEGUNDO
+    with observabilidad.tramo(
+        "whisper.bloque", segundo_inicio=round(desfase, 2), segundo_fin=round(fin / MUESTRAS_POR_SEGUNDO, 2)
+    ) as tramo_bloque:
+        segmentos, _ = modelo_whisper.transcribe(
+            audio[inicio:fin],
+            language=configuracion.WHISPER_IDIOMA or None,
+            vad_filter=False,  # El bloque ya es solo voz.
+        )
+        # 'segmentos' es un generador: la decodificación ocurre al recorrerlo.
+        resultado = [_segmento(desfase + s.start, desfase + s.end, s.text) for s in segmentos]
+        tramo_bloque.fijar(segmentos=len(resultado))
+    observabilidad.segundos_por_herramienta.labels("whisper_bloque").observe(tramo_bloque.segundos)
+    return resultado
+
+
+def _transcribir_con_faster_whisper(modelo_whisper, ruta_archivo: str) -> list[dict]:
+    """
+    Transcripción con CTranslate2: la detección de voz (VAD) corta el audio en
+    bloques por los silencios y hasta WHISPER_BLOQUES_EN_PARALELO bloques se
+    decodifican a la vez. Cada bloque terminado se publica como resultado
+    parcial, así la interfaz muestra la transcripción mientras avanza.
+    """
+    from faster_whisper import decode_audio
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    audio = decode_audio(ruta_archivo, sampling_rate=MUESTRAS_POR_SEGUNDO)
+    segundos_por_bloque = max(1.0, configuracion.WHISPER_SEGUNDOS_POR_BLOQUE)
+    tramos_de_voz = get_speech_timestamps(audio, VadOptions(max_speech_duration_s=segundos_por_bloque))
+    bloques = agrupar_voz_en_bloques(tramos_de_voz, int(segundos_por_bloque * MUESTRAS_POR_SEGUNDO))
+    print(
+        f"      TOOL-SYSTEM: -> {len(audio) / MUESTRAS_POR_SEGUNDO:.0f} s de audio, {len(bloques)} bloque(s) con voz, "
+        f"{configuracion.WHISPER_BLOQUES_EN_PARALELO} en paralelo."
+    )
+
+    segmentos_por_bloque: list[list[dict]] = [[] for _ in bloques]
+    inicio_transcripcion = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, configuracion.WHISPER_BLOQUES_EN_PARALELO)) as ejecutor:
+        # Cada bloque se decodifica en una copia del contexto, para que su tramo
+        # cuelgue del tramo de la herramienta.
+        futuros = {
+            ejecutor.submit(contextvars.copy_context().run, _transcribir_bloque, modelo_whisper, audio, inicio, fin): indice
+            for indice, (inicio, fin) in enumerate(bloques)
+        }
+        # Publicamos desde este hilo (el que conoce la evidencia actual).
+        for numero_terminado, futuro in enumerate(as_completed(futuros), start=1):
+            indice = futuros[futuro]
+            segmentos_por_bloque[indice] = futuro.result()
+            publicar_evento(
+                "progreso", etapa="audio_bloque", actual=numero_terminado, total=len(bloques),
+                duracion_segundos=round(time.perf_counter() - inicio_transcripcion, 3),
+                segmentos=segmentos_por_bloque[indice],
+            )
+
+    return [segmento for segmentos in segmentos_por_bloque for segmento in segmentos]
 
-# Cargamos el modelo una sola vez para eficiencia.
-try:
-    modelo_whisper = whisper.load_model("base")
-    print("TOOL-SETUP: Modelo Whisper cargado correctamente en memoria.")
-except Exception as e:
-    modelo_whisper = None
-    print(f"TOOL-SETUP-ERROR: No se pudo cargar el modelo Whisper. {e}")
 
 def procesar_audio_con_whisper(ruta_archivo: str) -> dict:
     """
-    Transcribe un archivo de audio a texto utilizando el modelo Whisper de OpenAI.
+    Transcribe un archivo de audio a texto utilizando Whisper (openai-whisper o
+    faster-whisper, según MOTOR_WHISPER).
     La salida de esta función está estandarizada a un diccionario.
 
     Args:
         ruta_archivo (str): La ruta completa al archivo de audio a transcribir.
 
     Returns:
-        dict: Un diccionario que contiene el texto transcrito en la clave 'texto_extraido'.
+        dict: Un diccionario que contiene el texto transcrito en la clave 'texto_extraido'
+              y los segmentos con sus marcas de tiempo en 'segmentos' (lista de
+              {'inicio', 'fin', 'texto'}, en segundos).
               Si ocurre un error, el valor será None y se añadirá una clave 'error'.
     """
-    resultado = {"texto_extraido": None, "error": None}
+    resultado = {"texto_extraido": None, "segmentos": None, "error": None}
 
+    modelo_whisper = cargador_whisper.obtener()
     if not modelo_whisper:
         error_msg = "El modelo Whisper no está disponible o no se pudo cargar."
         print(f"TOOL-SYSTEM-ERROR: {error_msg}")
@@ -30,18 +150,24 @@ def procesar_audio_con_whisper(ruta_archivo: str) -> dict:
 
     try:
         print(f"      TOOL-SYSTEM: -> Herramienta 'procesar_audio_con_whisper' activada para {ruta_archivo}")
-        print("      TOOL-SYSTEM: -> Transcribiendo audio con Whisper...")
-        
+        print(f"      TOOL-SYSTEM: -> Transcribiendo audio con {MOTOR_WHISPER} ({NOMBRE_MODELO_WHISPER})...")
+
         # Realizamos la transcripción
-        transcripcion = modelo_whisper.transcribe(ruta_archivo)
-        texto_transcrito = transcripcion["text"]
-        
-        resultado["texto_extraido"] = texto_transcrito
-        print("      TOOL-SYSTEM: -> Transcripción completada.")
-        
+        if MOTOR_WHISPER == "faster-whisper":
+            segmentos = _transcribir_con_faster_whisper(modelo_whisper, ruta_archivo)
+        else:
+            with observabilidad.tramo("whisper.archivo") as tramo_whisper:
+                transcripcion = modelo_whisper.transcribe(ruta_archivo, language=configuracion.WHISPER_IDIOMA or None)
+                segmentos = [_segmento(s["start"], s["end"], s["text"]) for s in transcripcion["segments"]]
+                tramo_whisper.fijar(segmentos=len(segmentos))
+
+        resultado["segmentos"] = segmentos
+        resultado["texto_extraido"] = " ".join(s["texto"] for s in segmentos if s["texto"])
+        print(f"      TOOL-SYSTEM: -> Transcripción completada ({len(segmentos)} segmentos).")
+
     except Exception as e:
         error_msg = f"Ocurrió un error inesperado al transcribir el audio: {e}"
         print(f"TOOL-SYSTEM-ERROR: {error_msg}")
         resultado["error"] = error_msg
 
-    return resultado
\ No newline at end of file
+    return resultado
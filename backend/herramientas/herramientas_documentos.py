@@ -1,32 +1,346 @@
 # backend/herramientas/herramientas_documentos.py
 
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from importlib import metadata
+import multiprocessing
+import os
 from pathlib import Path
-from nougat import NougatModel
-from nougat.utils.checkpoint import get_checkpoint
+import queue
+import threading
 import fitz  # PyMuPDF
 from PIL import Image
+import time
+from typing import Callable, Optional
+
+from ..core import configuracion
+from ..core.eventos_progreso import publicar_evento
+from ..core import observabilidad
+from ..core.carga_perezosa import CargadorPerezoso
+
+# Identifica la configuración que produce el texto (versión de Nougat, resolución
+# de página y umbrales del texto nativo), para que la caché de extracciones no
+# reutilice textos de otra configuración. Se calcula sin cargar el modelo.
+DPI_PAGINAS = 96
+try:
+    _VERSION_NOUGAT = metadata.version('nougat-ocr')
+except metadata.PackageNotFoundError:
+    _VERSION_NOUGAT = "desconocida"
+VERSION_HERRAMIENTA = (
+    f"nougat-{_VERSION_NOUGAT}-{DPI_PAGINAS}dpi"
+    f"-nativo{configuracion.PDF_MINIMO_CARACTERES_TEXTO_NATIVO}-{configuracion.PDF_CALIDAD_MINIMA_TEXTO_NATIVO}"
+)
+
+# Puntuación que consideramos "legible" al evaluar la capa de texto nativa.
+PUNTUACION_LEGIBLE = set(".,;:¿?¡!()[]{}\"'«»-–—/%$#&*+=<>@§°ºª_…")
 
 # =================================================================================
-# ¡CONFIGURACIÓN INICIAL DE NOUGAT!
+# ¡CONFIGURACIÓN INICIAL DE NOUGAT! (se carga en el primer PDF)
 # =================================================================================
-try:
-    print("TOOL-SETUP: Configurando el modelo Nougat...")
-    checkpoint_path = get_checkpoint() 
-    modelo_nougat = NougatModel.from_pretrained(checkpoint_path)
-    print("TOOL-SETUP: ¡Modelo Nougat cargado y listo para procesar documentos!")
-except Exception as e:
-    modelo_nougat = None
-    print(f"TOOL-SETUP-ERROR: No se pudo cargar o configurar el modelo Nougat. Error: {e}")
+def _cargar_modelo_nougat():
+    # Nougat arrastra torch y transformers: los importamos solo al primer uso.
+    import torch
+    from nougat import NougatModel
+    from nougat.utils.checkpoint import get_checkpoint
+    if configuracion.NOUGAT_HILOS_CPU > 0:
+        torch.set_num_threads(configuracion.NOUGAT_HILOS_CPU)
+    checkpoint_path = get_checkpoint()
+    modelo = NougatModel.from_pretrained(checkpoint_path)
+    modelo.eval()
+    return modelo
+
+cargador_nougat = CargadorPerezoso("Nougat", _cargar_modelo_nougat)
+# =================================================================================
+
+
+# Marca de fin que el hilo productor pone en la cola cuando termina de renderizar.
+_FIN_DE_PAGINAS = object()
+
+
+def _renderizar_paginas(
+    ruta_archivo: str, numeros_pagina: list[int], preparar_entrada, cola_paginas: queue.Queue, detener: threading.Event
+) -> None:
+    """
+    Hilo productor: abre el PDF, convierte cada página en imagen y la prepara
+    como tensor de entrada para Nougat. Mientras tanto, el hilo principal ya
+    está pasando por el modelo los lotes anteriores.
+    """
+    documento_pdf = None
+    try:
+        documento_pdf = fitz.open(ruta_archivo)
+        for numero_pagina in numeros_pagina:
+            if detener.is_set():
+                return
+            pix = documento_pdf[numero_pagina].get_pixmap(dpi=DPI_PAGINAS)
+            imagen_pagina = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            cola_paginas.put((numero_pagina, preparar_entrada(imagen_pagina, random_padding=False)))
+        cola_paginas.put(_FIN_DE_PAGINAS)
+    except Exception as e:
+        cola_paginas.put(e)
+    finally:
+        if documento_pdf:
+            documento_pdf.close()
+
+
+def inferir_paginas_con_nougat(
+    modelo_nougat,
+    ruta_archivo: str,
+    numeros_pagina: list[int],
+    al_terminar_pagina: Optional[Callable[[int], None]] = None,
+    tamano_lote: Optional[int] = None,
+    textos_por_pagina: Optional[dict[int, str]] = None,
+) -> dict[int, str]:
+    """
+    Pasa por Nougat las páginas indicadas, en lotes de 'tamano_lote' páginas por
+    cada pasada del modelo. Un hilo productor renderiza las páginas en paralelo
+    a la inferencia; la cola está acotada para no llenar la memoria de imágenes.
+
+    Args:
+        modelo_nougat: El modelo Nougat ya cargado.
+        ruta_archivo (str): Ruta del PDF.
+        numeros_pagina (list[int]): Páginas a procesar (empezando en 0).
+        al_terminar_pagina: Función opcional que se llama con cada página terminada.
+        tamano_lote (int, opcional): Páginas por lote (por defecto NOUGAT_TAMANO_LOTE).
+        textos_por_pagina (dict, opcional): Diccionario que se va rellenando página
+            a página; conserva las páginas ya terminadas aunque luego falle un lote.
+
+    Returns:
+        dict[int, str]: El texto de cada página, por número de página.
+    """
+    tamano_lote = max(1, tamano_lote or configuracion.NOUGAT_TAMANO_LOTE)
+    textos_por_pagina = {} if textos_por_pagina is None else textos_por_pagina
+    cola_paginas: queue.Queue = queue.Queue(maxsize=2 * tamano_lote)
+    detener = threading.Event()
+    productor = threading.Thread(
+        target=_renderizar_paginas,
+        args=(ruta_archivo, numeros_pagina, modelo_nougat.encoder.prepare_input, cola_paginas, detener),
+        daemon=True,
+    )
+    productor.start()
+
+    try:
+        return _consumir_lotes(modelo_nougat, cola_paginas, tamano_lote, al_terminar_pagina, textos_por_pagina)
+    finally:
+        # Si la inferencia falló, el productor puede estar bloqueado con la cola
+        # llena: le pedimos parar y vaciamos la cola hasta que termine.
+        detener.set()
+        while productor.is_alive():
+            try:
+                cola_paginas.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def _consumir_lotes(
+    modelo_nougat, cola_paginas: queue.Queue, tamano_lote: int, al_terminar_pagina, textos_por_pagina: dict[int, str]
+) -> dict[int, str]:
+    """Consumidor (hilo que llama): agrupa las páginas renderizadas en lotes y las pasa por Nougat."""
+    import torch
+
+    quedan_paginas = True
+    while quedan_paginas:
+        # 1. Juntamos un lote de páginas ya renderizadas.
+        lote_numeros, lote_tensores = [], []
+        while len(lote_tensores) < tamano_lote:
+            elemento = cola_paginas.get()
+            if elemento is _FIN_DE_PAGINAS:
+                quedan_paginas = False
+                break
+            if isinstance(elemento, Exception):
+                raise elemento
+            lote_numeros.append(elemento[0])
+            lote_tensores.append(elemento[1])
+
+        if not lote_tensores:
+            break
+
+        # 2. Una sola pasada del modelo para todo el lote.
+        with observabilidad.tramo("nougat.lote", paginas=[n + 1 for n in lote_numeros]) as tramo_lote, torch.inference_mode():
+            salida_modelo = modelo_nougat.inference(image_tensors=torch.stack(lote_tensores))
+        print(f"      TOOL-SYSTEM: -> Lote de {len(lote_tensores)} página(s) procesado en {tramo_lote.segundos:.1f} s.")
+        observabilidad.segundos_por_herramienta.labels("nougat_lote").observe(tramo_lote.segundos)
+        for _ in lote_numeros:
+            observabilidad.segundos_por_herramienta.labels("nougat_pagina").observe(tramo_lote.segundos / len(lote_numeros))
+
+        for numero_pagina, texto_pagina in zip(lote_numeros, salida_modelo["predictions"]):
+            textos_por_pagina[numero_pagina] = texto_pagina
+            if al_terminar_pagina:
+                al_terminar_pagina(numero_pagina)
+
+    return textos_por_pagina
+
+
+def inferir_paginas_tolerando_fallos(
+    modelo_nougat,
+    ruta_archivo: str,
+    numeros_pagina: list[int],
+    al_terminar_pagina: Optional[Callable[[int], None]] = None,
+) -> tuple[dict[int, str], dict[int, str]]:
+    """
+    Como inferir_paginas_con_nougat, pero si falla un lote se reintentan una a
+    una las páginas que faltan, para que una sola página defectuosa no se lleve
+    por delante el resto del documento.
+
+    Returns:
+        tuple: (texto de cada página terminada, error de cada página que falló).
+    """
+    textos_por_pagina: dict[int, str] = {}
+    try:
+        inferir_paginas_con_nougat(modelo_nougat, ruta_archivo, numeros_pagina, al_terminar_pagina, textos_por_pagina=textos_por_pagina)
+        return textos_por_pagina, {}
+    except Exception as e:
+        print(f"TOOL-SYSTEM-ERROR: Falló un lote de Nougat ({e}). Reintentando las páginas pendientes una a una...")
+
+    errores_por_pagina: dict[int, str] = {}
+    for numero_pagina in numeros_pagina:
+        if numero_pagina in textos_por_pagina:
+            continue
+        try:
+            inferir_paginas_con_nougat(
+                modelo_nougat, ruta_archivo, [numero_pagina], al_terminar_pagina, tamano_lote=1, textos_por_pagina=textos_por_pagina
+            )
+        except Exception as e:
+            print(f"TOOL-SYSTEM-ERROR: No se pudo procesar la página {numero_pagina + 1}: {e}")
+            errores_por_pagina[numero_pagina] = str(e)
+    return textos_por_pagina, errores_por_pagina
+
+
+# =================================================================================
+# REPARTO DE PÁGINAS ENTRE VARIOS PROCESOS
 # =================================================================================
+# Nougat y el renderizado de PyMuPDF usan sobre todo CPU. Con NOUGAT_PROCESOS > 0
+# las páginas de un PDF grande se reparten en tareas de NOUGAT_PAGINAS_POR_TAREA
+# entre un grupo de procesos; cada proceso carga el modelo una sola vez al
+# arrancar y renderiza él mismo sus páginas. El grupo se crea al primer uso y se
+# comparte entre todos los trabajadores de la cola.
+
+_grupo_procesos_nougat: Optional[ProcessPoolExecutor] = None
+_candado_grupo_procesos = threading.Lock()
+
+
+def _inicializar_proceso_nougat(hilos_por_proceso: int) -> None:
+    """Se ejecuta una vez en cada proceso del grupo: reparte los núcleos y carga el modelo."""
+    import torch
+    torch.set_num_threads(hilos_por_proceso)
+    cargador_nougat.obtener()
+
+
+def _obtener_grupo_procesos_nougat() -> ProcessPoolExecutor:
+    global _grupo_procesos_nougat
+    with _candado_grupo_procesos:
+        if _grupo_procesos_nougat is None:
+            procesos = configuracion.NOUGAT_PROCESOS
+            # Sin un valor explícito, cada proceso se queda con su parte de los núcleos
+            # para que los hilos de torch de los distintos procesos no compitan entre sí.
+            hilos_por_proceso = configuracion.NOUGAT_HILOS_CPU or max(1, (os.cpu_count() or 1) // procesos)
+            print(f"TOOL-SETUP: Arrancando {procesos} proceso(s) de Nougat con {hilos_por_proceso} hilo(s) cada uno...")
+            _grupo_procesos_nougat = ProcessPoolExecutor(
+                max_workers=procesos,
+                # 'spawn' evita heredar hilos y estado de torch del proceso padre.
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_inicializar_proceso_nougat,
+                initargs=(hilos_por_proceso,),
+            )
+        return _grupo_procesos_nougat
+
+
+def cerrar_grupo_procesos_nougat() -> None:
+    """Detiene el grupo de procesos de Nougat, si se llegó a crear."""
+    global _grupo_procesos_nougat
+    with _candado_grupo_procesos:
+        if _grupo_procesos_nougat is not None:
+            _grupo_procesos_nougat.shutdown(wait=False, cancel_futures=True)
+            _grupo_procesos_nougat = None
+
+
+def _procesar_tarea_de_paginas(ruta_archivo: str, numeros_pagina: list[int]) -> tuple[dict[int, str], dict[int, str]]:
+    """Tarea que corre dentro de un proceso del grupo, con el modelo ya cargado."""
+    modelo_nougat = cargador_nougat.obtener()
+    if not modelo_nougat:
+        raise RuntimeError(f"Modelo Nougat no disponible: {cargador_nougat.error}")
+    return inferir_paginas_tolerando_fallos(modelo_nougat, ruta_archivo, numeros_pagina)
+
+
+def _usar_grupo_procesos(paginas_para_nougat: int) -> bool:
+    return configuracion.NOUGAT_PROCESOS > 0 and paginas_para_nougat > max(1, configuracion.NOUGAT_PAGINAS_POR_TAREA)
+
+
+def inferir_paginas_en_procesos(
+    ruta_archivo: str,
+    numeros_pagina: list[int],
+    al_terminar_pagina: Optional[Callable[[int], None]] = None,
+) -> tuple[dict[int, str], dict[int, str]]:
+    """
+    Reparte las páginas entre los procesos del grupo y junta los resultados.
+    Si una tarea falla entera (por ejemplo, si su proceso muere), sus páginas se
+    marcan como fallidas pero se conservan las de las demás tareas.
+
+    Returns:
+        tuple: (texto de cada página terminada, error de cada página que falló).
+    """
+    grupo = _obtener_grupo_procesos_nougat()
+    paginas_por_tarea = max(1, configuracion.NOUGAT_PAGINAS_POR_TAREA)
+    tareas = [numeros_pagina[i:i + paginas_por_tarea] for i in range(0, len(numeros_pagina), paginas_por_tarea)]
+    futuros = {grupo.submit(_procesar_tarea_de_paginas, ruta_archivo, tarea): tarea for tarea in tareas}
+
+    textos_por_pagina: dict[int, str] = {}
+    errores_por_pagina: dict[int, str] = {}
+    grupo_roto = False
+    for futuro in as_completed(futuros):
+        tarea = futuros[futuro]
+        try:
+            textos_tarea, errores_tarea = futuro.result()
+        except Exception as e:
+            print(f"TOOL-SYSTEM-ERROR: Falló la tarea de las páginas {tarea[0] + 1}-{tarea[-1] + 1}: {e}")
+            grupo_roto = grupo_roto or isinstance(e, BrokenProcessPool)
+            textos_tarea, errores_tarea = {}, {numero_pagina: str(e) for numero_pagina in tarea}
+        textos_por_pagina.update(textos_tarea)
+        errores_por_pagina.update(errores_tarea)
+        if al_terminar_pagina:
+            for numero_pagina in textos_tarea:
+                al_terminar_pagina(numero_pagina)
+
+    # Un grupo con un proceso muerto ya no acepta tareas: el siguiente PDF creará uno nuevo.
+    if grupo_roto:
+        cerrar_grupo_procesos_nougat()
+    return textos_por_pagina, errores_por_pagina
+
+
+def calidad_texto_nativo(texto: str) -> float:
+    """
+    Proporción (0 a 1) de caracteres "legibles" en el texto de una página:
+    letras, números, espacios y puntuación común. Las capas de texto dañadas
+    (fuentes sin mapa Unicode, caracteres de reemplazo, glifos privados) dan
+    proporciones bajas.
+    """
+    if not texto:
+        return 0.0
+    legibles = sum(1 for c in texto if c.isalnum() or c.isspace() or c in PUNTUACION_LEGIBLE)
+    return legibles / len(texto)
+
+
+def texto_nativo_es_confiable(texto: str) -> bool:
+    """Decide si la capa de texto de una página se puede usar sin pasar por Nougat."""
+    texto = texto.strip()
+    return (
+        len(texto) >= configuracion.PDF_MINIMO_CARACTERES_TEXTO_NATIVO
+        and calidad_texto_nativo(texto) >= configuracion.PDF_CALIDAD_MINIMA_TEXTO_NATIVO
+    )
 
 
 def procesar_pdf_con_nougat(ruta_archivo: str) -> dict:
-    """Procesa un archivo PDF utilizando el modelo Nougat página por página.
+    """Extrae el texto de un PDF, usando Nougat solo donde hace falta.
 
-    Esta es la implementación final y robusta. Primero, abre el PDF con PyMuPDF.
-    Luego, itera sobre cada página, la convierte en una imagen de alta calidad,
-    y pasa esa imagen individualmente al método 'inference' de Nougat.
-    Finalmente, une los textos de todas las páginas.
+    1. Ruta rápida: se lee con PyMuPDF la capa de texto nativa de cada página.
+       Las páginas con texto suficiente y legible (documentos digitales) se
+       aceptan tal cual, en milisegundos.
+    2. Las páginas escaneadas o con texto dañado se pasan a Nougat por lotes:
+       un hilo productor las convierte en imágenes mientras el hilo principal
+       las pasa por el modelo (ver inferir_paginas_con_nougat). Si son muchas y
+       NOUGAT_PROCESOS > 0, se reparten entre varios procesos. Si ninguna
+       página lo necesita, el modelo ni siquiera se carga.
+    3. Se unen los textos de todas las páginas en su orden original. Si alguna
+       página falla, el resto se conserva y se informa del fallo en 'error'.
 
     Args:
         ruta_archivo (str): La ruta local completa del archivo PDF a procesar.
@@ -35,46 +349,74 @@ def procesar_pdf_con_nougat(ruta_archivo: str) -> dict:
         dict: Un diccionario con 'texto_extraido' (str) y 'error' (str o None).
     """
     resultado = {"texto_extraido": None, "error": None}
-    if not modelo_nougat:
-        resultado["error"] = "Modelo Nougat no disponible."
-        print(f"TOOL-SYSTEM-ERROR: {resultado['error']}")
-        return resultado
-
     print(f"      TOOL-SYSTEM: -> Herramienta REAL 'procesar_pdf_con_nougat' activada para {ruta_archivo}")
     
-    documento_pdf = None # Inicializamos fuera del try para poder cerrarlo en finally
     try:
-        documento_pdf = fitz.open(ruta_archivo)
-        textos_de_paginas = []
-        print(f"      TOOL-SYSTEM: -> Procesando {len(documento_pdf)} página(s) del PDF...")
+        # 1. Ruta rápida: texto nativo de cada página.
+        textos_por_pagina: dict[int, str] = {}
+        with observabilidad.tramo("pdf.texto_nativo") as tramo_nativo, fitz.open(ruta_archivo) as documento_pdf:
+            total_paginas = len(documento_pdf)
+            for numero_pagina, pagina in enumerate(documento_pdf):
+                texto_nativo = pagina.get_text("text")
+                if texto_nativo_es_confiable(texto_nativo):
+                    textos_por_pagina[numero_pagina] = texto_nativo.strip()
+            tramo_nativo.fijar(paginas=total_paginas, paginas_con_texto_nativo=len(textos_por_pagina))
+        observabilidad.segundos_por_herramienta.labels("pdf_texto_nativo").observe(tramo_nativo.segundos)
 
-        # 1. Iteramos sobre cada página del documento
-        for numero_pagina, pagina in enumerate(documento_pdf):
-            print(f"      TOOL-SYSTEM: -> Procesando página {numero_pagina + 1}...")
-            
-            # 2. Convertimos la página en una imagen de alta calidad
-            pix = pagina.get_pixmap(dpi=96)
-            imagen_pagina = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # 3. ¡LA LLAMADA CORRECTA! Le pasamos la imagen al método 'inference'.
-            salida_modelo = modelo_nougat.inference(image=imagen_pagina)
-            
-            # 4. Extraemos el texto de la predicción de la página
-            texto_pagina = salida_modelo['predictions'][0]
-            textos_de_paginas.append(texto_pagina)
+        paginas_para_nougat = [n for n in range(total_paginas) if n not in textos_por_pagina]
+        print(
+            f"      TOOL-SYSTEM: -> {total_paginas} página(s): {len(textos_por_pagina)} con texto nativo, "
+            f"{len(paginas_para_nougat)} para Nougat."
+        )
+
+        inicio = time.perf_counter()
+        paginas_terminadas = len(textos_por_pagina)
+        publicar_evento("progreso", etapa="pdf_texto_nativo", actual=paginas_terminadas, total=total_paginas)
+
+        # 2. Solo las páginas escaneadas o dañadas pasan por Nougat.
+        if paginas_para_nougat:
+            def _al_terminar_pagina(numero_pagina: int) -> None:
+                nonlocal paginas_terminadas
+                paginas_terminadas += 1
+                publicar_evento(
+                    "progreso", etapa="nougat_pagina", actual=paginas_terminadas, total=total_paginas,
+                    duracion_segundos=round(time.perf_counter() - inicio, 3),
+                )
 
-        # 5. Unimos el texto de todas las páginas
-        resultado["texto_extraido"] = "\n\n".join(textos_de_paginas)
-        print("      TOOL-SYSTEM: -> Procesamiento de PDF con Nougat completado.")
+            errores_por_pagina: dict[int, str] = {}
+            if _usar_grupo_procesos(len(paginas_para_nougat)):
+                print(f"      TOOL-SYSTEM: -> Repartiendo {len(paginas_para_nougat)} página(s) entre {configuracion.NOUGAT_PROCESOS} proceso(s) de Nougat...")
+                textos_nougat, errores_por_pagina = inferir_paginas_en_procesos(ruta_archivo, paginas_para_nougat, _al_terminar_pagina)
+                textos_por_pagina.update(textos_nougat)
+            else:
+                modelo_nougat = cargador_nougat.obtener()
+                if not modelo_nougat:
+                    resultado["error"] = "Modelo Nougat no disponible."
+                    print(f"TOOL-SYSTEM-ERROR: {resultado['error']}")
+                else:
+                    print(f"      TOOL-SYSTEM: -> Procesando {len(paginas_para_nougat)} página(s) con Nougat en lotes de {configuracion.NOUGAT_TAMANO_LOTE}...")
+                    textos_nougat, errores_por_pagina = inferir_paginas_tolerando_fallos(
+                        modelo_nougat, ruta_archivo, paginas_para_nougat, _al_terminar_pagina
+                    )
+                    textos_por_pagina.update(textos_nougat)
+
+            if errores_por_pagina:
+                paginas_fallidas = ", ".join(str(n + 1) for n in sorted(errores_por_pagina))
+                resultado["error"] = f"No se pudo extraer el texto de {len(errores_por_pagina)} página(s): {paginas_fallidas}."
+                print(f"TOOL-SYSTEM-ERROR: {resultado['error']}")
+
+        # 3. Unimos el texto de todas las páginas, en su orden original. Si
+        #    alguna página falló, conservamos el texto de las demás.
+        if textos_por_pagina:
+            resultado["texto_extraido"] = "\n\n".join(
+                textos_por_pagina.get(n, f"[Página {n + 1}: no se pudo extraer el texto]") for n in range(total_paginas)
+            )
+        print("      TOOL-SYSTEM: -> Procesamiento de PDF completado.")
 
     except Exception as e:
         error_msg = f"Ocurrió un error inesperado al procesar el PDF con Nougat: {e}"
         print(f"TOOL-SYSTEM-ERROR: {error_msg}")
         resultado["error"] = error_msg
-    finally:
-        # Es una buena práctica cerrar siempre el archivo PDF
-        if documento_pdf:
-            documento_pdf.close()
             
     return resultado
 
@@ -1,20 +1,29 @@
 # backend/herramientas/herramientas_lenguaje.py
 
-import faiss
 import numpy as np
 import os
 import json
 from dotenv import load_dotenv
 from PIL import Image
 import base64
+import contextvars
 import io
 import time
+import random
+import sqlite3
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
 
 # --- Módulos Principales de IA ---
-from sentence_transformers import SentenceTransformer
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.messages import HumanMessage
+# (SentenceTransformer y el cliente del modelo de lenguaje se importan al cargar cada modelo)
+from langchain_core.messages import AIMessage, HumanMessage
 # ------------------------------------
+from ..core.eventos_progreso import publicar_evento
+from ..core.carga_perezosa import CargadorPerezoso
+from ..core import configuracion, observabilidad
+from . import indice_conocimiento, proveedores_llm
 
 # =================================================================================
 # SECCIÓN 1: CONFIGURACIÓN INICIAL DEL CEREBRO DE LA APLICACIÓN
@@ -24,53 +33,389 @@ from langchain_core.messages import HumanMessage
 load_dotenv()
 api_key = os.getenv("GOOGLE_API_KEY")
 
-modelo_gemini_pro = None
-modelo_gemini_flash = None
-
-if not api_key:
+if not api_key and configuracion.PROVEEDOR_LLM == "gemini":
     print("TOOL-SETUP-ERROR: No se encontró la GOOGLE_API_KEY en el archivo .env")
-else:
-    # 2. Inicializamos los modelos de IA que usaremos en toda la aplicación.
-    #    Hacemos esto una sola vez para ser más eficientes.
+
+
+# 2. Los modelos de IA se crean una sola vez, la primera vez que se usan
+#    (ver core/carga_perezosa), y se comparten en toda la aplicación.
+#    Según PROVEEDOR_LLM son Gemini, un servidor local o el modelo simulado
+#    (ver proveedores_llm); los nombres de los cargadores se mantienen.
+cargador_gemini_pro = CargadorPerezoso(
+    f"Modelo de lenguaje principal ({configuracion.PROVEEDOR_LLM})",
+    lambda: proveedores_llm.crear_modelo_de_lenguaje("gemini-1.5-pro-latest"),
+)
+cargador_gemini_flash = CargadorPerezoso(
+    f"Modelo de lenguaje rápido ({configuracion.PROVEEDOR_LLM})",
+    lambda: proveedores_llm.crear_modelo_de_lenguaje("gemini-1.5-flash-latest"),
+)
+
+
+# 3. La base de conocimiento local para búsquedas (RAG) también se carga al primer uso.
+#    Los embeddings y el índice FAISS se guardan junto al corpus: solo se
+#    recodifican los documentos nuevos o modificados (ver indice_conocimiento).
+def _cargar_sistema_rag():
+    from sentence_transformers import SentenceTransformer
+    modelo_sentencias = SentenceTransformer(indice_conocimiento.NOMBRE_MODELO_EMBEDDINGS)
+    documentos_legales, indice_faiss = indice_conocimiento.cargar_o_construir_indice(modelo_sentencias)
+    return modelo_sentencias, documentos_legales, indice_faiss
+
+cargador_rag = CargadorPerezoso("Sistema RAG (SentenceTransformer + FAISS)", _cargar_sistema_rag)
+
+# =================================================================================
+# SECCIÓN 2: CONTROL DE LA CUOTA DE GEMINI (CUBETA DE FICHAS)
+# =================================================================================
+
+class LimitadorDeTasa:
+    """
+    Limitador de tipo "cubeta de fichas" con dos cubetas: una de solicitudes por
+    minuto (RPM) y otra de tokens por minuto (TPM). Las cubetas se rellenan de
+    forma continua; una llamada solo espera si de verdad no queda presupuesto.
+
+    Por defecto el estado vive en memoria y se comparte entre todos los hilos
+    del proceso. Si se indica 'ruta_estado', vive en un archivo SQLite y se
+    comparte también entre procesos (varios trabajadores, varias APIs).
+    """
+
+    def __init__(self, solicitudes_por_minuto: int, tokens_por_minuto: int, ruta_estado: str = ""):
+        self.capacidad_solicitudes = float(solicitudes_por_minuto)
+        self.capacidad_tokens = float(tokens_por_minuto)
+        self.ruta_estado = ruta_estado
+        self._candado = threading.Lock()
+        self._estado = {
+            "fichas_solicitudes": self.capacidad_solicitudes,
+            "fichas_tokens": self.capacidad_tokens,
+            "marca_tiempo": time.time(),
+        }
+        if self.ruta_estado:
+            with sqlite3.connect(self.ruta_estado, timeout=30) as conexion:
+                conexion.execute(
+                    "CREATE TABLE IF NOT EXISTS limitador "
+                    "(id INTEGER PRIMARY KEY, fichas_solicitudes REAL, fichas_tokens REAL, marca_tiempo REAL)"
+                )
+                conexion.execute(
+                    "INSERT OR IGNORE INTO limitador VALUES (1, ?, ?, ?)",
+                    (self.capacidad_solicitudes, self.capacidad_tokens, time.time()),
+                )
+
+    def _intentar_consumir(self, estado: dict, tokens: float) -> float:
+        """
+        Rellena las cubetas según el tiempo transcurrido e intenta consumir una
+        solicitud y 'tokens' tokens. Modifica 'estado' y devuelve 0 si lo logró,
+        o los segundos que habría que esperar si no hay presupuesto suficiente.
+        """
+        ahora = time.time()
+        transcurrido = max(0.0, ahora - estado["marca_tiempo"])
+        recarga_solicitudes = self.capacidad_solicitudes / 60
+        recarga_tokens = self.capacidad_tokens / 60
+
+        estado["fichas_solicitudes"] = min(self.capacidad_solicitudes, estado["fichas_solicitudes"] + transcurrido * recarga_solicitudes)
+        estado["fichas_tokens"] = min(self.capacidad_tokens, estado["fichas_tokens"] + transcurrido * recarga_tokens)
+        estado["marca_tiempo"] = ahora
+
+        if estado["fichas_solicitudes"] >= 1 and estado["fichas_tokens"] >= tokens:
+            estado["fichas_solicitudes"] -= 1
+            estado["fichas_tokens"] -= tokens
+            return 0.0
+
+        espera_solicitudes = max(0.0, 1 - estado["fichas_solicitudes"]) / recarga_solicitudes
+        espera_tokens = max(0.0, tokens - estado["fichas_tokens"]) / recarga_tokens
+        return max(espera_solicitudes, espera_tokens)
+
+    def _consumir_en_memoria(self, tokens: float) -> float:
+        with self._candado:
+            return self._intentar_consumir(self._estado, tokens)
+
+    def _consumir_en_archivo(self, tokens: float) -> float:
+        conexion = sqlite3.connect(self.ruta_estado, timeout=30, isolation_level=None)
+        try:
+            # BEGIN IMMEDIATE bloquea el archivo: solo un proceso a la vez lee y actualiza las cubetas.
+            conexion.execute("BEGIN IMMEDIATE")
+            fila = conexion.execute(
+                "SELECT fichas_solicitudes, fichas_tokens, marca_tiempo FROM limitador WHERE id = 1"
+            ).fetchone()
+            estado = {"fichas_solicitudes": fila[0], "fichas_tokens": fila[1], "marca_tiempo": fila[2]}
+            espera = self._intentar_consumir(estado, tokens)
+            conexion.execute(
+                "UPDATE limitador SET fichas_solicitudes = ?, fichas_tokens = ?, marca_tiempo = ? WHERE id = 1",
+                (estado["fichas_solicitudes"], estado["fichas_tokens"], estado["marca_tiempo"]),
+            )
+            conexion.execute("COMMIT")
+            return espera
+        finally:
+            conexion.close()
+
+    def adquirir(self, tokens_estimados: int = 0) -> float:
+        """
+        Bloquea hasta que haya presupuesto para una solicitud de 'tokens_estimados'.
+
+        Returns:
+            float: Los segundos que se esperó en total (0 si no hubo que esperar).
+        """
+        # Una solicitud más grande que toda la cubeta nunca cabría: la limitamos a la capacidad.
+        tokens = min(float(tokens_estimados), self.capacidad_tokens)
+        esperado = 0.0
+        while True:
+            if self.ruta_estado:
+                espera = self._consumir_en_archivo(tokens)
+            else:
+                espera = self._consumir_en_memoria(tokens)
+            if espera <= 0:
+                return esperado
+            time.sleep(espera)
+            esperado += espera
+
+
+limitador_gemini = LimitadorDeTasa(
+    solicitudes_por_minuto=configuracion.GEMINI_SOLICITUDES_POR_MINUTO,
+    tokens_por_minuto=configuracion.GEMINI_TOKENS_POR_MINUTO,
+    ruta_estado=configuracion.RUTA_ESTADO_LIMITADOR_GEMINI,
+)
+
+# Marcador con el que Gemini separa las descripciones cuando recibe un lote de imágenes.
+MARCADOR_IMAGEN_LOTE = "### IMAGEN"
+
+# Las descripciones de imágenes que fallaron se devuelven como un aviso entre
+# corchetes que empieza así, en lugar de lanzar la excepción.
+PREFIJO_DESCRIPCION_FALLIDA = "[Error"
+
+# Gemini cobra una cantidad fija de tokens por imagen, independiente de su tamaño.
+TOKENS_POR_IMAGEN = 258
+
+
+def _estimar_tokens(entrada) -> int:
+    """
+    Estimación barata de los tokens de entrada (aprox. 4 caracteres por token),
+    suficiente para repartir el presupuesto TPM sin llamar al tokenizador.
+    """
+    if isinstance(entrada, str):
+        return len(entrada) // 4 + 1
+
+    tokens = 0
+    for mensaje in entrada:
+        contenido = getattr(mensaje, "content", mensaje)
+        if isinstance(contenido, str):
+            tokens += len(contenido) // 4 + 1
+            continue
+        for parte in contenido:
+            if parte.get("type") == "image_url":
+                tokens += TOKENS_POR_IMAGEN
+            else:
+                tokens += len(parte.get("text", "")) // 4 + 1
+    return tokens
+
+
+def _codigo_http(error: BaseException) -> Optional[int]:
+    """Código HTTP de un error de cliente, si lo trae (google.api_core / google.genai, urllib, httpx...)."""
+    for atributo in ("code", "status_code"):
+        valor = getattr(error, atributo, None)
+        if isinstance(valor, int):
+            return int(valor)
+    respuesta = getattr(error, "response", None)
+    valor = getattr(respuesta, "status_code", None)
+    return int(valor) if isinstance(valor, int) else None
+
+
+def _es_error_de_cuota(error: Exception) -> bool:
+    """
+    Indica si un error del modelo es un 429 / 'ResourceExhausted' (cuota agotada).
+    Se mira el tipo y el código HTTP del error y de sus causas (LangChain envuelve
+    el error original), nunca el texto: un '429' en el mensaje no basta.
+    """
+    actual, vistos = error, set()
+    while actual is not None and id(actual) not in vistos:
+        vistos.add(id(actual))
+        if type(actual).__name__ in ("ResourceExhausted", "TooManyRequests") or _codigo_http(actual) == 429:
+            return True
+        actual = actual.__cause__ or actual.__context__
+    return False
+
+
+def _embedding_de_prompt(prompt_normalizado: str) -> Optional[np.ndarray]:
+    """
+    Embedding de un prompt completo para la caché semántica: el modelo de
+    sentencias solo ve unos cientos de tokens, así que promediamos los embeddings
+    de trozos de 1000 caracteres. None si la búsqueda por similitud está apagada.
+    """
+    if configuracion.CACHE_LLM_SIMILITUD_MINIMA <= 0:
+        return None
+    sistema_rag = cargador_rag.obtener()
+    if not sistema_rag:
+        return None
+    trozos = [prompt_normalizado[i:i + 1000] for i in range(0, len(prompt_normalizado), 1000)] or [""]
+    embedding = sistema_rag[0].encode(trozos).mean(axis=0)
+    return (embedding / (np.linalg.norm(embedding) or 1.0)).astype("float32")
+
+
+def invocar_gemini(modelo, entrada, usar_cache: bool = False, es_respuesta_valida: Optional[Callable[[str], bool]] = None):
+    """
+    Punto único por el que pasan TODAS las llamadas al modelo de lenguaje
+    (Gemini, servidor local o simulado, según PROVEEDOR_LLM).
+
+    0. Con 'usar_cache' (solo prompts de texto), busca antes la respuesta en la
+       caché de respuestas (ver cache_de_resultados) y guarda allí la nueva, si
+       'es_respuesta_valida' la acepta (una respuesta mal formada no se guarda,
+       para que el siguiente intento vuelva a preguntar al modelo).
+    1. Con Gemini, reserva presupuesto en el limitador compartido (espera solo si hace falta).
+    2. Si Gemini responde 429, reintenta con espera exponencial (con un poco de azar).
+       Cualquier otro error se propaga de inmediato, sin reintentos.
+    """
+    if not (usar_cache and configuracion.CACHE_LLM_ACTIVADA and isinstance(entrada, str)):
+        return _invocar_con_reintentos(modelo, entrada)
+
+    from .. import cache_de_resultados
+    nombre_modelo = getattr(modelo, "model", type(modelo).__name__)
+    prompt_normalizado = cache_de_resultados.normalizar_prompt(entrada)
+    embedding = None
     try:
-        modelo_gemini_pro = ChatGoogleGenerativeAI(model="gemini-1.5-pro-latest", google_api_key=api_key)
-        modelo_gemini_flash = ChatGoogleGenerativeAI(model="gemini-1.5-flash-latest", google_api_key=api_key)
-        print("TOOL-SETUP: Modelos Gemini (Pro y Flash) inicializados vía LangChain.")
+        respuesta_guardada = cache_de_resultados.obtener_respuesta_llm_en_cache(nombre_modelo, prompt_normalizado)
+        if respuesta_guardada is None:
+            # El embedding solo hace falta si no hay respuesta exacta (y para guardar la nueva).
+            embedding = _embedding_de_prompt(prompt_normalizado)
+            if embedding is not None:
+                respuesta_guardada = cache_de_resultados.buscar_respuesta_llm_similar(nombre_modelo, prompt_normalizado, embedding)
+        observabilidad.consultas_cache_llm.labels("acierto" if respuesta_guardada is not None else "fallo").inc()
+        if respuesta_guardada is not None:
+            print("      TOOL-SYSTEM: -> Caché LLM: respuesta reutilizada, sin llamar al modelo.")
+            return AIMessage(content=respuesta_guardada)
     except Exception as e:
-        print(f"TOOL-SETUP-ERROR: No se pudieron inicializar los modelos de Gemini. Error: {e}")
+        print(f"      TOOL-SYSTEM-ERROR: No se pudo consultar la caché LLM ({e}). Se llama al modelo.")
 
-# 3. Cargar y preparar la base de conocimiento local para búsquedas (RAG).
-try:
-    with open("backend/datos/base_de_conocimiento_juridico/leyes_basicas.txt", "r", encoding="utf-8") as f:
-        documentos_legales = f.read().split('---')
-    print("TOOL-SETUP: Base de conocimiento cargada correctamente.")
-    
-    print("TOOL-SETUP: Cargando modelo de SentenceTransformer para RAG...")
-    modelo_sentencias = SentenceTransformer('all-MiniLM-L6-v2')
-    
-    print("TOOL-SETUP: Creando índice vectorial FAISS para búsqueda rápida...")
-    embeddings_documentos = modelo_sentencias.encode(documentos_legales)
-    indice_faiss = faiss.IndexFlatL2(embeddings_documentos.shape[1])
-    indice_faiss.add(embeddings_documentos)
-    print("TOOL-SETUP: ¡Índice FAISS para RAG listo y cargado en memoria!")
+    respuesta = _invocar_con_reintentos(modelo, entrada)
+    if es_respuesta_valida and not es_respuesta_valida(respuesta.content):
+        return respuesta
+    try:
+        cache_de_resultados.guardar_respuesta_llm_en_cache(nombre_modelo, prompt_normalizado, respuesta.content, embedding)
+    except Exception as e:
+        print(f"      TOOL-SYSTEM-ERROR: No se pudo guardar la respuesta en la caché LLM: {e}")
+    return respuesta
+
+
+def _contiene_json_etiquetado(texto: str) -> bool:
+    """Respuesta válida para los prompts que piden el resultado entre <json> y </json>."""
+    return '<json>' in texto and '</json>' in texto
 
-except Exception as e:
-    print(f"TOOL-SETUP-ERROR: Fallo al inicializar el sistema RAG. Error: {e}")
-    documentos_legales = []
-    indice_faiss = None
+
+def _tokens_de_respuesta(respuesta, tokens_estimados: int) -> tuple[int, int]:
+    """
+    (tokens de entrada, tokens de salida) de una respuesta: los que informa el
+    proveedor en 'usage_metadata' o, si no los da, la estimación de 4 caracteres por token.
+    """
+    uso = getattr(respuesta, "usage_metadata", None) or {}
+    tokens_entrada = uso.get("input_tokens") or tokens_estimados
+    tokens_salida = uso.get("output_tokens") or len(str(respuesta.content)) // 4
+    return tokens_entrada, tokens_salida
+
+
+def _invocar_con_reintentos(modelo, entrada):
+    """Llama al modelo dentro de un tramo 'llm.llamada' y registra su duración y sus tokens."""
+    nombre_modelo = getattr(modelo, "model", type(modelo).__name__)
+    tokens_estimados = _estimar_tokens(entrada)
+    with observabilidad.tramo(
+        "llm.llamada", proveedor=configuracion.PROVEEDOR_LLM, modelo=nombre_modelo, tokens_estimados=tokens_estimados
+    ) as tramo_llm:
+        respuesta = _invocar_respetando_cuota(modelo, entrada, tokens_estimados, tramo_llm)
+        tokens_entrada, tokens_salida = _tokens_de_respuesta(respuesta, tokens_estimados)
+        tramo_llm.fijar(tokens_entrada=tokens_entrada, tokens_salida=tokens_salida)
+
+    observabilidad.segundos_por_llamada_llm.labels(nombre_modelo).observe(tramo_llm.segundos)
+    for tipo, tokens in (("entrada", tokens_entrada), ("salida", tokens_salida)):
+        observabilidad.tokens_llm.labels(nombre_modelo, tipo).inc(tokens)
+        observabilidad.tokens_por_llamada_llm.labels(nombre_modelo, tipo).observe(tokens)
+    return respuesta
+
+
+def _invocar_respetando_cuota(modelo, entrada, tokens_estimados: int, tramo_llm):
+    # La cuota y los 429 solo existen con la API de Gemini: el servidor local y
+    # el modelo simulado se llaman directamente.
+    if configuracion.PROVEEDOR_LLM != "gemini":
+        return modelo.invoke(entrada)
+    segundos_esperando_cuota = 0.0
+    for intento in range(configuracion.GEMINI_MAXIMOS_REINTENTOS_429 + 1):
+        esperado = limitador_gemini.adquirir(tokens_estimados)
+        if esperado:
+            segundos_esperando_cuota += esperado
+            print(f"      TOOL-SYSTEM: -> Limitador de Gemini: se esperaron {esperado:.1f} s por cuota.")
+        tramo_llm.fijar(reintentos_429=intento, segundos_esperando_cuota=round(segundos_esperando_cuota, 3))
+        try:
+            return modelo.invoke(entrada)
+        except Exception as e:
+            if not _es_error_de_cuota(e) or intento == configuracion.GEMINI_MAXIMOS_REINTENTOS_429:
+                raise
+            pausa = configuracion.GEMINI_SEGUNDOS_BASE_REINTENTO * (2 ** intento) + random.uniform(0, 1)
+            print(f"      TOOL-SYSTEM: -> Gemini respondió 429 (cuota agotada). Reintento {intento + 1} en {pausa:.1f} s...")
+            time.sleep(pausa)
+            segundos_esperando_cuota += pausa
 
 # =================================================================================
-# SECCIÓN 2: HERRAMIENTAS DE LENGUAJE (LLAMADAS A LA IA)
+# SECCIÓN 3: HERRAMIENTAS DE LENGUAJE (LLAMADAS A LA IA)
 # =================================================================================
 
-def extraer_entidades_con_llm(texto: str) -> list[dict]:
+# Separadores preferidos para cortar un fragmento, del más al menos natural.
+SEPARADORES_FRAGMENTO = ("\n\n", "\n", ". ", " ")
+
+
+def fragmentar_texto(texto: str, tokens_por_fragmento: int, tokens_solapamiento: int = 0) -> list[str]:
     """
-    Analiza un texto para extraer entidades clave usando el modelo Gemini-Flash.
-    Utiliza un prompt robusto y una lógica de parseo para asegurar una salida JSON limpia.
+    Parte un texto en fragmentos de como mucho 'tokens_por_fragmento' tokens
+    (con la misma estimación de 4 caracteres por token que usa el limitador).
+    Cada corte se hace en el separador más natural de la segunda mitad del
+    fragmento (párrafo, línea, frase o palabra), y cada fragmento repite los
+    últimos 'tokens_solapamiento' tokens del anterior.
     """
-    if not modelo_gemini_flash:
-        return [{"entidad": "Error: Modelo Gemini no inicializado.", "tipo": "Error"}]
+    caracteres_por_fragmento = max(1, tokens_por_fragmento * 4)
+    caracteres_solapamiento = min(max(0, tokens_solapamiento * 4), caracteres_por_fragmento // 2)
+    if len(texto) <= caracteres_por_fragmento:
+        return [texto]
+
+    fragmentos = []
+    inicio = 0
+    while inicio < len(texto):
+        fin = min(inicio + caracteres_por_fragmento, len(texto))
+        if fin < len(texto):
+            for separador in SEPARADORES_FRAGMENTO:
+                corte = texto.rfind(separador, inicio + caracteres_por_fragmento // 2, fin)
+                if corte != -1:
+                    fin = corte + len(separador)
+                    break
+        fragmentos.append(texto[inicio:fin].strip())
+        if fin >= len(texto):
+            break
+        # El siguiente fragmento empieza un poco antes (solapamiento), en un límite de palabra.
+        siguiente = fin - caracteres_solapamiento
+        if caracteres_solapamiento:
+            espacio = texto.find(" ", siguiente, fin)
+            siguiente = espacio + 1 if espacio != -1 else siguiente
+        inicio = max(siguiente, inicio + 1)
+    return [fragmento for fragmento in fragmentos if fragmento]
+
+
+def _clave_entidad(entidad: dict) -> tuple[str, str]:
+    """Clave para detectar duplicados: sin tildes, mayúsculas ni espacios o puntuación sobrantes."""
+    def normalizar(valor) -> str:
+        texto = unicodedata.normalize("NFKD", str(valor or ""))
+        texto = "".join(c for c in texto if not unicodedata.combining(c)).casefold()
+        return " ".join(texto.replace(".", " ").replace(",", " ").split())
+    return normalizar(entidad.get("entidad")), normalizar(entidad.get("tipo"))
+
+
+def fusionar_entidades(listas_de_entidades: list[list[dict]]) -> list[dict]:
+    """
+    Une las entidades de varios fragmentos, en orden de aparición, quitando las
+    repetidas (el solapamiento entre fragmentos y los textos largos repiten
+    nombres, fechas y cuantías).
+    """
+    entidades_unicas: dict[tuple[str, str], dict] = {}
+    for entidades in listas_de_entidades:
+        for entidad in entidades:
+            if not isinstance(entidad, dict) or not entidad.get("entidad"):
+                continue
+            entidades_unicas.setdefault(_clave_entidad(entidad), entidad)
+    return list(entidades_unicas.values())
+
 
+def _extraer_entidades_de_fragmento(modelo_gemini_flash, texto: str) -> list[dict]:
+    """Una llamada a Gemini-Flash para un fragmento. Lanza una excepción si la respuesta no es válida."""
     prompt = f"""
     Eres un asistente legal experto en análisis de documentos en Colombia.
     Tu tarea es leer el siguiente texto y extraer las entidades más relevantes.
@@ -87,43 +432,123 @@ def extraer_entidades_con_llm(texto: str) -> list[dict]:
     ---
     """
     
-    try:
-        print("      TOOL-SYSTEM: -> Llamando a Gemini-Flash para extraer entidades...")
-        respuesta = modelo_gemini_flash.invoke(prompt)
-        respuesta_texto = respuesta.content
-        
-        print("      TOOL-SYSTEM: -> Respuesta recibida. Limpiando y parseando JSON...")
-        inicio = respuesta_texto.find('<json>') + len('<json>')
-        fin = respuesta_texto.rfind('</json>')
-        
-        if inicio == -1 or fin == -1 or fin < inicio:
-            raise json.JSONDecodeError("No se encontraron las etiquetas <json> en la respuesta.", respuesta_texto, 0)
+    respuesta = invocar_gemini(modelo_gemini_flash, prompt, usar_cache=True, es_respuesta_valida=_contiene_json_etiquetado)
+    respuesta_texto = respuesta.content
+    
+    inicio = respuesta_texto.find('<json>')
+    fin = respuesta_texto.rfind('</json>')
+    
+    if inicio == -1 or fin == -1 or fin < inicio:
+        raise json.JSONDecodeError("No se encontraron las etiquetas <json> en la respuesta.", respuesta_texto, 0)
 
-        json_limpio = respuesta_texto[inicio:fin].strip()
-        entidades = json.loads(json_limpio)
-        return entidades
+    json_limpio = respuesta_texto[inicio + len('<json>'):fin].strip()
+    return json.loads(json_limpio)
 
-    except Exception as e:
-        print(f"      TOOL-SYSTEM-ERROR: Al extraer entidades: {e}")
+
+def extraer_entidades_con_llm(texto: str, fragmentos_en_paralelo: Optional[int] = None) -> list[dict]:
+    """
+    Analiza un texto para extraer entidades clave usando el modelo Gemini-Flash.
+    Utiliza un prompt robusto y una lógica de parseo para asegurar una salida JSON limpia.
+
+    Los textos largos se procesan como map-reduce: se parten en fragmentos
+    solapados (ver fragmentar_texto), se extraen las entidades de hasta
+    'fragmentos_en_paralelo' fragmentos a la vez y se fusionan sin duplicados.
+    Si falla algún fragmento se devuelven las entidades de los demás.
+    """
+    modelo_gemini_flash = cargador_gemini_flash.obtener()
+    if not modelo_gemini_flash:
+        return [{"entidad": "Error: Modelo Gemini no inicializado.", "tipo": "Error"}]
+
+    fragmentos = fragmentar_texto(
+        texto, configuracion.ENTIDADES_TOKENS_POR_FRAGMENTO, configuracion.ENTIDADES_TOKENS_SOLAPAMIENTO
+    )
+    fragmentos_en_paralelo = max(1, fragmentos_en_paralelo or configuracion.ENTIDADES_FRAGMENTOS_EN_PARALELO)
+    entidades_por_fragmento: list[list[dict]] = [[] for _ in fragmentos]
+    fragmentos_fallidos = 0
+
+    print(f"      TOOL-SYSTEM: -> Llamando a Gemini-Flash para extraer entidades ({len(fragmentos)} fragmento(s), {fragmentos_en_paralelo} en paralelo)...")
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=min(fragmentos_en_paralelo, len(fragmentos))) as ejecutor:
+        futuros = {
+            ejecutor.submit(contextvars.copy_context().run, _extraer_entidades_de_fragmento, modelo_gemini_flash, fragmento): indice
+            for indice, fragmento in enumerate(fragmentos)
+        }
+        for numero_terminado, futuro in enumerate(as_completed(futuros), start=1):
+            indice = futuros[futuro]
+            try:
+                entidades_por_fragmento[indice] = futuro.result()
+            except Exception as e:
+                fragmentos_fallidos += 1
+                print(f"      TOOL-SYSTEM-ERROR: Al extraer entidades del fragmento {indice + 1}: {e}")
+            if len(fragmentos) > 1:
+                publicar_evento(
+                    "progreso", etapa="entidades_fragmento", actual=numero_terminado, total=len(fragmentos),
+                    duracion_segundos=round(time.perf_counter() - inicio, 3),
+                )
+
+    if fragmentos_fallidos == len(fragmentos):
         return [{"entidad": "Error en el procesamiento de IA", "tipo": "Error"}]
 
+    entidades = fusionar_entidades(entidades_por_fragmento)
+    print(f"      TOOL-SYSTEM: -> {len(entidades)} entidad(es) únicas tras fusionar {len(fragmentos)} fragmento(s).")
+    return entidades
+
 
 def buscar_en_base_de_conocimiento(consulta: str, top_k: int = 2) -> list[str]:
     """
     Busca los documentos más relevantes para una consulta en nuestra base de conocimiento local.
+    La consulta se normaliza igual que los documentos, así la búsqueda es por similitud coseno.
     """
-    if not indice_faiss:
+    sistema_rag = cargador_rag.obtener()
+    if not sistema_rag:
         return ["Error: El sistema de búsqueda RAG no está inicializado."]
+    modelo_sentencias, documentos_legales, indice_faiss = sistema_rag
         
-    embedding_consulta = modelo_sentencias.encode([consulta])
-    _, indices = indice_faiss.search(embedding_consulta, top_k)
-    return [documentos_legales[i] for i in indices[0]]
+    with observabilidad.tramo("rag.busqueda", top_k=top_k, caracteres_consulta=len(consulta)) as tramo_rag:
+        embedding_consulta = indice_conocimiento.normalizar(modelo_sentencias.encode([consulta]))
+        _, indices = indice_faiss.search(embedding_consulta, top_k)
+    observabilidad.segundos_por_herramienta.labels("rag_busqueda").observe(tramo_rag.segundos)
+    # Los índices aproximados devuelven -1 si encuentran menos de top_k vecinos.
+    return [documentos_legales[i] for i in indices[0] if i >= 0]
+
+
+def buscar_con_texto_original(texto: str, top_k: Optional[int] = None) -> list[str]:
+    """
+    Busca en la base de conocimiento directamente con el texto de la evidencia,
+    sin esperar a las entidades: el texto se parte en trozos (repartidos por todo
+    el documento), se codifican todos de una vez y se buscan en una sola consulta
+    a FAISS. Cada documento puntúa con su mejor similitud con algún trozo.
+    """
+    sistema_rag = cargador_rag.obtener()
+    if not sistema_rag:
+        return ["Error: El sistema de búsqueda RAG no está inicializado."]
+    modelo_sentencias, documentos_legales, indice_faiss = sistema_rag
+    top_k = top_k or configuracion.RAG_RESULTADOS_TEXTO_ORIGINAL
+
+    fragmentos = fragmentar_texto(texto, configuracion.RAG_TOKENS_POR_FRAGMENTO_TEXTO)
+    maximo = max(1, configuracion.RAG_FRAGMENTOS_TEXTO_ORIGINAL)
+    if len(fragmentos) > maximo:
+        fragmentos = [fragmentos[i * len(fragmentos) // maximo] for i in range(maximo)]
+
+    with observabilidad.tramo("rag.busqueda_texto_original", top_k=top_k, fragmentos=len(fragmentos)) as tramo_rag:
+        embeddings = indice_conocimiento.normalizar(modelo_sentencias.encode(fragmentos))
+        similitudes, indices = indice_faiss.search(embeddings, top_k)
+    observabilidad.segundos_por_herramienta.labels("rag_busqueda_texto_original").observe(tramo_rag.segundos)
+
+    mejor_similitud: dict[int, float] = {}
+    for fila_similitudes, fila_indices in zip(similitudes, indices):
+        for similitud, indice in zip(fila_similitudes, fila_indices):
+            if indice >= 0:
+                mejor_similitud[int(indice)] = max(mejor_similitud.get(int(indice), -1.0), float(similitud))
+    mejores = sorted(mejor_similitud, key=mejor_similitud.get, reverse=True)[:top_k]
+    return [documentos_legales[i] for i in mejores]
 
 
 def generar_sintesis_con_llm(contexto: str) -> str:
     """
     Toma un contexto completo y genera una síntesis o recomendación estratégica.
     """
+    modelo_gemini_flash = cargador_gemini_flash.obtener()
     if not modelo_gemini_flash:
         return "Error: Modelo Gemini no inicializado."
 
@@ -145,7 +570,7 @@ def generar_sintesis_con_llm(contexto: str) -> str:
     """
     try:
         print("      TOOL-SYSTEM: -> Llamando a Gemini-Flash para generar la síntesis...")
-        respuesta = modelo_gemini_flash.invoke(prompt)
+        respuesta = invocar_gemini(modelo_gemini_flash, prompt, usar_cache=True)
         return respuesta.content
     except Exception as e:
         print(f"      TOOL-SYSTEM-ERROR: Al generar la síntesis: {e}")
@@ -156,6 +581,7 @@ def verificar_calidad_con_llm(borrador: str, contexto_original: str) -> dict:
     """
     Revisa un borrador estratégico para verificar su coherencia y fundamentación.
     """
+    modelo_gemini_flash = cargador_gemini_flash.obtener()
     if not modelo_gemini_flash:
         return {"verificado": False, "observaciones": "Error: Modelo Gemini no inicializado."}
 
@@ -181,7 +607,7 @@ def verificar_calidad_con_llm(borrador: str, contexto_original: str) -> dict:
     """
     try:
         print("      TOOL-SYSTEM: -> Llamando a Gemini-Flash para la verificación de calidad...")
-        respuesta = modelo_gemini_flash.invoke(prompt)
+        respuesta = invocar_gemini(modelo_gemini_flash, prompt, usar_cache=True, es_respuesta_valida=_contiene_json_etiquetado)
         respuesta_texto = respuesta.content
 
         inicio = respuesta_texto.find('<json>') + len('<json>')
@@ -198,40 +624,103 @@ def verificar_calidad_con_llm(borrador: str, contexto_original: str) -> dict:
         return {"verificado": False, "observaciones": f"Error técnico durante la verificación."}
 
 
-def describir_imagenes_con_gemini(rutas_imagenes: list[str], prompt_texto: str) -> list[str]:
-    """
-    Analiza una lista de imágenes usando Gemini-Flash, con pausas para respetar los límites de la API.
-    """
-    descripciones = []
-    if not modelo_gemini_flash:
-        return ["Error: Modelo Gemini no inicializado." for _ in rutas_imagenes]
+def _imagen_a_base64(ruta_imagen: str) -> str:
+    """Lee una imagen del disco y la devuelve codificada como JPEG en base64."""
+    imagen = Image.open(ruta_imagen)
+    buffered = io.BytesIO()
+    imagen.convert("RGB").save(buffered, format="JPEG")
+    return base64.b64encode(buffered.getvalue()).decode('utf-8')
 
-    for i, ruta_imagen in enumerate(rutas_imagenes):
-        print(f"      TOOL-SYSTEM: -> Analizando imagen {i+1}/{len(rutas_imagenes)}...")
-        try:
-            imagen = Image.open(ruta_imagen)
-            buffered = io.BytesIO()
-            imagen.save(buffered, format="JPEG")
-            img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
 
+def es_descripcion_fallida(descripcion: str) -> bool:
+    """Indica si una descripción de 'describir_imagenes_con_gemini' es en realidad un aviso de error."""
+    return descripcion.startswith(PREFIJO_DESCRIPCION_FALLIDA)
+
+
+def _describir_lote_de_imagenes(rutas_lote: list[str], prompt_texto: str) -> list[str]:
+    """
+    Describe un lote de imágenes. Con una sola imagen hace una llamada normal;
+    con varias, las envía todas en UN mensaje multimodal y le pide a Gemini una
+    sección por imagen. Si la respuesta no trae tantas secciones como imágenes,
+    se describen una por una para no perder la correspondencia.
+    """
+    modelo_gemini_flash = cargador_gemini_flash.obtener()
+    try:
+        if len(rutas_lote) == 1:
             mensaje = HumanMessage(
                 content=[
                     {"type": "text", "text": prompt_texto},
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_base64}"}},
+                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{_imagen_a_base64(rutas_lote[0])}"}},
                 ]
             )
-            
-            respuesta = modelo_gemini_flash.invoke([mensaje])
-            descripciones.append(respuesta.content)
+            respuesta = invocar_gemini(modelo_gemini_flash, [mensaje])
+            return [respuesta.content]
+
+        instrucciones_lote = (
+            f"{prompt_texto}\n\nRecibirás {len(rutas_lote)} imágenes, en orden. Describe cada una por separado "
+            f"y empieza cada descripción con una línea que diga exactamente '{MARCADOR_IMAGEN_LOTE} N' "
+            f"(N = 1, 2, ... {len(rutas_lote)})."
+        )
+        contenido = [{"type": "text", "text": instrucciones_lote}]
+        for ruta_imagen in rutas_lote:
+            contenido.append({"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{_imagen_a_base64(ruta_imagen)}"}})
+
+        respuesta = invocar_gemini(modelo_gemini_flash, [HumanMessage(content=contenido)])
+        secciones = [seccion.split("\n", 1)[-1].strip() for seccion in respuesta.content.split(MARCADOR_IMAGEN_LOTE)[1:]]
+        if len(secciones) == len(rutas_lote):
+            return secciones
+
+        print(f"      TOOL-SYSTEM-WARN: La respuesta del lote trajo {len(secciones)} secciones para {len(rutas_lote)} imágenes. Describiendo una por una...")
+        return [descripcion for ruta in rutas_lote for descripcion in _describir_lote_de_imagenes([ruta], prompt_texto)]
 
-        except Exception as e:
-            error_msg = f"Error al procesar la imagen {ruta_imagen}: {e}"
-            print(f"      TOOL-SYSTEM-ERROR: {error_msg}")
-            descripciones.append(f"[{error_msg}]")
-        
-        if i < len(rutas_imagenes) - 1:
-            pausa = 20
-            print(f"      TOOL-SYSTEM: -> Pausa de {pausa} segundos para respetar el límite de la API...")
-            time.sleep(pausa)
-            
-    return descripciones
\ No newline at end of file
+    except Exception as e:
+        error_msg = f"Error al procesar la(s) imagen(es) {', '.join(rutas_lote)}: {e}"
+        print(f"      TOOL-SYSTEM-ERROR: {error_msg}")
+        return [f"[{error_msg}]" for _ in rutas_lote]
+
+
+def describir_imagenes_con_gemini(
+    rutas_imagenes: list[str],
+    prompt_texto: str,
+    fotogramas_en_paralelo: Optional[int] = None,
+    fotogramas_por_lote: Optional[int] = None,
+) -> list[str]:
+    """
+    Analiza una lista de imágenes usando Gemini-Flash.
+
+    Las imágenes se agrupan en lotes de 'fotogramas_por_lote' (un mensaje
+    multimodal por lote) y hasta 'fotogramas_en_paralelo' lotes se envían a la
+    vez desde un grupo de hilos. El ritmo real lo marca el limitador compartido,
+    así que no hay pausas fijas entre imágenes. Las descripciones se devuelven
+    en el mismo orden que 'rutas_imagenes'; las que fallaron empiezan con
+    PREFIJO_DESCRIPCION_FALLIDA (ver 'es_descripcion_fallida').
+    """
+    modelo_gemini_flash = cargador_gemini_flash.obtener()
+    if not modelo_gemini_flash:
+        return ["[Error: Modelo Gemini no inicializado.]" for _ in rutas_imagenes]
+
+    fotogramas_en_paralelo = max(1, fotogramas_en_paralelo or configuracion.FOTOGRAMAS_EN_PARALELO)
+    fotogramas_por_lote = max(1, fotogramas_por_lote or configuracion.FOTOGRAMAS_POR_LOTE)
+    lotes = [rutas_imagenes[i:i + fotogramas_por_lote] for i in range(0, len(rutas_imagenes), fotogramas_por_lote)]
+    descripciones_por_lote: list[list[str]] = [[] for _ in lotes]
+
+    print(f"      TOOL-SYSTEM: -> Analizando {len(rutas_imagenes)} imagen(es) en {len(lotes)} lote(s), {fotogramas_en_paralelo} en paralelo...")
+    inicio = time.perf_counter()
+    imagenes_terminadas = 0
+    with ThreadPoolExecutor(max_workers=fotogramas_en_paralelo) as ejecutor:
+        futuros = {
+            ejecutor.submit(contextvars.copy_context().run, _describir_lote_de_imagenes, lote, prompt_texto): indice
+            for indice, lote in enumerate(lotes)
+        }
+        # Publicamos el progreso desde este hilo (el que conoce la evidencia actual).
+        for futuro in as_completed(futuros):
+            indice = futuros[futuro]
+            descripciones_por_lote[indice] = futuro.result()
+            imagenes_terminadas += len(lotes[indice])
+            print(f"      TOOL-SYSTEM: -> Imágenes analizadas: {imagenes_terminadas}/{len(rutas_imagenes)}")
+            publicar_evento(
+                "progreso", etapa="video_fotograma", actual=imagenes_terminadas, total=len(rutas_imagenes),
+                duracion_segundos=round(time.perf_counter() - inicio, 3),
+            )
+
+    return [descripcion for descripciones in descripciones_por_lote for descripcion in descripciones]
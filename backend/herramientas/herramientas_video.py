@@ -1,16 +1,36 @@
 # backend/herramientas/herramientas_video.py
 
+import contextvars
 import cv2
+import hashlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import traceback
 
 # Importamos las herramientas de lenguaje para poder llamar a la IA
-from . import herramientas_lenguaje
+from . import herramientas_audio, herramientas_lenguaje
+from ..transcripciones import ENCABEZADO_TRANSCRIPCION_EN_INFORME
+from ..core import configuracion
+from ..core.eventos_progreso import publicar_evento
+from ..core import observabilidad
 
 # --- Constantes de Configuración ---
 
-# Extraeremos una imagen cada 5 segundos de video.
-SEGUNDOS_ENTRE_FOTOGRAMAS = 5
+# Revisamos un fotograma candidato cada segundo de video. Los fotogramas
+# intermedios se saltan con grab(), sin decodificarlos.
+SEGUNDOS_ENTRE_FOTOGRAMAS = 1
+
+# Un candidato solo se guarda si cambia lo suficiente respecto al último
+# fotograma clave. Se comparan dos "huellas" baratas:
+# - Hash perceptual por diferencias (dHash de 64 bits): bits distintos.
+UMBRAL_DIFERENCIA_HASH = 10
+# - Histograma de grises: distancia de variación total (0 = idénticos, 1 = opuestos).
+UMBRAL_DIFERENCIA_HISTOGRAMA = 0.25
+
+# Aunque la escena no cambie, guardamos al menos un fotograma cada tanto tiempo
+# para que el informe cubra todo el video (0 = desactivado).
+SEGUNDOS_MAXIMOS_SIN_FOTOGRAMA = 120
 
 # Este es el prompt que le daremos a la IA para que analice cada fotograma.
 PROMPT_ANALISIS_IMAGEN = """
@@ -27,10 +47,92 @@ En tu descripción, céntrate en los siguientes puntos si están presentes:
 Sé conciso y cíñete a los hechos visuales.
 """
 
+# Identifica la configuración que produce el informe (selección de fotogramas,
+# prompt y tamaño de los lotes, que cambia cómo Gemini describe cada imagen),
+# para que la caché de extracciones no reutilice informes de otra configuración.
+VERSION_HERRAMIENTA = "video-gemini-flash-" + hashlib.sha256(
+    f"{SEGUNDOS_ENTRE_FOTOGRAMAS}|{UMBRAL_DIFERENCIA_HASH}|{UMBRAL_DIFERENCIA_HISTOGRAMA}|"
+    f"{SEGUNDOS_MAXIMOS_SIN_FOTOGRAMA}|{PROMPT_ANALISIS_IMAGEN}|{configuracion.FOTOGRAMAS_POR_LOTE}|"
+    f"{herramientas_audio.VERSION_HERRAMIENTA if configuracion.VIDEO_TRANSCRIBIR_AUDIO else 'sin-audio'}".encode("utf-8")
+).hexdigest()[:12]
+
+def _calcular_huella_fotograma(fotograma: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calcula la "huella" de un fotograma: su dHash de 64 bits y su histograma
+    de grises normalizado (32 bins). Ambas operaciones están vectorizadas.
+    """
+    gris = cv2.cvtColor(fotograma, cv2.COLOR_BGR2GRAY)
+    reducido = cv2.resize(gris, (9, 8), interpolation=cv2.INTER_AREA)
+    hash_diferencias = (reducido[:, 1:] > reducido[:, :-1]).ravel()
+
+    histograma = np.bincount((gris >> 3).ravel(), minlength=32).astype(np.float32)
+    histograma /= histograma.sum()
+    return hash_diferencias, histograma
+
+
+def _es_cambio_de_escena(huella_actual, huella_anterior) -> bool:
+    """Decide si un candidato es lo bastante distinto del último fotograma clave."""
+    if huella_anterior is None:
+        return True
+    hash_actual, histograma_actual = huella_actual
+    hash_anterior, histograma_anterior = huella_anterior
+    bits_distintos = np.count_nonzero(hash_actual != hash_anterior)
+    distancia_histograma = 0.5 * np.abs(histograma_actual - histograma_anterior).sum()
+    return bits_distintos > UMBRAL_DIFERENCIA_HASH or distancia_histograma > UMBRAL_DIFERENCIA_HISTOGRAMA
+
+
+def seleccionar_fotogramas_clave(captura_video: cv2.VideoCapture, fps: float):
+    """
+    Recorre el video y produce solo los fotogramas clave: los que muestran un
+    cambio de escena respecto al último fotograma guardado.
+
+    Solo se decodifica un candidato cada SEGUNDOS_ENTRE_FOTOGRAMAS; el resto
+    se avanza con grab(), que lee el paquete sin decodificar la imagen. Así un
+    video estático de vigilancia produce un puñado de fotogramas, no cientos.
+
+    Yields:
+        tuple[int, float, np.ndarray]: (índice del fotograma, segundo, imagen).
+    """
+    salto_entre_candidatos = max(1, int(round(fps * SEGUNDOS_ENTRE_FOTOGRAMAS)))
+    huella_ultimo_clave = None
+    segundo_ultimo_clave = None
+    indice_fotograma = 0
+
+    while True:
+        if indice_fotograma % salto_entre_candidatos != 0:
+            if not captura_video.grab():
+                break
+            indice_fotograma += 1
+            continue
+
+        exito, fotograma = captura_video.read()
+        if not exito:
+            break
+
+        segundo_actual = indice_fotograma / fps
+        huella_actual = _calcular_huella_fotograma(fotograma)
+        hace_mucho_del_ultimo = (
+            SEGUNDOS_MAXIMOS_SIN_FOTOGRAMA > 0
+            and segundo_ultimo_clave is not None
+            and segundo_actual - segundo_ultimo_clave >= SEGUNDOS_MAXIMOS_SIN_FOTOGRAMA
+        )
+        if hace_mucho_del_ultimo or _es_cambio_de_escena(huella_actual, huella_ultimo_clave):
+            huella_ultimo_clave = huella_actual
+            segundo_ultimo_clave = segundo_actual
+            yield indice_fotograma, segundo_actual, fotograma
+
+        indice_fotograma += 1
+
+
 def procesar_video_con_opencv_y_gemini(ruta_archivo: str, id_caso: str) -> dict:
     """
-    Orquesta el procesamiento completo de un video: extrae fotogramas con OpenCV
-    y luego los analiza con un modelo de IA multimodal (Gemini) para describir su contenido.
+    Orquesta el procesamiento completo de un video: selecciona los fotogramas
+    clave (cambios de escena) con OpenCV y luego los analiza con un modelo de IA
+    multimodal (Gemini) para describir su contenido.
+
+    Si VIDEO_TRANSCRIBIR_AUDIO está activo, la pista de audio se transcribe con
+    Whisper en otro hilo, a la vez que se extraen y describen los fotogramas, y
+    la transcripción se añade al final del informe.
 
     Args:
         ruta_archivo (str): La ruta completa al archivo de video.
@@ -38,20 +140,31 @@ def procesar_video_con_opencv_y_gemini(ruta_archivo: str, id_caso: str) -> dict:
 
     Returns:
         dict: Un diccionario con 'texto_extraido' (un informe completo de lo que
-              se ve en el video) y 'error'.
+              se ve y se oye en el video), 'segmentos' (la transcripción del
+              audio con marcas de tiempo, o None) y 'error'. Si algún fotograma
+              no se pudo describir, el informe se devuelve igual pero con
+              'error' fijado, para que no se guarde en la caché.
     """
-    resultado = {"texto_extraido": None, "error": None}
+    resultado = {"texto_extraido": None, "segmentos": None, "error": None}
     print(f"      TOOL-SYSTEM: -> Herramienta REAL 'procesar_video' activada para {ruta_archivo}")
 
     captura_video = None
     rutas_fotogramas_guardados = []
+
+    # La transcripción del audio no depende de los fotogramas: empieza ya, en
+    # una copia del contexto (para publicar el progreso a nombre de esta evidencia).
+    ejecutor_audio, futuro_audio = None, None
+    if configuracion.VIDEO_TRANSCRIBIR_AUDIO:
+        ejecutor_audio = ThreadPoolExecutor(max_workers=1, thread_name_prefix="video-audio")
+        futuro_audio = ejecutor_audio.submit(
+            contextvars.copy_context().run, herramientas_audio.procesar_audio_con_whisper, ruta_archivo
+        )
     
     try:
-        # --- FASE 1: Extracción de Fotogramas con OpenCV ---
+        # --- FASE 1: Selección de Fotogramas Clave con OpenCV ---
         
-        # (Esta parte es la misma que ya teníamos y funcionaba)
         nombre_base_archivo = Path(ruta_archivo).stem
-        ruta_guardado_fotogramas = Path("archivos_subidos") / id_caso / f"fotogramas_{nombre_base_archivo}"
+        ruta_guardado_fotogramas = Path(configuracion.DIRECTORIO_SUBIDAS) / id_caso / f"fotogramas_{nombre_base_archivo}"
         ruta_guardado_fotogramas.mkdir(parents=True, exist_ok=True)
         print(f"      TOOL-SYSTEM: -> [Fase 1/2] Extrayendo fotogramas a: {ruta_guardado_fotogramas}")
 
@@ -60,23 +173,20 @@ def procesar_video_con_opencv_y_gemini(ruta_archivo: str, id_caso: str) -> dict:
             raise IOError("No se pudo abrir el archivo de video.")
 
         fps = captura_video.get(cv2.CAP_PROP_FPS) or 30
-        salto_entre_fotogramas = int(fps * SEGUNDOS_ENTRE_FOTOGRAMAS)
-        contador_fotogramas = 0
-
-        while captura_video.isOpened():
-            exito, fotograma = captura_video.read()
-            if not exito: break
+        segundos_fotogramas_guardados = []
 
-            if contador_fotogramas % salto_entre_fotogramas == 0:
-                segundo_actual = int(contador_fotogramas / fps)
-                nombre_fotograma = f"fotograma_segundo_{segundo_actual}.jpg"
+        with observabilidad.tramo("video.fotogramas") as tramo_fotogramas:
+            for _, segundo_actual, fotograma in seleccionar_fotogramas_clave(captura_video, fps):
+                nombre_fotograma = f"fotograma_segundo_{int(segundo_actual)}.jpg"
                 ruta_completa_fotograma = str(ruta_guardado_fotogramas / nombre_fotograma)
                 cv2.imwrite(ruta_completa_fotograma, fotograma)
                 rutas_fotogramas_guardados.append(ruta_completa_fotograma)
-
-            contador_fotogramas += 1
+                segundos_fotogramas_guardados.append(segundo_actual)
+            tramo_fotogramas.fijar(fotogramas=len(rutas_fotogramas_guardados))
+        observabilidad.segundos_por_herramienta.labels("video_fotogramas").observe(tramo_fotogramas.segundos)
         
         print(f"      TOOL-SYSTEM: -> [Fase 1/2] Extracción completada. Se guardaron {len(rutas_fotogramas_guardados)} fotogramas.")
+        publicar_evento("progreso", etapa="video_extraccion", total=len(rutas_fotogramas_guardados))
 
         if not rutas_fotogramas_guardados:
             resultado["error"] = "No se pudo extraer ningún fotograma del video."
@@ -90,18 +200,34 @@ def procesar_video_con_opencv_y_gemini(ruta_archivo: str, id_caso: str) -> dict:
             prompt_texto=PROMPT_ANALISIS_IMAGEN
         )
 
+        fotogramas_fallidos = sum(herramientas_lenguaje.es_descripcion_fallida(d) for d in descripciones_ia)
+        if fotogramas_fallidos:
+            resultado["error"] = f"No se pudieron describir {fotogramas_fallidos} de {len(descripciones_ia)} fotogramas."
+            print(f"TOOL-SYSTEM-ERROR: {resultado['error']}")
+
         # --- FASE 3: Consolidación del Informe ---
         print("      TOOL-SYSTEM: -> [Fase 3/3] Consolidando el informe final del video.")
         informe_final = [
             "INFORME DE ANÁLISIS DE EVIDENCIA EN VIDEO\n"
             "========================================\n",
-            f"El siguiente texto es una transcripción generada por IA del contenido visual de {len(descripciones_ia)} fotogramas clave extraídos del video '{Path(ruta_archivo).name}'.\n"
+            f"El siguiente texto es una transcripción generada por IA del contenido visual de {len(descripciones_ia)} fotogramas clave extraídos del video.\n"
         ]
 
-        for i, descripcion in enumerate(descripciones_ia):
-            segundo_aprox = i * SEGUNDOS_ENTRE_FOTOGRAMAS
+        for i, (descripcion, segundo_aprox) in enumerate(zip(descripciones_ia, segundos_fotogramas_guardados)):
+            segundo_aprox = int(segundo_aprox)
             informe_final.append(f"\n--- Fotograma {i+1} (aproximadamente en el segundo {segundo_aprox}) ---\n")
             informe_final.append(descripcion)
+
+        # --- FASE 4: Transcripción de la pista de audio (ya en marcha desde el principio) ---
+        if futuro_audio:
+            transcripcion = futuro_audio.result()
+            if transcripcion.get("texto_extraido"):
+                informe_final.append(ENCABEZADO_TRANSCRIPCION_EN_INFORME)
+                informe_final.append(transcripcion["texto_extraido"])
+                resultado["segmentos"] = transcripcion.get("segmentos")
+            else:
+                # Muchos videos no tienen audio (o no tienen voz): no es un error del informe.
+                print(f"      TOOL-SYSTEM: -> El video no tiene audio transcribible ({transcripcion.get('error') or 'sin voz'}).")
         
         resultado["texto_extraido"] = "\n".join(informe_final)
         print("      TOOL-SYSTEM: -> ¡Análisis completo! Informe de video generado.")
@@ -114,5 +240,10 @@ def procesar_video_con_opencv_y_gemini(ruta_archivo: str, id_caso: str) -> dict:
     finally:
         if captura_video:
             captura_video.release()
+        if ejecutor_audio:
+            # Whisper no se puede interrumpir a mitad: si el video falló antes,
+            # esperamos igual a que termine para que no siga publicando eventos
+            # (ni gastando CPU) cuando el trabajo ya se dio por terminado.
+            ejecutor_audio.shutdown(wait=True)
             
     return resultado
\ No newline at end of file
@@ -0,0 +1,341 @@
+# backend/herramientas/indice_conocimiento.py
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from pathlib import Path
+
+import faiss
+import numpy as np
+
+from ..core import configuracion
+
+# =================================================================================
+# SECCIÓN 1: CONFIGURACIÓN DE LA BASE DE CONOCIMIENTO
+# =================================================================================
+
+RUTA_CORPUS_POR_DEFECTO = Path(configuracion.RUTA_CORPUS_CONOCIMIENTO) if configuracion.RUTA_CORPUS_CONOCIMIENTO else (
+    Path(__file__).resolve().parent.parent / "datos" / "base_de_conocimiento_juridico" / "leyes_basicas.txt"
+)
+NOMBRE_MODELO_EMBEDDINGS = "all-MiniLM-L6-v2"
+SEPARADOR_DOCUMENTOS = "---"
+
+TIPOS_DE_INDICE = ("flat", "hnsw", "ivfpq")
+
+# IVF necesita unos 39 puntos de entrenamiento por lista; por debajo de esto
+# (corpus pequeños como el de ejemplo) usamos el índice exacto.
+PUNTOS_POR_LISTA_IVF = 39
+
+# =================================================================================
+# SECCIÓN 2: CONSTRUCCIÓN DEL ÍNDICE (SIMILITUD COSENO)
+# =================================================================================
+# Todos los embeddings (y las consultas) se normalizan a norma 1 y se buscan
+# con producto interno: así la puntuación de FAISS es la similitud coseno.
+
+
+def normalizar(embeddings: np.ndarray) -> np.ndarray:
+    """Devuelve una copia float32 contigua de los embeddings con norma 1."""
+    normalizados = np.array(embeddings, dtype=np.float32, order="C", copy=True)
+    faiss.normalize_L2(normalizados)
+    return normalizados
+
+
+def describir_indice(tipo_indice: str, numero_documentos: int, dimension: int) -> str:
+    """
+    Traduce el tipo de índice configurado a una cadena de la "fábrica" de FAISS.
+    Si el corpus es demasiado pequeño para entrenar IVF, se usa el índice exacto.
+    """
+    if tipo_indice not in TIPOS_DE_INDICE:
+        raise ValueError(f"Tipo de índice '{tipo_indice}' no soportado. Opciones: {', '.join(TIPOS_DE_INDICE)}")
+
+    if tipo_indice == "hnsw":
+        return f"HNSW{configuracion.HNSW_VECINOS},Flat"
+
+    if tipo_indice == "ivfpq":
+        listas = configuracion.IVF_LISTAS or max(1, int(4 * math.sqrt(numero_documentos)))
+        if numero_documentos < listas * PUNTOS_POR_LISTA_IVF or dimension % configuracion.PQ_SUBCUANTIZADORES:
+            return "Flat"
+        # Con muchas listas, el cuantizador grueso también es un HNSW para no
+        # comparar cada consulta contra todos los centroides.
+        cuantizador = f"IVF{listas}_HNSW32" if listas > 4096 else f"IVF{listas}"
+        return f"{cuantizador},PQ{configuracion.PQ_SUBCUANTIZADORES}"
+
+    return "Flat"
+
+
+def construir_indice(embeddings_normalizados: np.ndarray, descripcion_indice: str) -> faiss.Index:
+    """Entrena (si hace falta) y llena un índice FAISS de producto interno."""
+    indice = faiss.index_factory(embeddings_normalizados.shape[1], descripcion_indice, faiss.METRIC_INNER_PRODUCT)
+    if not indice.is_trained:
+        print(f"TOOL-SETUP: Entrenando índice '{descripcion_indice}' con {len(embeddings_normalizados)} vectores...")
+        indice.train(embeddings_normalizados)
+    indice.add(embeddings_normalizados)
+    return indice
+
+
+def configurar_busqueda(indice: faiss.Index) -> faiss.Index:
+    """Ajusta los parámetros de búsqueda (nprobe / efSearch) según la configuración."""
+    espacio_parametros = faiss.ParameterSpace()
+    for nombre, valor in (("nprobe", configuracion.IVF_LISTAS_A_VISITAR), ("efSearch", configuracion.HNSW_AMPLITUD_BUSQUEDA)):
+        try:
+            espacio_parametros.set_index_parameter(indice, nombre, valor)
+        except RuntimeError:
+            pass  # El parámetro no aplica a este tipo de índice.
+    return indice
+
+# =================================================================================
+# SECCIÓN 3: PERSISTENCIA DE EMBEDDINGS E ÍNDICE
+# =================================================================================
+# Junto al corpus guardamos tres archivos:
+#   - <corpus>.embeddings.npy : matriz float32 con un embedding por documento.
+#   - <corpus>.manifiesto.json: modelo, índice usado y hash SHA-256 de cada documento.
+#   - <corpus>.faiss          : el índice FAISS ya construido.
+# Al arrancar comparamos los hashes: si nada cambió, el índice se carga con
+# memory-mapping (sin recodificar nada); si cambiaron algunos documentos, solo
+# esos se vuelven a codificar con el SentenceTransformer.
+
+
+def leer_documentos(ruta_corpus: Path) -> list[str]:
+    """Lee el corpus y lo separa en documentos usando el separador '---'."""
+    with open(ruta_corpus, "r", encoding="utf-8") as f:
+        return f.read().split(SEPARADOR_DOCUMENTOS)
+
+
+def _hash_documento(documento: str) -> str:
+    return hashlib.sha256(documento.encode("utf-8")).hexdigest()
+
+
+def _rutas_persistencia(ruta_corpus: Path) -> dict[str, Path]:
+    base = ruta_corpus.with_suffix("")
+    return {
+        "embeddings": base.with_name(base.name + ".embeddings.npy"),
+        "manifiesto": base.with_name(base.name + ".manifiesto.json"),
+        "indice": base.with_name(base.name + ".faiss"),
+    }
+
+
+def _escribir_atomicamente(ruta_destino: Path, escribir) -> None:
+    """
+    Escribe en un archivo temporal y luego lo renombra. Así otro proceso que
+    esté arrancando nunca lee un archivo a medio escribir.
+    """
+    ruta_temporal = ruta_destino.with_name(f"{ruta_destino.name}.tmp{os.getpid()}")
+    escribir(ruta_temporal)
+    os.replace(ruta_temporal, ruta_destino)
+
+
+def _leer_manifiesto(ruta_manifiesto: Path) -> dict:
+    try:
+        with open(ruta_manifiesto, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _leer_indice_mapeado(ruta_indice: Path) -> faiss.Index:
+    """Carga el índice con memory-mapping cuando el tipo de índice lo permite."""
+    try:
+        return faiss.read_index(str(ruta_indice), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(str(ruta_indice))
+
+
+def cargar_embeddings(ruta_corpus: Path = RUTA_CORPUS_POR_DEFECTO) -> np.ndarray:
+    """Carga (memory-mapped) los embeddings guardados junto al corpus."""
+    return np.load(_rutas_persistencia(Path(ruta_corpus))["embeddings"], mmap_mode="r")
+
+
+def cargar_o_construir_indice(
+    modelo_sentencias,
+    ruta_corpus: Path = RUTA_CORPUS_POR_DEFECTO,
+    tipo_indice: str = configuracion.TIPO_INDICE_CONOCIMIENTO,
+) -> tuple[list[str], faiss.Index]:
+    """
+    Devuelve los documentos del corpus y su índice FAISS, reutilizando todo lo
+    que esté guardado en disco y recodificando solo los documentos que cambiaron.
+
+    Args:
+        modelo_sentencias: El SentenceTransformer usado para codificar documentos.
+        ruta_corpus (Path): Archivo de texto con los documentos separados por '---'.
+        tipo_indice (str): "flat", "hnsw" o "ivfpq".
+
+    Returns:
+        tuple: (lista de documentos, índice FAISS listo para buscar).
+    """
+    ruta_corpus = Path(ruta_corpus)
+    rutas = _rutas_persistencia(ruta_corpus)
+    documentos = leer_documentos(ruta_corpus)
+    hashes_actuales = [_hash_documento(documento) for documento in documentos]
+
+    manifiesto = _leer_manifiesto(rutas["manifiesto"])
+    mismo_modelo = manifiesto.get("modelo") == NOMBRE_MODELO_EMBEDDINGS
+    hashes_guardados = manifiesto.get("hashes", []) if mismo_modelo else []
+
+    # 1. Caso rápido: el corpus y el tipo de índice no cambiaron y el índice existe.
+    if (
+        hashes_guardados == hashes_actuales
+        and manifiesto.get("tipo_indice") == tipo_indice
+        and rutas["indice"].exists()
+    ):
+        print("TOOL-SETUP: Corpus sin cambios. Cargando índice FAISS desde disco (memory-mapped)...")
+        return documentos, configurar_busqueda(_leer_indice_mapeado(rutas["indice"]))
+
+    # 2. Reutilizamos los embeddings de los documentos que no cambiaron.
+    embeddings_guardados = None
+    if hashes_guardados and rutas["embeddings"].exists():
+        embeddings_guardados = np.load(rutas["embeddings"], mmap_mode="r")
+        if embeddings_guardados.shape[0] != len(hashes_guardados):
+            embeddings_guardados = None
+    fila_por_hash = {h: i for i, h in enumerate(hashes_guardados)} if embeddings_guardados is not None else {}
+
+    posiciones_nuevas = [i for i, h in enumerate(hashes_actuales) if h not in fila_por_hash]
+    print(
+        f"TOOL-SETUP: Corpus con {len(documentos)} documento(s). "
+        f"Reutilizando {len(documentos) - len(posiciones_nuevas)} embedding(s), codificando {len(posiciones_nuevas)}..."
+    )
+
+    embeddings_nuevos = None
+    if posiciones_nuevas:
+        embeddings_nuevos = normalizar(modelo_sentencias.encode([documentos[i] for i in posiciones_nuevas]))
+    dimension = embeddings_nuevos.shape[1] if embeddings_nuevos is not None else embeddings_guardados.shape[1]
+
+    embeddings = np.empty((len(documentos), dimension), dtype=np.float32)
+    posicion_en_nuevos = {posicion: j for j, posicion in enumerate(posiciones_nuevas)}
+    for i, h in enumerate(hashes_actuales):
+        if i in posicion_en_nuevos:
+            embeddings[i] = embeddings_nuevos[posicion_en_nuevos[i]]
+        else:
+            embeddings[i] = embeddings_guardados[fila_por_hash[h]]
+    # Idempotente para los ya normalizados; corrige embeddings de versiones anteriores.
+    faiss.normalize_L2(embeddings)
+
+    # 3. Construimos el índice y guardamos todo para el próximo arranque.
+    descripcion_indice = describir_indice(tipo_indice, len(documentos), dimension)
+    print(f"TOOL-SETUP: Construyendo índice FAISS '{descripcion_indice}' (similitud coseno)...")
+    indice = construir_indice(embeddings, descripcion_indice)
+
+    def _guardar_embeddings(ruta):
+        with open(ruta, "wb") as f:
+            np.save(f, embeddings)
+
+    def _guardar_manifiesto(ruta):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({
+                "modelo": NOMBRE_MODELO_EMBEDDINGS,
+                "tipo_indice": tipo_indice,
+                "descripcion_indice": descripcion_indice,
+                "hashes": hashes_actuales,
+            }, f)
+
+    try:
+        _escribir_atomicamente(rutas["embeddings"], _guardar_embeddings)
+        _escribir_atomicamente(rutas["indice"], lambda ruta: faiss.write_index(indice, str(ruta)))
+        # El manifiesto va al final: solo declara válidos los archivos ya escritos.
+        _escribir_atomicamente(rutas["manifiesto"], _guardar_manifiesto)
+        print(f"TOOL-SETUP: Índice FAISS y embeddings guardados junto al corpus ({rutas['indice'].name}).")
+    except OSError as e:
+        print(f"TOOL-SETUP-WARN: No se pudo guardar el índice en disco. Se usará solo en memoria. Causa: {e}")
+
+    return documentos, configurar_busqueda(indice)
+
+# =================================================================================
+# SECCIÓN 4: EVALUACIÓN DE RECALL Y LATENCIA FRENTE AL ÍNDICE EXACTO
+# =================================================================================
+
+
+def evaluar_indice(
+    embeddings: np.ndarray,
+    tipo_indice: str,
+    numero_consultas: int = 1000,
+    top_k: int = 10,
+    semilla: int = 0,
+) -> dict:
+    """
+    Compara un índice aproximado con el índice exacto (Flat) sobre los mismos
+    embeddings. Las consultas son documentos del corpus con un poco de ruido.
+
+    Returns:
+        dict: recall@k, latencias p50/p95 por consulta (ms) de ambos índices,
+              tiempo de construcción y tamaño serializado del índice evaluado.
+    """
+    generador = np.random.default_rng(semilla)
+    embeddings = normalizar(embeddings)
+    posiciones = generador.choice(len(embeddings), size=min(numero_consultas, len(embeddings)), replace=False)
+    consultas = normalizar(embeddings[posiciones] + generador.normal(0, 0.05, (len(posiciones), embeddings.shape[1])))
+
+    def _medir(indice):
+        latencias = []
+        resultados = []
+        for consulta in consultas:
+            inicio = time.perf_counter()
+            _, vecinos = indice.search(consulta[None, :], top_k)
+            latencias.append((time.perf_counter() - inicio) * 1000)
+            resultados.append(vecinos[0])
+        return np.array(resultados), np.percentile(latencias, [50, 95])
+
+    indice_exacto = construir_indice(embeddings, "Flat")
+    descripcion = describir_indice(tipo_indice, len(embeddings), embeddings.shape[1])
+    inicio_construccion = time.perf_counter()
+    indice_evaluado = configurar_busqueda(construir_indice(embeddings, descripcion))
+    segundos_construccion = time.perf_counter() - inicio_construccion
+
+    vecinos_exactos, latencia_exacta = _medir(indice_exacto)
+    vecinos_aproximados, latencia_aproximada = _medir(indice_evaluado)
+    aciertos = sum(len(set(a) & set(e)) for a, e in zip(vecinos_aproximados, vecinos_exactos))
+
+    return {
+        "descripcion_indice": descripcion,
+        "documentos": len(embeddings),
+        "consultas": len(consultas),
+        f"recall@{top_k}": round(aciertos / (len(consultas) * top_k), 4),
+        "latencia_exacta_ms_p50": round(float(latencia_exacta[0]), 3),
+        "latencia_exacta_ms_p95": round(float(latencia_exacta[1]), 3),
+        "latencia_ms_p50": round(float(latencia_aproximada[0]), 3),
+        "latencia_ms_p95": round(float(latencia_aproximada[1]), 3),
+        "segundos_construccion": round(segundos_construccion, 2),
+        "megabytes_indice": round(len(faiss.serialize_index(indice_evaluado)) / 1e6, 2),
+    }
+
+# =================================================================================
+# SECCIÓN 5: LÍNEA DE COMANDOS
+# =================================================================================
+# Construir (o actualizar) el índice sin arrancar la API:
+#   python -m backend.herramientas.indice_conocimiento construir --tipo ivfpq
+# Medir recall y latencia de un tipo de índice frente al exacto:
+#   python -m backend.herramientas.indice_conocimiento evaluar --tipo hnsw --consultas 1000
+
+
+def main() -> None:
+    analizador = argparse.ArgumentParser(description="Construye y evalúa el índice FAISS de la base de conocimiento.")
+    subcomandos = analizador.add_subparsers(dest="comando", required=True)
+
+    construir = subcomandos.add_parser("construir", help="Construye o actualiza el índice guardado junto al corpus.")
+    construir.add_argument("--corpus", type=Path, default=RUTA_CORPUS_POR_DEFECTO)
+    construir.add_argument("--tipo", choices=TIPOS_DE_INDICE, default=configuracion.TIPO_INDICE_CONOCIMIENTO)
+
+    evaluar = subcomandos.add_parser("evaluar", help="Mide recall@k y latencia frente al índice exacto.")
+    evaluar.add_argument("--corpus", type=Path, default=RUTA_CORPUS_POR_DEFECTO)
+    evaluar.add_argument("--tipo", choices=TIPOS_DE_INDICE, default=configuracion.TIPO_INDICE_CONOCIMIENTO)
+    evaluar.add_argument("--consultas", type=int, default=1000)
+    evaluar.add_argument("--top-k", type=int, default=10)
+
+    argumentos = analizador.parse_args()
+
+    if argumentos.comando == "construir":
+        from sentence_transformers import SentenceTransformer
+        modelo_sentencias = SentenceTransformer(NOMBRE_MODELO_EMBEDDINGS)
+        documentos, indice = cargar_o_construir_indice(modelo_sentencias, argumentos.corpus, argumentos.tipo)
+        print(f"Índice listo: {indice.ntotal} vectores de {len(documentos)} documentos.")
+    else:
+        resultado = evaluar_indice(
+            cargar_embeddings(argumentos.corpus), argumentos.tipo,
+            numero_consultas=argumentos.consultas, top_k=argumentos.top_k,
+        )
+        print(json.dumps(resultado, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+# backend/herramientas/proveedores_llm.py
+
+import hashlib
+import json
+import os
+import re
+import time
+import urllib.request
+from typing import Optional
+
+from langchain_core.messages import AIMessage
+
+from ..core import configuracion
+
+# =================================================================================
+# PROVEEDORES DEL MODELO DE LENGUAJE
+# =================================================================================
+# Las herramientas de lenguaje solo necesitan un objeto con un atributo 'model'
+# (el nombre, que usa la caché de respuestas) y un método 'invoke(entrada)' que
+# devuelva un mensaje con '.content'. 'entrada' es un prompt de texto o una
+# lista de mensajes con partes de texto e imágenes en el formato de OpenAI.
+# El proveedor se elige con PROVEEDOR_LLM.
+
+PROVEEDORES_LLM = ("gemini", "local", "simulado")
+
+
+def crear_modelo_de_lenguaje(nombre_modelo_gemini: str, proveedor: Optional[str] = None):
+    """
+    Crea el modelo de lenguaje del proveedor configurado.
+
+    Args:
+        nombre_modelo_gemini (str): Modelo de Gemini que se usaría con el proveedor
+            "gemini" (los otros proveedores usan su propio modelo).
+        proveedor (str, opcional): Por defecto, PROVEEDOR_LLM.
+    """
+    proveedor = (proveedor or configuracion.PROVEEDOR_LLM).lower()
+    if proveedor == "gemini":
+        return _crear_modelo_gemini(nombre_modelo_gemini)
+    if proveedor == "local":
+        return ModeloLocalCompatibleOpenAI(configuracion.URL_LLM_LOCAL, configuracion.MODELO_LLM_LOCAL)
+    if proveedor == "simulado":
+        return ModeloSimulado(
+            configuracion.LLM_SIMULADO_SEGUNDOS_LATENCIA, configuracion.LLM_SIMULADO_SEGUNDOS_POR_1000_TOKENS
+        )
+    raise ValueError(f"Proveedor de modelo de lenguaje desconocido: '{proveedor}'. Opciones: {', '.join(PROVEEDORES_LLM)}.")
+
+
+def _crear_modelo_gemini(nombre_modelo: str):
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("No se encontró la GOOGLE_API_KEY en el archivo .env")
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    # Sin reintentos propios: los 429 ya los reintenta 'invocar_gemini' con su
+    # espera exponencial, y los de LangChain se sumarían a los nuestros.
+    return ChatGoogleGenerativeAI(model=nombre_modelo, google_api_key=api_key, max_retries=0)
+
+
+def _a_mensajes_openai(entrada) -> list[dict]:
+    """Convierte un prompt de texto o una lista de mensajes de LangChain al formato de OpenAI."""
+    if isinstance(entrada, str):
+        return [{"role": "user", "content": entrada}]
+    return [{"role": "user", "content": getattr(mensaje, "content", mensaje)} for mensaje in entrada]
+
+
+def _mensaje(contenido: str, tokens_entrada: int, tokens_salida: int) -> AIMessage:
+    """Respuesta con el uso de tokens en 'usage_metadata', como la de ChatGoogleGenerativeAI."""
+    return AIMessage(content=contenido, usage_metadata={
+        "input_tokens": tokens_entrada, "output_tokens": tokens_salida, "total_tokens": tokens_entrada + tokens_salida,
+    })
+
+
+class ModeloLocalCompatibleOpenAI:
+    """
+    Cliente mínimo de '/chat/completions' para servidores locales compatibles
+    con la API de OpenAI (Ollama, llama.cpp server, vLLM...). Solo usa la
+    biblioteca estándar.
+    """
+
+    def __init__(self, url_base: str, nombre_modelo: str):
+        self.url_base = url_base.rstrip("/")
+        self.model = f"local:{nombre_modelo}"
+        self._nombre_modelo = nombre_modelo
+
+    def invoke(self, entrada) -> AIMessage:
+        cuerpo = json.dumps({"model": self._nombre_modelo, "messages": _a_mensajes_openai(entrada)}).encode("utf-8")
+        solicitud = urllib.request.Request(
+            f"{self.url_base}/chat/completions", data=cuerpo, headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(solicitud, timeout=configuracion.SEGUNDOS_ESPERA_LLM_LOCAL) as respuesta:
+            datos = json.loads(respuesta.read())
+        uso = datos.get("usage") or {}
+        return _mensaje(
+            datos["choices"][0]["message"]["content"], uso.get("prompt_tokens", 0), uso.get("completion_tokens", 0)
+        )
+
+
+class ModeloSimulado:
+    """
+    Modelo falso y determinista para pruebas de carga: no usa red ni cuota y
+    responde siempre lo mismo al mismo prompt, con el formato que espera cada
+    herramienta (entidades o veredicto entre <json>, descripciones por imagen,
+    síntesis en Markdown). La latencia es configurable, así se puede medir el
+    coste propio del grafo separado del coste del modelo.
+    """
+
+    model = "simulado"
+
+    def __init__(self, segundos_latencia: float = 0.0, segundos_por_1000_tokens: float = 0.0):
+        self.segundos_latencia = segundos_latencia
+        self.segundos_por_1000_tokens = segundos_por_1000_tokens
+
+    def invoke(self, entrada) -> AIMessage:
+        texto, imagenes = self._texto_e_imagenes(entrada)
+        # Misma estimación que el limitador: 4 caracteres por token y 258 por imagen.
+        tokens_entrada = len(texto) // 4 + 258 * imagenes
+        time.sleep(self.segundos_latencia + self.segundos_por_1000_tokens * tokens_entrada / 1000)
+        contenido = self._responder(texto, imagenes)
+        return _mensaje(contenido, tokens_entrada, len(contenido) // 4)
+
+    def _responder(self, texto: str, imagenes: int) -> str:
+        huella = hashlib.sha256(texto.encode("utf-8")).hexdigest()[:8]
+        if imagenes:
+            descripciones = [f"Descripción simulada de la imagen {i} ({huella})." for i in range(1, imagenes + 1)]
+            if imagenes == 1:
+                return descripciones[0]
+            return "\n".join(f"### IMAGEN {i}\n{d}" for i, d in enumerate(descripciones, start=1))
+        if '"verificado"' in texto:
+            veredicto = {"verificado": True, "observaciones": f"Verificación simulada ({huella})."}
+            return f"<json>{json.dumps(veredicto, ensure_ascii=False)}</json>"
+        if "<json>" in texto:
+            return f"<json>{json.dumps(self._entidades(texto), ensure_ascii=False)}</json>"
+        return f"## Borrador de estrategia simulado ({huella})\n\n{texto[-500:]}"
+
+    @staticmethod
+    def _texto_e_imagenes(entrada) -> tuple[str, int]:
+        if isinstance(entrada, str):
+            return entrada, 0
+        textos, imagenes = [], 0
+        for mensaje in entrada:
+            contenido = getattr(mensaje, "content", mensaje)
+            if isinstance(contenido, str):
+                textos.append(contenido)
+                continue
+            for parte in contenido:
+                if parte.get("type") == "image_url":
+                    imagenes += 1
+                else:
+                    textos.append(parte.get("text", ""))
+        return "\n".join(textos), imagenes
+
+    @staticmethod
+    def _entidades(texto: str) -> list[dict]:
+        """Entidades deterministas: las palabras con mayúscula inicial del texto a analizar."""
+        analizado = texto.split("---")[-2] if texto.count("---") >= 2 else texto
+        palabras = list(dict.fromkeys(re.findall(r"\b[A-ZÁÉÍÓÚÑ][a-záéíóúñ]{3,}\b", analizado)))[:20]
+        # Siempre al menos una, para que el grafo siga hasta la síntesis.
+        if not palabras:
+            palabras = [f"Hecho {hashlib.sha256(analizado.encode('utf-8')).hexdigest()[:8]}"]
+        return [{"entidad": palabra, "tipo": "Hecho Clave"} for palabra in palabras]
@@ -7,8 +7,12 @@ from contextlib import asynccontextmanager
 # 1. Importamos la función que crea las tablas.
 from . import base_de_datos
 # 2. Renombramos el import del enrutador para que coincida con el nuevo nombre de archivo de los modelos.
-from .api import enrutador_principal
+from .api import enrutador_principal, enrutador_sistema
 # ------------------------------------
+import threading
+from . import cola_de_trabajos
+from .core import configuracion
+from .core.carga_perezosa import precargar_modelos
 
 # Creamos un "evento" que se ejecuta al iniciar la aplicación.
 # Esto asegura que las tablas de la base de datos se creen (si no existen)
@@ -17,8 +21,20 @@ from .api import enrutador_principal
 async def lifespan(app: FastAPI):
     print("INFO:     Iniciando la aplicación...")
     base_de_datos.inicializar_base_de_datos()
+    # Los modelos pesados se cargan al primer uso. Si se pide, los precargamos
+    # en segundo plano para no retrasar el arranque de la API.
+    if configuracion.PRECARGAR_MODELOS_AL_INICIAR:
+        threading.Thread(target=precargar_modelos, name="precarga-modelos", daemon=True).start()
+    # Los trabajadores procesan en segundo plano las evidencias encoladas.
+    if configuracion.INICIAR_TRABAJADORES_CON_API:
+        cola_de_trabajos.iniciar_trabajadores()
     yield
     print("INFO:     Apagando la aplicación...")
+    cola_de_trabajos.detener_trabajadores()
+    # Si se llegó a usar, detenemos el grupo de procesos de Nougat.
+    from .herramientas.herramientas_documentos import cerrar_grupo_procesos_nougat
+    cerrar_grupo_procesos_nougat()
+    await base_de_datos.cerrar_conexiones_asincronas()
 
 aplicacion = FastAPI(
     title="API del Asistente Legal Multimodal",
@@ -40,4 +56,6 @@ aplicacion.add_middleware(
     allow_headers=["*"],
 )
 
-aplicacion.include_router(enrutador_principal.router)
\ No newline at end of file
+aplicacion.include_router(enrutador_principal.router)
+aplicacion.include_router(enrutador_sistema.router)
+aplicacion.include_router(enrutador_sistema.router_metricas)
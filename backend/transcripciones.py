@@ -0,0 +1,119 @@
+# backend/transcripciones.py
+
+import bisect
+import uuid
+from typing import Optional
+
+from sqlalchemy import delete
+from sqlmodel import Session, select
+
+from .api.modelos_compartidos import BloqueTranscripcion, Evidencia, OPCIONES_SIN_TEXTOS_PESADOS
+
+# =================================================================================
+# TRANSCRIPCIONES CON MARCAS DE TIEMPO
+# =================================================================================
+# Los segmentos de Whisper ({'inicio', 'fin', 'texto'}) se guardan en bloques de
+# SEGMENTOS_POR_BLOQUE, en forma de columnas. Para leer una página o saltar a un
+# segundo basta con leer los bloques que la contienen.
+
+SEGMENTOS_POR_BLOQUE = 200
+
+# Los videos añaden su transcripción al final del informe de fotogramas (para
+# que el análisis la tenga en cuenta) a partir de este encabezado.
+ENCABEZADO_TRANSCRIPCION_EN_INFORME = "\n\nTRANSCRIPCIÓN DE LA PISTA DE AUDIO\n==================================\n"
+
+
+def quitar_transcripcion_del_informe(texto_extraido: Optional[str]) -> Optional[str]:
+    """Devuelve el informe sin la transcripción añadida al final (que se lee por páginas aparte)."""
+    if not texto_extraido:
+        return texto_extraido
+    return texto_extraido.split(ENCABEZADO_TRANSCRIPCION_EN_INFORME, 1)[0]
+
+
+def guardar_transcripcion(sesion: Session, id_evidencia: uuid.UUID, segmentos: list[dict]) -> int:
+    """
+    Reemplaza la transcripción de una evidencia. No hace commit: se guarda en la
+    misma transacción que el resto del resultado.
+
+    Returns:
+        int: El número de segmentos guardados.
+    """
+    sesion.execute(delete(BloqueTranscripcion).where(BloqueTranscripcion.id_evidencia == id_evidencia))
+    for numero_bloque, primer_segmento in enumerate(range(0, len(segmentos), SEGMENTOS_POR_BLOQUE)):
+        bloque = segmentos[primer_segmento:primer_segmento + SEGMENTOS_POR_BLOQUE]
+        sesion.add(BloqueTranscripcion(
+            id_evidencia=id_evidencia,
+            numero_bloque=numero_bloque,
+            primer_segmento=primer_segmento,
+            cantidad=len(bloque),
+            segundo_inicio=bloque[0]["inicio"],
+            segundo_fin=bloque[-1]["fin"],
+            inicios=[s["inicio"] for s in bloque],
+            fines=[s["fin"] for s in bloque],
+            textos=[s["texto"] for s in bloque],
+        ))
+    return len(segmentos)
+
+
+def copiar_transcripcion_de_contenido_identico(sesion: Session, evidencia: Evidencia) -> Optional[int]:
+    """
+    Si el texto de la evidencia salió de la caché de extracciones (mismo archivo
+    subido antes), copia la transcripción de la evidencia original.
+
+    Returns:
+        int o None: El número de segmentos copiados, o None si no había ninguna.
+    """
+    if not evidencia.hash_contenido:
+        return None
+    original = sesion.exec(
+        select(Evidencia)
+        .where(Evidencia.hash_contenido == evidencia.hash_contenido)
+        .where(Evidencia.id_evidencia != evidencia.id_evidencia)
+        .where(Evidencia.total_segmentos_transcripcion != None)  # noqa: E711
+        .options(*OPCIONES_SIN_TEXTOS_PESADOS)
+        .limit(1)
+    ).first()
+    if not original:
+        return None
+    segmentos = leer_segmentos(sesion, original.id_evidencia, 0, original.total_segmentos_transcripcion)
+    return guardar_transcripcion(sesion, evidencia.id_evidencia, segmentos)
+
+
+def leer_segmentos(sesion: Session, id_evidencia: uuid.UUID, desde: int, limite: int) -> list[dict]:
+    """Devuelve los segmentos [desde, desde + limite) de una transcripción, con su posición ('indice')."""
+    hasta = desde + limite
+    bloques = sesion.exec(
+        select(BloqueTranscripcion)
+        .where(BloqueTranscripcion.id_evidencia == id_evidencia)
+        .where(BloqueTranscripcion.primer_segmento < hasta)
+        .where(BloqueTranscripcion.primer_segmento + BloqueTranscripcion.cantidad > desde)
+        .order_by(BloqueTranscripcion.numero_bloque)
+    ).all()
+
+    segmentos = []
+    for bloque in bloques:
+        for posicion in range(max(desde - bloque.primer_segmento, 0), min(hasta - bloque.primer_segmento, bloque.cantidad)):
+            segmentos.append({
+                "indice": bloque.primer_segmento + posicion,
+                "inicio": bloque.inicios[posicion],
+                "fin": bloque.fines[posicion],
+                "texto": bloque.textos[posicion],
+            })
+    return segmentos
+
+
+def buscar_segmento_por_segundo(sesion: Session, id_evidencia: uuid.UUID, segundo: float) -> Optional[int]:
+    """
+    Posición del segmento que se oye en 'segundo' (o del primero que empieza
+    después). None si 'segundo' está después del final de la transcripción.
+    """
+    bloque = sesion.exec(
+        select(BloqueTranscripcion)
+        .where(BloqueTranscripcion.id_evidencia == id_evidencia)
+        .where(BloqueTranscripcion.segundo_fin > segundo)
+        .order_by(BloqueTranscripcion.numero_bloque)
+        .limit(1)
+    ).first()
+    if not bloque:
+        return None
+    return bloque.primer_segmento + bisect.bisect_right(bloque.fines, segundo)
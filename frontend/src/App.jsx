@@ -1,7 +1,7 @@
 // frontend/src/App.jsx
 import { useState, useEffect } from 'react';
 import './App.css';
-import { obtenerTodosLosCasos } from './servicios/api';
+import { obtenerCasos, obtenerCaso } from './servicios/api';
 
 import FormularioCrearCaso from './componentes/FormularioCrearCaso/FormularioCrearCaso';
 import ListaCasos from './componentes/ListaCasos/ListaCasos';
@@ -10,12 +10,21 @@ import VistaDetalleCaso from './componentes/VistaDetalleCaso/VistaDetalleCaso';
 
 function App() {
   const [casos, setCasos] = useState([]);
+  // Cursor de la página siguiente del listado (null si no hay más casos).
+  const [siguienteCursor, setSiguienteCursor] = useState(null);
   // ¡NUEVO! Estado para guardar el caso que el usuario ha seleccionado
   const [casoSeleccionado, setCasoSeleccionado] = useState(null);
 
   const refrescarCasos = async () => {
-    const casosRecibidos = await obtenerTodosLosCasos();
-    setCasos(casosRecibidos);
+    const pagina = await obtenerCasos();
+    setCasos(pagina.casos);
+    setSiguienteCursor(pagina.siguiente);
+  };
+
+  const cargarMasCasos = async () => {
+    const pagina = await obtenerCasos({ cursor: siguienteCursor });
+    setCasos(casosPrevios => [...casosPrevios, ...pagina.casos]);
+    setSiguienteCursor(pagina.siguiente);
   };
 
   useEffect(() => {
@@ -23,8 +32,9 @@ function App() {
   }, []);
 
   // ¡NUEVO! Esta función se llamará cuando se haga clic en un caso de la lista
-  const manejarSeleccionCaso = (idCaso) => {
-    const caso = casos.find(c => c.id_caso === idCaso);
+  // La lista solo trae resúmenes: el detalle (con evidencias) se pide al seleccionarlo.
+  const manejarSeleccionCaso = async (idCaso) => {
+    const caso = await obtenerCaso(idCaso);
     console.log("Caso seleccionado:", caso);
     setCasoSeleccionado(caso);
   };
@@ -38,7 +48,7 @@ function App() {
     
     // También actualizamos la lista general de casos para mantenerla sincronizada
     setCasos(casosPrevios => casosPrevios.map(c => 
-      c.id_caso === casoActualizado.id_caso ? casoActualizado : c
+      c.id_caso === casoActualizado.id_caso ? { ...c, total_evidencias: casoActualizado.evidencias.length } : c
     ));
   };
 
@@ -54,6 +64,7 @@ function App() {
             casos={casos} 
             onSeleccionarCaso={manejarSeleccionCaso} 
             casoActivoId={casoSeleccionado?.id_caso}
+            onCargarMas={siguienteCursor ? cargarMasCasos : null}
           />
         </div>
         <div className="columna-derecha">
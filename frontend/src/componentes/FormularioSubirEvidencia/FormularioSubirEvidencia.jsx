@@ -1,11 +1,27 @@
 // frontend/src/componentes/FormularioSubirEvidencia/FormularioSubirEvidencia.jsx
 import { useState } from 'react';
-import { subirEvidencia } from '../../servicios/api';
+import { subirEvidencia, obtenerCaso, esperarTrabajo, suscribirseAEventosEvidencia } from '../../servicios/api';
 import './FormularioSubirEvidencia.css';
 
+// Convierte un evento de progreso del servidor en un texto legible.
+const describirEvento = (evento) => {
+  if (evento.tipo === 'nodo_inicio') return `Ejecutando: ${evento.nodo}...`;
+  if (evento.tipo === 'nodo_fin') return `Terminado: ${evento.nodo} (${evento.duracion_segundos} s)`;
+  if (evento.tipo === 'progreso' && evento.etapa === 'nougat_pagina') return `PDF: página ${evento.actual}/${evento.total}`;
+  if (evento.tipo === 'progreso' && evento.etapa === 'pdf_texto_nativo') return `PDF: ${evento.actual}/${evento.total} páginas con texto nativo`;
+  if (evento.tipo === 'progreso' && evento.etapa === 'audio_bloque') return `Audio: bloque ${evento.actual}/${evento.total} transcrito`;
+  if (evento.tipo === 'progreso' && evento.etapa === 'entidades_fragmento') return `Entidades: fragmento ${evento.actual}/${evento.total}`;
+  if (evento.tipo === 'progreso' && evento.etapa === 'video_fotograma') return `Video: fotograma ${evento.actual}/${evento.total}`;
+  if (evento.tipo === 'progreso' && evento.etapa === 'video_extraccion') return `Video: ${evento.total} fotogramas extraídos`;
+  if (evento.tipo === 'progreso' && evento.etapa === 'reintento') return `Falló; reintentando (intento ${evento.actual}/${evento.total})...`;
+  if (evento.tipo === 'fin') return `Procesamiento finalizado (${evento.estado}).`;
+  return null;
+};
+
 const FormularioSubirEvidencia = ({ idCaso, onEvidenciaSubida }) => {
   const [archivo, setArchivo] = useState(null);
   const [estaSubiendo, setEstaSubiendo] = useState(false);
+  const [progreso, setProgreso] = useState(null);
 
   const manejarSeleccionArchivo = (evento) => {
     setArchivo(evento.target.files[0]);
@@ -19,16 +35,27 @@ const FormularioSubirEvidencia = ({ idCaso, onEvidenciaSubida }) => {
     }
 
     setEstaSubiendo(true);
+    const formulario = evento.target;
     try {
-      const casoActualizado = await subirEvidencia(idCaso, archivo);
-      alert(`¡Evidencia '${archivo.name}' subida con éxito!`);
-      onEvidenciaSubida(casoActualizado); // Avisamos al componente padre
+      const trabajo = await subirEvidencia(idCaso, archivo);
+      // Mostramos de inmediato la evidencia como 'pendiente'...
+      onEvidenciaSubida(await obtenerCaso(idCaso));
+      setArchivo(null);
+      formulario.reset(); // Limpia el input de archivo
+      setEstaSubiendo(false);
+
+      // Mostramos el progreso en vivo mientras los agentes trabajan...
+      suscribirseAEventosEvidencia(idCaso, trabajo.id_evidencia, (eventoProgreso) => {
+        const texto = describirEvento(eventoProgreso);
+        if (texto) setProgreso(texto);
+      });
+
+      // ...y refrescamos el caso cuando el procesamiento en segundo plano termine.
+      await esperarTrabajo(trabajo.id_trabajo);
+      onEvidenciaSubida(await obtenerCaso(idCaso)); // Avisamos al componente padre
     } catch (error) {
       alert(error.message,"Hubo un error al subir la evidencia.");
-    } finally {
       setEstaSubiendo(false);
-      setArchivo(null);
-      evento.target.reset(); // Limpia el input de archivo
     }
   };
 
@@ -39,6 +66,7 @@ const FormularioSubirEvidencia = ({ idCaso, onEvidenciaSubida }) => {
       <button type="submit" disabled={!archivo || estaSubiendo}>
         {estaSubiendo ? 'Subiendo...' : 'Subir Archivo'}
       </button>
+      {progreso && <p className="upload-progreso">{progreso}</p>}
     </form>
   );
 };
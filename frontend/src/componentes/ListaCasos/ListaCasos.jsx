@@ -2,7 +2,8 @@
 import './ListaCasos.css';
 
 // Aceptamos las nuevas propiedades onSeleccionarCaso y casoActivoId
-const ListaCasos = ({ casos, onSeleccionarCaso, casoActivoId }) => {
+// 'onCargarMas' es null cuando ya no quedan más páginas de casos.
+const ListaCasos = ({ casos, onSeleccionarCaso, casoActivoId, onCargarMas }) => {
   // ... (el if de casos.length === 0 no cambia) ...
 
   return (
@@ -17,10 +18,11 @@ const ListaCasos = ({ casos, onSeleccionarCaso, casoActivoId }) => {
             // ¡Añadimos el evento onClick!
             onClick={() => onSeleccionarCaso(caso.id_caso)}
           >
-            {caso.titulo}
+            {caso.titulo} ({caso.total_evidencias})
           </li>
         ))}
       </ul>
+      {onCargarMas && <button onClick={onCargarMas}>Cargar más casos</button>}
     </div>
   );
 };
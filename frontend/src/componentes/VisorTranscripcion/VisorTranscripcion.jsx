@@ -0,0 +1,73 @@
+// frontend/src/componentes/VisorTranscripcion/VisorTranscripcion.jsx
+import { useState } from 'react';
+import './VisorTranscripcion.css';
+import { obtenerTranscripcion } from '../../servicios/api';
+
+const SEGMENTOS_POR_PAGINA = 100;
+
+// Convierte segundos en "hh:mm:ss" (o "mm:ss" si dura menos de una hora).
+const formatearTiempo = (segundos) => {
+  const total = Math.floor(segundos);
+  const horas = Math.floor(total / 3600);
+  const minutos = String(Math.floor((total % 3600) / 60)).padStart(2, '0');
+  const resto = String(total % 60).padStart(2, '0');
+  return horas > 0 ? `${horas}:${minutos}:${resto}` : `${minutos}:${resto}`;
+};
+
+// Convierte "hh:mm:ss", "mm:ss" o "ss" en segundos.
+const leerTiempo = (texto) =>
+  texto.split(':').reduce((acumulado, parte) => acumulado * 60 + Number(parte || 0), 0);
+
+// Muestra la transcripción de una evidencia por páginas, sin descargarla entera.
+const VisorTranscripcion = ({ idCaso, idEvidencia }) => {
+  const [segmentos, setSegmentos] = useState([]);
+  const [siguiente, setSiguiente] = useState(0);
+  const [cargando, setCargando] = useState(false);
+  const [tiempoBuscado, setTiempoBuscado] = useState('');
+
+  const cargar = async (opciones, reemplazar) => {
+    setCargando(true);
+    try {
+      const pagina = await obtenerTranscripcion(idCaso, idEvidencia, { limite: SEGMENTOS_POR_PAGINA, ...opciones });
+      setSegmentos(previos => (reemplazar ? pagina.segmentos : [...previos, ...pagina.segmentos]));
+      setSiguiente(pagina.siguiente);
+    } catch (error) {
+      alert("No se pudo cargar la transcripción.");
+    } finally {
+      setCargando(false);
+    }
+  };
+
+  const manejarBusqueda = (evento) => {
+    evento.preventDefault();
+    if (tiempoBuscado.trim()) cargar({ segundo: leerTiempo(tiempoBuscado.trim()) }, true);
+  };
+
+  return (
+    <div className="visor-transcripcion">
+      <form onSubmit={manejarBusqueda}>
+        <input
+          type="text"
+          placeholder="Ir a (mm:ss)"
+          value={tiempoBuscado}
+          onChange={(evento) => setTiempoBuscado(evento.target.value)}
+        />
+        <button type="submit" disabled={cargando}>Ir</button>
+      </form>
+
+      {segmentos.map(segmento => (
+        <p key={segmento.indice} className="segmento-transcripcion">
+          <span className="marca-tiempo">[{formatearTiempo(segmento.inicio)}]</span> {segmento.texto}
+        </p>
+      ))}
+
+      {siguiente !== null && (
+        <button onClick={() => cargar({ desde: siguiente }, segmentos.length === 0)} disabled={cargando}>
+          {cargando ? 'Cargando...' : segmentos.length === 0 ? 'Ver transcripción' : 'Cargar más'}
+        </button>
+      )}
+    </div>
+  );
+};
+
+export default VisorTranscripcion;
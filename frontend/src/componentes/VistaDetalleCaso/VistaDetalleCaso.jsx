@@ -2,6 +2,7 @@
 import './VistaDetalleCaso.css';
 // ¡NUEVO! Importamos el formulario
 import FormularioSubirEvidencia from '../FormularioSubirEvidencia/FormularioSubirEvidencia';
+import VisorTranscripcion from '../VisorTranscripcion/VisorTranscripcion';
 
 
 // Este componente recibe el caso seleccionado como un "prop"
@@ -46,6 +47,13 @@ const VistaDetalleCaso = ({ casoSeleccionado , onEvidenciaSubida }) => {
               </div>
             )}
 
+            {evidencia.total_segmentos_transcripcion > 0 && (
+              <div className="detalle-seccion">
+                <h5>Transcripción ({evidencia.total_segmentos_transcripcion} segmentos)</h5>
+                <VisorTranscripcion idCaso={casoSeleccionado.id_caso} idEvidencia={evidencia.id_evidencia} />
+              </div>
+            )}
+
             {evidencia.entidades_extraidas && (
               <div className="detalle-seccion">
                 <h5>Entidades Clave</h5>
@@ -35,27 +35,50 @@ export const crearNuevoCaso = async (titulo, resumen) => {
 };
 
 
-export const obtenerTodosLosCasos = async () => {
-  console.log("Servicio API: Pidiendo la lista de todos los casos...");
+// Pide una página del listado de casos (resúmenes sin evidencias). Para la
+// página siguiente se pasa como 'cursor' el valor 'siguiente' de la anterior.
+export const obtenerCasos = async ({ cursor = null, limite = 20 } = {}) => {
+  console.log("Servicio API: Pidiendo una página de la lista de casos...");
+  const parametros = new URLSearchParams({ limite });
+  if (cursor) parametros.set('cursor', cursor);
   try {
-    const respuesta = await fetch(`${URL_BASE}/casos`);
+    const respuesta = await fetch(`${URL_BASE}/casos?${parametros}`);
     if (!respuesta.ok) {
       throw new Error(`Error del servidor: ${respuesta.status}`);
     }
-    const casos = await respuesta.json();
-    console.log("Servicio API: Lista de casos recibida.", casos);
-    return casos;
+    const pagina = await respuesta.json();
+    console.log("Servicio API: Página de casos recibida.", pagina);
+    return pagina;
   } catch (error) {
     console.error("Servicio API: Error al obtener los casos:", error);
     throw error;
   }
 };
 
-// En el futuro, aquí añadiremos más funciones como:
-// export const subirEvidencia = async (idCaso, archivo) => { ... }
-// export const obtenerCaso = async (idCaso) => { ... }
+export const obtenerCaso = async (idCaso) => {
+  console.log(`Servicio API: Pidiendo el detalle del caso ${idCaso}...`);
+  try {
+    const respuesta = await fetch(`${URL_BASE}/casos/${idCaso}`);
+    if (!respuesta.ok) {
+      throw new Error(`Error del servidor: ${respuesta.status}`);
+    }
+    return await respuesta.json();
+  } catch (error) {
+    console.error("Servicio API: Error al obtener el caso:", error);
+    throw error;
+  }
+};
+
+// Archivos más grandes que esto se suben por partes (reanudable).
+const UMBRAL_SUBIDA_POR_PARTES = 64 * 1024 * 1024; // 64 MiB
+const TAMANO_PARTE = 8 * 1024 * 1024; // 8 MiB
+const REINTENTOS_POR_PARTE = 3;
 
 export const subirEvidencia = async (idCaso, archivo) => {
+  if (archivo.size > UMBRAL_SUBIDA_POR_PARTES) {
+    return subirEvidenciaPorPartes(idCaso, archivo);
+  }
+
   // Usamos FormData para enviar archivos
   const formData = new FormData();
   formData.append("archivo", archivo);
@@ -74,11 +97,127 @@ export const subirEvidencia = async (idCaso, archivo) => {
       throw new Error(`Error del servidor: ${respuesta.status}`);
     }
 
-    const casoActualizado = await respuesta.json();
-    console.log("Servicio API: Evidencia subida. Caso actualizado:", casoActualizado);
-    return casoActualizado;
+    // El servidor responde 202 con el trabajo encolado; el procesamiento
+    // continúa en segundo plano.
+    const trabajo = await respuesta.json();
+    console.log("Servicio API: Evidencia subida. Trabajo encolado:", trabajo);
+    return trabajo;
   } catch (error) {
     console.error("Servicio API: Error al subir la evidencia:", error);
     throw error;
   }
 };
+
+// Sube un archivo grande en partes de 8 MiB. Si una parte falla se reintenta,
+// continuando desde los bytes que el servidor confirma haber recibido.
+export const subirEvidenciaPorPartes = async (idCaso, archivo) => {
+  console.log(`Servicio API: Subiendo '${archivo.name}' por partes (${archivo.size} bytes)`);
+
+  const respuestaInicio = await fetch(`${URL_BASE}/casos/${idCaso}/subidas`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      nombre_archivo: archivo.name,
+      tipo_contenido: archivo.type || 'application/octet-stream',
+      tamano_total: archivo.size,
+    }),
+  });
+  if (!respuestaInicio.ok) {
+    throw new Error(`Error del servidor: ${respuestaInicio.status}`);
+  }
+  const subida = await respuestaInicio.json();
+  const urlSubida = `${URL_BASE}/casos/${idCaso}/subidas/${subida.id_subida}`;
+
+  let bytesRecibidos = 0;
+  let fallosSeguidos = 0;
+  while (bytesRecibidos < archivo.size) {
+    const fin = Math.min(bytesRecibidos + TAMANO_PARTE, archivo.size);
+    try {
+      const respuestaParte = await fetch(urlSubida, {
+        method: 'PUT',
+        headers: { 'Content-Range': `bytes ${bytesRecibidos}-${fin - 1}/${archivo.size}` },
+        body: archivo.slice(bytesRecibidos, fin),
+      });
+      if (!respuestaParte.ok) {
+        throw new Error(`Error del servidor: ${respuestaParte.status}`);
+      }
+      bytesRecibidos = (await respuestaParte.json()).bytes_recibidos;
+      fallosSeguidos = 0;
+    } catch (error) {
+      fallosSeguidos += 1;
+      if (fallosSeguidos > REINTENTOS_POR_PARTE) {
+        console.error("Servicio API: Error al subir la evidencia por partes:", error);
+        throw error;
+      }
+      // Preguntamos al servidor por dónde va la subida y reanudamos desde ahí.
+      const estado = await fetch(urlSubida).then(r => r.json());
+      bytesRecibidos = estado.bytes_recibidos;
+    }
+  }
+
+  const respuestaFinal = await fetch(`${urlSubida}/completar`, { method: 'POST' });
+  if (!respuestaFinal.ok) {
+    throw new Error(`Error del servidor: ${respuestaFinal.status}`);
+  }
+  const trabajo = await respuestaFinal.json();
+  console.log("Servicio API: Evidencia subida por partes. Trabajo encolado:", trabajo);
+  return trabajo;
+};
+
+export const obtenerTrabajo = async (idTrabajo) => {
+  try {
+    const respuesta = await fetch(`${URL_BASE}/trabajos/${idTrabajo}`);
+    if (!respuesta.ok) {
+      throw new Error(`Error del servidor: ${respuesta.status}`);
+    }
+    return await respuesta.json();
+  } catch (error) {
+    console.error("Servicio API: Error al consultar el trabajo:", error);
+    throw error;
+  }
+};
+
+// Pide una página de la transcripción de una evidencia. Si se indica 'segundo',
+// la página empieza en el segmento que se oye en ese segundo.
+export const obtenerTranscripcion = async (idCaso, idEvidencia, { desde = 0, limite = 100, segundo = null } = {}) => {
+  const parametros = new URLSearchParams({ desde, limite });
+  if (segundo !== null) parametros.set('segundo', segundo);
+  try {
+    const respuesta = await fetch(`${URL_BASE}/casos/${idCaso}/evidencia/${idEvidencia}/transcripcion?${parametros}`);
+    if (!respuesta.ok) {
+      throw new Error(`Error del servidor: ${respuesta.status}`);
+    }
+    return await respuesta.json();
+  } catch (error) {
+    console.error("Servicio API: Error al obtener la transcripción:", error);
+    throw error;
+  }
+};
+
+// Consulta el trabajo cada 'intervaloMs' hasta que termine (completado o error).
+export const esperarTrabajo = async (idTrabajo, intervaloMs = 3000) => {
+  while (true) {
+    const trabajo = await obtenerTrabajo(idTrabajo);
+    if (trabajo.estado === 'completado' || trabajo.estado === 'error') {
+      return trabajo;
+    }
+    await new Promise(resolver => setTimeout(resolver, intervaloMs));
+  }
+};
+
+// Abre un flujo Server-Sent Events con el progreso de una evidencia.
+// 'alRecibirEvento' se llama con cada evento ({ tipo, nodo, etapa, actual, total, ... }).
+// Devuelve el EventSource para que el componente pueda cerrarlo.
+export const suscribirseAEventosEvidencia = (idCaso, idEvidencia, alRecibirEvento) => {
+  const fuente = new EventSource(`${URL_BASE}/casos/${idCaso}/evidencia/${idEvidencia}/eventos`);
+  ['nodo_inicio', 'nodo_fin', 'progreso', 'fin'].forEach(tipo => {
+    fuente.addEventListener(tipo, (mensaje) => {
+      const evento = JSON.parse(mensaje.data);
+      alRecibirEvento(evento);
+      if (evento.tipo === 'fin') {
+        fuente.close();
+      }
+    });
+  });
+  return fuente;
+};
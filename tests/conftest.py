@@ -0,0 +1,32 @@
+# tests/conftest.py
+
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# La configuración se lee al importar 'backend', así que el entorno de pruebas
+# (SQLite en un directorio temporal, sin métricas ni LLM real) va antes.
+DIRECTORIO_PRUEBAS = Path(tempfile.mkdtemp(prefix="pruebas_backend_"))
+os.environ["DB_URL"] = f"sqlite:///{DIRECTORIO_PRUEBAS / 'pruebas.sqlite3'}"
+os.environ["DIRECTORIO_SUBIDAS"] = str(DIRECTORIO_PRUEBAS / "archivos_subidos")
+os.environ["PROVEEDOR_LLM"] = "simulado"
+os.environ["METRICAS_ACTIVADAS"] = "false"
+os.environ["TRAZAS"] = "ninguna"
+
+from sqlmodel import Session, SQLModel  # noqa: E402
+
+from backend.api import modelos_compartidos  # noqa: E402,F401  (registra las tablas)
+from backend.base_de_datos import motor  # noqa: E402
+
+
+@pytest.fixture
+def sesion():
+    """Una sesión sobre tablas recién creadas, que se borran al terminar la prueba."""
+    SQLModel.metadata.create_all(motor)
+    try:
+        with Session(motor) as sesion:
+            yield sesion
+    finally:
+        SQLModel.metadata.drop_all(motor)
@@ -0,0 +1,137 @@
+# tests/test_almacenamiento_subidas.py
+
+import asyncio
+import hashlib
+import uuid
+
+import pytest
+
+from backend import almacenamiento_subidas
+from backend.almacenamiento_subidas import ParteDeSubidaInvalida, SubidaOcupada
+
+
+async def _partes(*bloques: bytes):
+    for bloque in bloques:
+        yield bloque
+
+
+async def _partes_interrumpidas(*bloques: bytes):
+    for bloque in bloques:
+        yield bloque
+    raise ConnectionError("El cliente cortó la conexión.")
+
+
+def _anadir(id_subida, partes, ruta, bytes_previos, bytes_finales):
+    return asyncio.run(
+        almacenamiento_subidas.anadir_parte_a_subida(id_subida, partes, ruta, bytes_previos, bytes_finales)
+    )
+
+
+# --- parsear_content_range ---
+
+def test_parsear_content_range_valido():
+    assert almacenamiento_subidas.parsear_content_range("bytes 0-9/20", 20) == (0, 9)
+    assert almacenamiento_subidas.parsear_content_range(" bytes 10-19/20 ", 20) == (10, 19)
+
+
+@pytest.mark.parametrize(
+    "cabecera",
+    [
+        "",
+        "bytes 0-9",
+        "bytes */20",
+        "items 0-9/20",
+        "bytes 0-9/20 extra",
+        "bytes -1-9/20",
+        "bytes 0-9/21",  # El total no es el de la subida.
+        "bytes 9-0/20",  # Rango al revés.
+        "bytes 10-20/20",  # Se sale del archivo.
+    ],
+)
+def test_parsear_content_range_invalido(cabecera):
+    with pytest.raises(ParteDeSubidaInvalida):
+        almacenamiento_subidas.parsear_content_range(cabecera, 20)
+
+
+# --- anadir_parte_a_subida ---
+
+def test_anadir_partes_en_orden(tmp_path):
+    id_subida, ruta = uuid.uuid4(), tmp_path / "subida.parcial"
+
+    assert _anadir(id_subida, _partes(b"hola "), ruta, 0, 5) == 5
+    assert _anadir(id_subida, _partes(b"mun", b"do"), ruta, 5, 10) == 10
+
+    assert ruta.read_bytes() == b"hola mundo"
+    hash_final = almacenamiento_subidas.obtener_hash_de_subida(id_subida, ruta, 10)
+    assert hash_final == hashlib.sha256(b"hola mundo").hexdigest()
+
+
+def test_parte_con_bytes_de_mas_se_descarta(tmp_path):
+    id_subida, ruta = uuid.uuid4(), tmp_path / "subida.parcial"
+    _anadir(id_subida, _partes(b"hola "), ruta, 0, 5)
+
+    with pytest.raises(ParteDeSubidaInvalida, match="más bytes"):
+        _anadir(id_subida, _partes(b"mundo!"), ruta, 5, 10)
+
+    assert ruta.read_bytes() == b"hola "
+
+
+def test_parte_con_bytes_de_menos_se_descarta(tmp_path):
+    id_subida, ruta = uuid.uuid4(), tmp_path / "subida.parcial"
+    _anadir(id_subida, _partes(b"hola "), ruta, 0, 5)
+
+    with pytest.raises(ParteDeSubidaInvalida, match="menos bytes"):
+        _anadir(id_subida, _partes(b"mun"), ruta, 5, 10)
+
+    assert ruta.read_bytes() == b"hola "
+
+
+def test_parte_interrumpida_se_descarta_y_se_puede_repetir(tmp_path):
+    id_subida, ruta = uuid.uuid4(), tmp_path / "subida.parcial"
+    _anadir(id_subida, _partes(b"hola "), ruta, 0, 5)
+
+    with pytest.raises(ConnectionError):
+        _anadir(id_subida, _partes_interrumpidas(b"mu"), ruta, 5, 10)
+    assert ruta.read_bytes() == b"hola "
+
+    # El cliente repite la parte desde el mismo punto y el hash sigue cuadrando.
+    assert _anadir(id_subida, _partes(b"mundo"), ruta, 5, 10) == 10
+    hash_final = almacenamiento_subidas.obtener_hash_de_subida(id_subida, ruta, 10)
+    assert hash_final == hashlib.sha256(b"hola mundo").hexdigest()
+
+
+def test_bytes_sobrantes_de_un_intento_anterior_se_recortan(tmp_path):
+    id_subida, ruta = uuid.uuid4(), tmp_path / "subida.parcial"
+    # Restos de una parte anterior que el proceso no llegó a recortar.
+    ruta.write_bytes(b"hola basura")
+
+    assert _anadir(id_subida, _partes(b"mundo"), ruta, 5, 10) == 10
+
+    assert ruta.read_bytes() == b"hola mundo"
+    hash_final = almacenamiento_subidas.obtener_hash_de_subida(id_subida, ruta, 10)
+    assert hash_final == hashlib.sha256(b"hola mundo").hexdigest()
+
+
+def test_archivo_parcial_mas_corto_de_lo_esperado_falla(tmp_path):
+    id_subida, ruta = uuid.uuid4(), tmp_path / "subida.parcial"
+    ruta.write_bytes(b"hol")
+
+    with pytest.raises(OSError):
+        _anadir(id_subida, _partes(b"mundo"), ruta, 5, 10)
+
+    assert ruta.read_bytes() == b"hol"
+
+
+# --- reservar_subida / liberar_subida ---
+
+def test_reservar_subida_ocupada():
+    id_subida = uuid.uuid4()
+    almacenamiento_subidas.reservar_subida(id_subida)
+    try:
+        with pytest.raises(SubidaOcupada):
+            almacenamiento_subidas.reservar_subida(id_subida)
+    finally:
+        almacenamiento_subidas.liberar_subida(id_subida)
+
+    almacenamiento_subidas.reservar_subida(id_subida)
+    almacenamiento_subidas.liberar_subida(id_subida)
@@ -0,0 +1,84 @@
+# tests/test_cache_de_resultados.py
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlmodel import select
+
+from backend import cache_de_resultados
+from backend.api.modelos_compartidos import RespuestaLLMEnCache
+from backend.cache_de_resultados import clave_respuesta_llm
+from backend.core import configuracion
+
+MODELO = "simulado"
+
+
+@pytest.fixture
+def maximo_entradas(monkeypatch):
+    monkeypatch.setattr(configuracion, "CACHE_LLM_MAXIMO_ENTRADAS", 3)
+    monkeypatch.setattr(configuracion, "CACHE_LLM_SEGUNDOS_VIDA", 24 * 3600)
+    return 3
+
+
+def _guardar(sesion, prompt: str, horas_desde_creacion: float = 0, horas_desde_uso: float = 0) -> None:
+    """Guarda una respuesta y ajusta sus fechas, para fijar el orden de uso sin esperar."""
+    cache_de_resultados.guardar_respuesta_llm_en_cache(MODELO, prompt, f"respuesta a {prompt}")
+    entrada = sesion.get(RespuestaLLMEnCache, clave_respuesta_llm(MODELO, prompt))
+    entrada.fecha_creacion = datetime.now() - timedelta(hours=horas_desde_creacion)
+    entrada.fecha_ultimo_uso = datetime.now() - timedelta(hours=horas_desde_uso)
+    sesion.add(entrada)
+    sesion.commit()
+
+
+def _claves_guardadas(sesion) -> set[str]:
+    sesion.expire_all()
+    return set(sesion.exec(select(RespuestaLLMEnCache.clave)).all())
+
+
+def _claves(*prompts: str) -> set[str]:
+    return {clave_respuesta_llm(MODELO, prompt) for prompt in prompts}
+
+
+def test_sin_pasar_del_maximo_no_se_descarta_nada(sesion, maximo_entradas):
+    _guardar(sesion, "a", horas_desde_creacion=48, horas_desde_uso=48)
+    _guardar(sesion, "b")
+    _guardar(sesion, "c")
+
+    assert _claves_guardadas(sesion) == _claves("a", "b", "c")
+    # La caducada sigue ahí, pero ya no se devuelve.
+    assert cache_de_resultados.obtener_respuesta_llm_en_cache(MODELO, "a") is None
+    assert cache_de_resultados.obtener_respuesta_llm_en_cache(MODELO, "b") == "respuesta a b"
+
+
+def test_al_pasar_del_maximo_se_descarta_la_menos_usada(sesion, maximo_entradas):
+    _guardar(sesion, "a", horas_desde_uso=3)
+    _guardar(sesion, "b", horas_desde_uso=1)
+    _guardar(sesion, "c", horas_desde_uso=2)
+    # Leer "a" la convierte en la más reciente: la menos usada pasa a ser "c".
+    assert cache_de_resultados.obtener_respuesta_llm_en_cache(MODELO, "a") == "respuesta a a"
+
+    _guardar(sesion, "d")
+
+    assert _claves_guardadas(sesion) == _claves("a", "b", "d")
+
+
+def test_al_pasar_del_maximo_se_descartan_primero_las_caducadas(sesion, maximo_entradas):
+    # "a" es la usada más recientemente, pero caducó: se descarta ella y no la menos usada.
+    _guardar(sesion, "a", horas_desde_creacion=48, horas_desde_uso=0)
+    _guardar(sesion, "b", horas_desde_uso=5)
+    _guardar(sesion, "c", horas_desde_uso=4)
+
+    _guardar(sesion, "d")
+
+    assert _claves_guardadas(sesion) == _claves("b", "c", "d")
+
+
+def test_se_descartan_tantas_como_sobren(sesion, maximo_entradas, monkeypatch):
+    for horas, prompt in enumerate("abcde"):
+        _guardar(sesion, prompt, horas_desde_uso=10 - horas)
+    assert len(_claves_guardadas(sesion)) == maximo_entradas
+
+    monkeypatch.setattr(configuracion, "CACHE_LLM_MAXIMO_ENTRADAS", 1)
+    _guardar(sesion, "f")
+
+    assert _claves_guardadas(sesion) == _claves("f")
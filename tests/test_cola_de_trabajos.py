@@ -0,0 +1,97 @@
+# tests/test_cola_de_trabajos.py
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from backend import cola_de_trabajos
+from backend.api.modelos_compartidos import Caso, Evidencia, TrabajoProcesamiento
+from backend.core import configuracion
+
+
+@pytest.fixture(autouse=True)
+def sin_puntos_de_control(monkeypatch):
+    """Los puntos de control viven en el grafo de LangGraph, fuera de estas pruebas."""
+    borrados = []
+    monkeypatch.setattr(cola_de_trabajos, "_borrar_puntos_de_control", borrados.append)
+    return borrados
+
+
+def _crear_trabajo(sesion, **campos) -> TrabajoProcesamiento:
+    caso = Caso(titulo="Caso")
+    evidencia = Evidencia(id_caso=caso.id_caso, nombre_archivo="a.pdf", ruta_archivo="a.pdf", tipo_contenido="application/pdf")
+    trabajo = TrabajoProcesamiento(id_evidencia=evidencia.id_evidencia, **campos)
+    sesion.add_all([caso, evidencia, trabajo])
+    sesion.commit()
+    return trabajo
+
+
+def _abandonado_hace() -> datetime:
+    return datetime.now() - timedelta(seconds=configuracion.SEGUNDOS_PARA_TRABAJO_ABANDONADO + 60)
+
+
+def test_cola_vacia(sesion):
+    assert cola_de_trabajos.reclamar_siguiente_trabajo() is None
+
+
+def test_reclamar_trabajo_pendiente_cuenta_el_intento(sesion):
+    trabajo = _crear_trabajo(sesion)
+
+    assert cola_de_trabajos.reclamar_siguiente_trabajo() == trabajo.id_trabajo
+
+    sesion.refresh(trabajo)
+    assert trabajo.estado == "en_proceso"
+    assert trabajo.intentos == 1
+    assert trabajo.fecha_latido is not None
+    # Ya no está pendiente ni abandonado.
+    assert cola_de_trabajos.reclamar_siguiente_trabajo() is None
+
+
+def test_trabajo_con_latido_reciente_no_se_retoma(sesion):
+    _crear_trabajo(sesion, estado="en_proceso", intentos=1, fecha_latido=datetime.now())
+
+    assert cola_de_trabajos.reclamar_siguiente_trabajo() is None
+
+
+def test_trabajo_abandonado_se_retoma_con_un_intento_mas(sesion):
+    trabajo = _crear_trabajo(
+        sesion, estado="en_proceso", intentos=configuracion.TRABAJO_MAXIMO_INTENTOS - 1, fecha_latido=_abandonado_hace()
+    )
+
+    assert cola_de_trabajos.reclamar_siguiente_trabajo() == trabajo.id_trabajo
+
+    sesion.refresh(trabajo)
+    assert trabajo.estado == "en_proceso"
+    assert trabajo.intentos == configuracion.TRABAJO_MAXIMO_INTENTOS
+
+
+def test_trabajo_abandonado_sin_intentos_se_da_por_fallido(sesion, sin_puntos_de_control):
+    agotado = _crear_trabajo(
+        sesion,
+        estado="en_proceso",
+        intentos=configuracion.TRABAJO_MAXIMO_INTENTOS,
+        fecha_latido=_abandonado_hace(),
+        fecha_creacion=datetime.now() - timedelta(hours=1),
+    )
+    siguiente = _crear_trabajo(sesion)
+
+    # El agotado es el más antiguo, pero se salta y se reclama el siguiente.
+    assert cola_de_trabajos.reclamar_siguiente_trabajo() == siguiente.id_trabajo
+
+    sesion.refresh(agotado)
+    assert agotado.estado == "error"
+    assert agotado.intentos == configuracion.TRABAJO_MAXIMO_INTENTOS
+    assert agotado.fecha_fin is not None
+    assert sesion.get(Evidencia, agotado.id_evidencia).estado_procesamiento == "error"
+    assert sin_puntos_de_control == [str(agotado.id_evidencia)]
+
+
+def test_reintentar_trabajo_pone_los_intentos_a_cero(sesion):
+    trabajo = _crear_trabajo(sesion, estado="error", error="Fallo", intentos=configuracion.TRABAJO_MAXIMO_INTENTOS)
+
+    cola_de_trabajos.reintentar_trabajo(sesion, trabajo)
+
+    assert trabajo.estado == "pendiente"
+    assert trabajo.intentos == 0
+    assert trabajo.error is None
+    assert cola_de_trabajos.reclamar_siguiente_trabajo() == trabajo.id_trabajo
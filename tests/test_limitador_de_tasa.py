@@ -0,0 +1,95 @@
+# tests/test_limitador_de_tasa.py
+
+import pytest
+
+from backend.herramientas import herramientas_lenguaje
+from backend.herramientas.herramientas_lenguaje import LimitadorDeTasa
+
+
+class RelojFalso:
+    """Sustituye time.time/time.sleep del módulo: dormir solo adelanta el reloj."""
+
+    def __init__(self):
+        self.ahora = 1_000_000.0
+        self.esperas = []
+
+    def time(self) -> float:
+        return self.ahora
+
+    def sleep(self, segundos: float) -> None:
+        self.esperas.append(segundos)
+        self.ahora += segundos
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = RelojFalso()
+    monkeypatch.setattr(herramientas_lenguaje.time, "time", reloj.time)
+    monkeypatch.setattr(herramientas_lenguaje.time, "sleep", reloj.sleep)
+    return reloj
+
+
+@pytest.fixture(params=["memoria", "archivo"])
+def crear_limitador(request, tmp_path):
+    ruta_estado = str(tmp_path / "limitador.sqlite3") if request.param == "archivo" else ""
+
+    def crear(solicitudes_por_minuto: int, tokens_por_minuto: int) -> LimitadorDeTasa:
+        return LimitadorDeTasa(solicitudes_por_minuto, tokens_por_minuto, ruta_estado=ruta_estado)
+
+    return crear
+
+
+def test_rafaga_dentro_de_la_capacidad_no_espera(reloj, crear_limitador):
+    limitador = crear_limitador(solicitudes_por_minuto=3, tokens_por_minuto=1000)
+
+    assert [limitador.adquirir(100) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert reloj.esperas == []
+
+
+def test_sin_solicitudes_espera_la_recarga_de_una(reloj, crear_limitador):
+    limitador = crear_limitador(solicitudes_por_minuto=3, tokens_por_minuto=1000)
+    for _ in range(3):
+        limitador.adquirir()
+
+    # Se recarga una solicitud cada 60 / 3 = 20 segundos.
+    assert limitador.adquirir() == pytest.approx(20.0)
+    assert reloj.esperas == [pytest.approx(20.0)]
+
+
+def test_sin_tokens_espera_los_que_faltan(reloj, crear_limitador):
+    limitador = crear_limitador(solicitudes_por_minuto=100, tokens_por_minuto=600)
+    limitador.adquirir(500)
+
+    # Faltan 400 - 100 = 300 tokens, a 10 por segundo.
+    assert limitador.adquirir(400) == pytest.approx(30.0)
+
+
+def test_las_cubetas_se_rellenan_con_el_tiempo_sin_pasar_de_la_capacidad(reloj, crear_limitador):
+    limitador = crear_limitador(solicitudes_por_minuto=2, tokens_por_minuto=1000)
+    limitador.adquirir()
+    limitador.adquirir()
+
+    reloj.ahora += 3600  # Una hora sin llamadas: las cubetas quedan llenas, no con 120 solicitudes.
+
+    assert limitador.adquirir() == 0.0
+    assert limitador.adquirir() == 0.0
+    assert limitador.adquirir() == pytest.approx(30.0)
+
+
+def test_solicitud_mayor_que_la_cubeta_se_limita_a_la_capacidad(reloj, crear_limitador):
+    limitador = crear_limitador(solicitudes_por_minuto=10, tokens_por_minuto=1000)
+
+    # Sin el límite esperaría para siempre: la cubeta nunca llega a 5000 tokens.
+    assert limitador.adquirir(5000) == 0.0
+    assert limitador.adquirir(1000) == pytest.approx(60.0)
+
+
+def test_el_estado_en_archivo_se_comparte_entre_limitadores(reloj, tmp_path):
+    ruta_estado = str(tmp_path / "limitador.sqlite3")
+    # Como dos procesos con el mismo archivo de estado.
+    primero = LimitadorDeTasa(2, 1000, ruta_estado=ruta_estado)
+    segundo = LimitadorDeTasa(2, 1000, ruta_estado=ruta_estado)
+
+    assert primero.adquirir() == 0.0
+    assert segundo.adquirir() == 0.0
+    assert primero.adquirir() == pytest.approx(30.0)
@@ -0,0 +1,63 @@
+# tests/test_paginacion_casos.py
+
+import asyncio
+import base64
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+from backend.api.enrutador_principal import _codificar_cursor, _decodificar_cursor, listar_casos
+from backend.api.modelos_compartidos import Caso
+from backend.base_de_datos import fabrica_sesiones_asincronas, motor_asincrono
+
+
+def test_cursor_ida_y_vuelta():
+    caso = Caso(titulo="Caso", fecha_creacion=datetime(2024, 5, 17, 10, 30, 0, 123456))
+
+    assert _decodificar_cursor(_codificar_cursor(caso)) == (caso.fecha_creacion, caso.id_caso)
+
+
+@pytest.mark.parametrize(
+    "cursor",
+    [
+        "no-es-base64!",
+        base64.urlsafe_b64encode(b"\xff\xfe").decode(),  # No es UTF-8.
+        base64.urlsafe_b64encode(b"sin separador").decode(),
+        base64.urlsafe_b64encode(b"a|b|c").decode(),
+        base64.urlsafe_b64encode(f"ayer|{uuid.uuid4()}".encode()).decode(),
+        base64.urlsafe_b64encode(b"2024-05-17T10:30:00|no-es-uuid").decode(),
+    ],
+)
+def test_cursor_invalido_da_400(cursor):
+    with pytest.raises(HTTPException) as error:
+        _decodificar_cursor(cursor)
+    assert error.value.status_code == 400
+
+
+def test_paginas_recorren_todos_los_casos_sin_repetir(sesion):
+    # Dos casos comparten fecha: el id desempata el orden entre páginas.
+    base = datetime(2024, 1, 1)
+    fechas = [base, base + timedelta(days=1), base + timedelta(days=1), base + timedelta(days=2), base + timedelta(days=3)]
+    casos = [Caso(titulo=f"Caso {i}", fecha_creacion=fecha) for i, fecha in enumerate(fechas)]
+    sesion.add_all(casos)
+    sesion.commit()
+    esperados = [c.id_caso for c in sorted(casos, key=lambda c: (c.fecha_creacion, c.id_caso), reverse=True)]
+
+    async def recorrer():
+        vistos, cursor = [], None
+        try:
+            async with fabrica_sesiones_asincronas() as sesion_asincrona:
+                while True:
+                    pagina = await listar_casos(
+                        sesion=sesion_asincrona, limite=2, cursor=cursor, campos=None, entidad=None, tipo_entidad=None
+                    )
+                    vistos.extend(caso.id_caso for caso in pagina.casos)
+                    if pagina.siguiente is None:
+                        return vistos
+                    cursor = pagina.siguiente
+        finally:
+            await motor_asincrono.dispose()
+
+    assert asyncio.run(recorrer()) == esperados
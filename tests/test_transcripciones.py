@@ -0,0 +1,60 @@
+# tests/test_transcripciones.py
+
+import pytest
+
+from backend import transcripciones
+from backend.api.modelos_compartidos import Caso, Evidencia
+
+
+@pytest.fixture
+def evidencia(sesion, monkeypatch):
+    """Una evidencia con 10 segmentos de 2 s en bloques de 4 y un silencio de 20 s a 30 s."""
+    monkeypatch.setattr(transcripciones, "SEGMENTOS_POR_BLOQUE", 4)
+    caso = Caso(titulo="Caso")
+    evidencia = Evidencia(id_caso=caso.id_caso, nombre_archivo="a.mp3", ruta_archivo="a.mp3", tipo_contenido="audio/mpeg")
+    sesion.add_all([caso, evidencia])
+    sesion.commit()
+
+    inicios = [0, 2, 4, 6, 8, 10, 12, 14, 16, 30]
+    segmentos = [{"inicio": i, "fin": i + 2, "texto": f"Frase {n}"} for n, i in enumerate(inicios)]
+    assert transcripciones.guardar_transcripcion(sesion, evidencia.id_evidencia, segmentos) == 10
+    sesion.commit()
+    return evidencia
+
+
+@pytest.mark.parametrize(
+    "segundo, indice",
+    [
+        (0, 0),
+        (1.5, 0),
+        (2, 1),  # Justo en el cambio de segmento: el que empieza.
+        (7.9, 3),  # Último segmento del primer bloque.
+        (8, 4),  # Primero del segundo bloque.
+        (15.9, 7),  # Último segmento del segundo bloque.
+        (18, 9),  # En el silencio: el siguiente segmento que empieza.
+        (25, 9),
+        (31, 9),
+    ],
+)
+def test_buscar_segmento_por_segundo(sesion, evidencia, segundo, indice):
+    assert transcripciones.buscar_segmento_por_segundo(sesion, evidencia.id_evidencia, segundo) == indice
+
+
+def test_buscar_segmento_despues_del_final(sesion, evidencia):
+    assert transcripciones.buscar_segmento_por_segundo(sesion, evidencia.id_evidencia, 32) is None
+    assert transcripciones.buscar_segmento_por_segundo(sesion, evidencia.id_evidencia, 100) is None
+
+
+def test_buscar_segmento_sin_transcripcion(sesion, evidencia):
+    transcripciones.guardar_transcripcion(sesion, evidencia.id_evidencia, [])
+    sesion.commit()
+
+    assert transcripciones.buscar_segmento_por_segundo(sesion, evidencia.id_evidencia, 0) is None
+
+
+def test_leer_segmentos_entre_bloques(sesion, evidencia):
+    segmentos = transcripciones.leer_segmentos(sesion, evidencia.id_evidencia, 3, 3)
+
+    assert [s["indice"] for s in segmentos] == [3, 4, 5]
+    assert [s["texto"] for s in segmentos] == ["Frase 3", "Frase 4", "Frase 5"]
+    assert segmentos[0]["inicio"] == 6 and segmentos[0]["fin"] == 8